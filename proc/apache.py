@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -17,6 +17,13 @@ of the discovered Apache worker processes (it also provides the raw
 :attr:`~proc.core.Process.rss` value of each worker, in case you don't trust
 the aggregates ;-).
 
+For continuous monitoring :func:`find_apache_memory_usage()` can return
+:class:`StreamingStats` objects instead. These don't keep the raw values in
+memory, provide the variance and approximate percentiles in addition to the
+aggregates above, and can be merged, so that statistics collected on different
+hosts or during different intervals can be combined. When NumPy_ is installed
+it's used to update :class:`StreamingStats` objects in batches.
+
 .. note:: This module only works if you've configured your Apache web server to
           use an MPM_ based on processes (not threads). The main reason for
           this is that :mod:`proc.core` doesn't expose information about the
@@ -26,13 +33,21 @@ the aggregates ;-).
 
 .. _Apache: http://en.wikipedia.org/wiki/Apache_HTTP_Server
 .. _MPM: http://httpd.apache.org/docs/current/mpm.html
+.. _NumPy: https://numpy.org/
 """
 
 # Standard library modules.
 import collections
 import logging
+import math
 import re
 
+try:
+    # NumPy is an optional dependency.
+    import numpy
+except ImportError:
+    numpy = None
+
 # External dependencies.
 from proc.tree import get_process_tree, ProcessNode
 
@@ -40,7 +55,9 @@ from proc.tree import get_process_tree, ProcessNode
 __all__ = (
     'ApacheDaemonNotRunning',
     'MaybeApacheWorker',
+    'DEFAULT_RELATIVE_ACCURACY',
     'StatsList',
+    'StreamingStats',
     'find_apache_memory_usage',
     'find_apache_workers',
     'logger',
@@ -49,12 +66,22 @@ __all__ = (
 # Initialize a logger.
 logger = logging.getLogger(__name__)
 
+DEFAULT_RELATIVE_ACCURACY = 0.01
+"""
+The default relative accuracy of the percentiles of :class:`StreamingStats` (a float).
+
+Refer to :func:`StreamingStats.quantile()` for details.
+"""
+
 
-def find_apache_memory_usage(exe_name='apache2'):
+def find_apache_memory_usage(exe_name='apache2', streaming=False):
     """
     Find the memory usage of Apache workers.
 
     :param exe_name: The base name of the Apache executable (a string).
+    :param streaming: :data:`True` to return :class:`StreamingStats` objects
+                      instead of :class:`StatsList` objects, :data:`False`
+                      otherwise (the default).
     :returns: A tuple of two values:
 
               1. A :class:`StatsList` of integers with the resident set size
@@ -74,6 +101,8 @@ def find_apache_memory_usage(exe_name='apache2'):
             wsgi_rss[worker.wsgi_process_group].append(worker.rss)
         else:
             worker_rss.append(worker.rss)
+    if streaming:
+        return StreamingStats(worker_rss), dict((k, StreamingStats(v)) for k, v in wsgi_rss.items())
     return worker_rss, wsgi_rss
 
 
@@ -128,6 +157,296 @@ class StatsList(list):
             return (self[index] + self[index + 1]) / 2.0
 
 
+class StreamingStats(object):
+
+    """
+    Streaming accumulator of simple statistics.
+
+    Unlike :class:`StatsList` this doesn't keep the values in memory:
+
+    - The count, minimum, maximum, mean and variance are updated in constant
+      time per value using `Welford's method`_.
+
+    - Percentiles are approximated using a logarithmic bucket sketch (similar
+      to DDSketch_): Each value is counted in the bucket ``ceil(log(value) /
+      log(gamma))`` so the memory usage grows with the logarithm of the range
+      of values instead of the number of values (refer to :func:`quantile()`).
+
+    - Two accumulators can be merged (refer to :func:`merge()`) and converted
+      to and from JSON compatible dictionaries (refer to :func:`to_dict()` and
+      :func:`from_dict()`) to combine statistics from multiple hosts or
+      intervals.
+
+    The :attr:`min`, :attr:`max`, :attr:`average` and :attr:`median`
+    properties are compatible with :class:`StatsList`.
+
+    .. _Welford's method: https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Welford's_online_algorithm
+    .. _DDSketch: https://arxiv.org/abs/1908.10693
+    """
+
+    def __init__(self, values=(), relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        """
+        Initialize a :class:`StreamingStats` object.
+
+        :param values: An iterable of numbers to add (optional).
+        :param relative_accuracy: The relative accuracy of the percentiles (a
+                                  float between zero and one, defaults to
+                                  :data:`DEFAULT_RELATIVE_ACCURACY`).
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("The relative accuracy should be between zero and one!")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.positive = collections.defaultdict(int)
+        self.negative = collections.defaultdict(int)
+        self.zero_count = 0
+        self.update(values)
+
+    def add(self, value):
+        """
+        Add a value to the statistics.
+
+        :param value: A number.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / float(self.count)
+        self.m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        if value > 0:
+            self.positive[self.get_index(value)] += 1
+        elif value < 0:
+            self.negative[self.get_index(-value)] += 1
+        else:
+            self.zero_count += 1
+
+    append = add
+
+    def update(self, values):
+        """
+        Add multiple values to the statistics.
+
+        :param values: An iterable of numbers.
+
+        When NumPy_ is installed the values are processed as a single batch
+        using vectorized operations (the batch is merged using :func:`merge()`),
+        otherwise :func:`add()` is called for each value. Either way the
+        :attr:`min` and :attr:`max` values keep the type of the input values.
+        """
+        values = values if isinstance(values, (list, tuple)) else list(values)
+        array = numpy.asarray(values) if numpy is not None else None
+        if array is None or array.dtype.kind not in 'fiu':
+            # Without NumPy (or for values that NumPy can't represent as
+            # integers or floats) we process the values one by one.
+            for value in values:
+                self.add(value)
+            return
+        if array.size:
+            batch = StreamingStats(relative_accuracy=self.relative_accuracy)
+            batch.count = int(array.size)
+            # The minimum and maximum are taken from the input values so
+            # that their type matches the result of add() (and StatsList).
+            batch.minimum = values[int(array.argmin())]
+            batch.maximum = values[int(array.argmax())]
+            array = array.astype(float)
+            batch.mean = float(array.mean())
+            batch.m2 = float(((array - batch.mean) ** 2).sum())
+            batch.zero_count = int((array == 0).sum())
+            for buckets, selection in ((batch.positive, array[array > 0]), (batch.negative, -array[array < 0])):
+                if selection.size:
+                    indexes = numpy.ceil(numpy.log(selection) / self.log_gamma).astype(int)
+                    for index, counter in zip(*numpy.unique(indexes, return_counts=True)):
+                        buckets[int(index)] += int(counter)
+            self.merge(batch)
+
+    def merge(self, other):
+        """
+        Merge the statistics of another accumulator into this accumulator.
+
+        :param other: A :class:`StreamingStats` object with the same
+                      relative accuracy.
+        :returns: The :class:`StreamingStats` object (to enable chaining).
+        :raises: :exc:`~exceptions.ValueError` when the relative accuracies
+                 differ.
+
+        The mean and variance are combined using the parallel algorithm by
+        Chan et al. and the buckets of the percentile sketch are added.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge statistics with different relative accuracies!")
+        if other.count:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / float(count)
+            self.m2 += other.m2 + delta * delta * self.count * other.count / float(count)
+            self.count = count
+            if self.minimum is None or other.minimum < self.minimum:
+                self.minimum = other.minimum
+            if self.maximum is None or other.maximum > self.maximum:
+                self.maximum = other.maximum
+            for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+                for index, counter in other_buckets.items():
+                    buckets[index] += counter
+            self.zero_count += other.zero_count
+        return self
+
+    def get_index(self, value):
+        """Get the index of the bucket for a positive number (an integer)."""
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def get_value(self, index):
+        """Get the representative value of a bucket (a float)."""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Approximate a quantile of the values.
+
+        :param q: The quantile (a number between zero and one).
+        :returns: A number whose relative error compared to the value with
+                  rank ``floor(q * (count - 1))`` is at most the configured
+                  relative accuracy.
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        self.check_not_empty("quantile")
+        rank = int(q * (self.count - 1))
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return max(self.minimum, -self.get_value(index))
+        seen += self.zero_count
+        if seen > rank:
+            return 0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return min(self.maximum, max(self.minimum, self.get_value(index)))
+        return self.maximum
+
+    @property
+    def min(self):
+        """
+        The minimum value (a number).
+
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        self.check_not_empty("minimum")
+        return self.minimum
+
+    @property
+    def max(self):
+        """
+        The maximum value (a number).
+
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        self.check_not_empty("maximum")
+        return self.maximum
+
+    @property
+    def average(self):
+        """
+        The average value (a float).
+
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        self.check_not_empty("average")
+        return self.mean
+
+    @property
+    def variance(self):
+        """
+        The sample variance of the values (a float, zero when only one value was added).
+
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        self.check_not_empty("variance")
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        """
+        The sample standard deviation of the values (a float).
+
+        :raises: :exc:`~exceptions.ValueError` when no values were added.
+        """
+        return math.sqrt(self.variance)
+
+    @property
+    def median(self):
+        """The approximate median value (refer to :func:`quantile()`)."""
+        return self.quantile(0.5)
+
+    @property
+    def p50(self):
+        """The approximate 50th percentile (refer to :func:`quantile()`)."""
+        return self.quantile(0.5)
+
+    @property
+    def p90(self):
+        """The approximate 90th percentile (refer to :func:`quantile()`)."""
+        return self.quantile(0.9)
+
+    @property
+    def p99(self):
+        """The approximate 99th percentile (refer to :func:`quantile()`)."""
+        return self.quantile(0.99)
+
+    def check_not_empty(self, name):
+        """Raise :exc:`~exceptions.ValueError` when no values were added."""
+        if self.count == 0:
+            raise ValueError("Cannot calculate %s of empty statistics" % name)
+
+    def to_dict(self):
+        """
+        Convert the statistics to a dictionary that can be serialized to JSON.
+
+        :returns: A dictionary (refer to :func:`from_dict()`).
+        """
+        return dict(
+            relative_accuracy=self.relative_accuracy,
+            count=self.count,
+            mean=self.mean,
+            m2=self.m2,
+            minimum=self.minimum,
+            maximum=self.maximum,
+            positive=dict((str(k), v) for k, v in self.positive.items()),
+            negative=dict((str(k), v) for k, v in self.negative.items()),
+            zero_count=self.zero_count,
+        )
+
+    @classmethod
+    def from_dict(cls, value):
+        """
+        Reconstruct statistics from a dictionary created by :func:`to_dict()`.
+
+        :param value: A dictionary.
+        :returns: A :class:`StreamingStats` object.
+        """
+        stats = cls(relative_accuracy=value['relative_accuracy'])
+        for name in ('count', 'mean', 'm2', 'minimum', 'maximum', 'zero_count'):
+            setattr(stats, name, value[name])
+        for name in ('positive', 'negative'):
+            buckets = getattr(stats, name)
+            for index, counter in value[name].items():
+                buckets[int(index)] = counter
+        return stats
+
+    def __len__(self):
+        """The number of values that were added (an integer)."""
+        return self.count
+
+
 def find_apache_workers(exe_name='apache2'):
     """
     Find Apache workers in the process tree reported by :func:`~proc.tree.get_process_tree()`.
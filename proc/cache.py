@@ -0,0 +1,243 @@
+# proc: Simple interface to Linux process information.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://proc.readthedocs.io
+
+"""
+The :mod:`proc.cache` module persists discovery results between runs.
+
+Some of the programs in the `proc` package discover information by scanning
+``/proc`` (for example :mod:`proc.gpg` searches for a running ``gpg-agent``).
+When such a program is run very frequently the same discovery is repeated over
+and over again, even though the result rarely changes. This module provides a
+small per-user cache for such results:
+
+- Cache files are JSON documents stored in the user's runtime directory (given
+  by ``$XDG_RUNTIME_DIR`` or ``/run/user/$UID``, which is private to the user
+  and cleared on logout or reboot). For root, which usually doesn't have a
+  runtime directory when running from cron or udev, the private directory
+  :data:`ROOT_CACHE_DIRECTORY` is used instead. When no runtime directory is
+  available caching is disabled.
+
+- Cache files are written atomically and ignored when they're not owned by the
+  current user, so a corrupt or planted cache file can't cause harm.
+
+- Cached information usually refers to a process, so :func:`get_process_identity()`
+  and :func:`check_process_identity()` make it possible to cheaply confirm that
+  a process ID still refers to the same process (a process ID can be reused
+  after a process ends, but the combination of process ID and start time is
+  unique).
+
+Callers are expected to validate cached information before using it and fall
+back to discovery when validation fails.
+"""
+
+# Standard library modules.
+import errno
+import json
+import logging
+import os
+import stat
+import tempfile
+
+# Modules provided by our package.
+from proc.core import parse_process_status
+
+# Public identifiers that require documentation.
+__all__ = (
+    'CACHE_PREFIX',
+    'ROOT_CACHE_DIRECTORY',
+    'cache_filename',
+    'check_process_identity',
+    'clear_cache',
+    'find_cache_directory',
+    'get_process_identity',
+    'load_cache',
+    'logger',
+    'save_cache',
+    'validate_private_directory',
+)
+
+# Initialize a logger.
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'proc-cache-'
+"""The prefix of the names of cache files (a string)."""
+
+ROOT_CACHE_DIRECTORY = '/run/proc-cache'
+"""
+The directory where cache files of root are stored when root has no runtime directory (a string).
+
+Refer to :func:`find_cache_directory()` for details.
+"""
+
+
+def find_cache_directory():
+    """
+    Find the directory where cache files are stored.
+
+    :returns: The pathname of the first usable directory (a string) or
+              :data:`None` when no usable directory is available.
+
+    The following directories are considered, in the given order:
+
+    1. The directory given by ``$XDG_RUNTIME_DIR`` (when it's set).
+
+    2. The directory ``/run/user/$UID`` (``$XDG_RUNTIME_DIR`` usually isn't
+       set for programs started by cron and udev).
+
+    3. When the current process runs as root, :data:`ROOT_CACHE_DIRECTORY`
+       (it's created with mode 0700 when it doesn't exist yet).
+
+    A directory is only used when :func:`validate_private_directory()`
+    confirms that it's private to the current user, so a runtime directory
+    that was inherited from another user (or set by an attacker) is ignored.
+    """
+    for directory in os.environ.get('XDG_RUNTIME_DIR'), '/run/user/%i' % os.getuid():
+        if directory and validate_private_directory(directory):
+            return directory
+    if os.getuid() == 0:
+        try:
+            os.mkdir(ROOT_CACHE_DIRECTORY, 0o700)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                logger.debug("Failed to create %s! (%s)", ROOT_CACHE_DIRECTORY, e)
+        if validate_private_directory(ROOT_CACHE_DIRECTORY):
+            return ROOT_CACHE_DIRECTORY
+    logger.debug("Caching is disabled because no private runtime directory is available.")
+    return None
+
+
+def validate_private_directory(directory):
+    """
+    Check that a directory is private to the current user.
+
+    :param directory: The pathname of the directory (a string).
+    :returns: :data:`True` if the directory exists, isn't a symbolic link, is
+              owned by the current user and can't be accessed by other users,
+              :data:`False` otherwise (a warning is logged when the directory
+              exists but doesn't meet these requirements).
+    """
+    try:
+        metadata = os.lstat(directory)
+    except OSError:
+        return False
+    if not stat.S_ISDIR(metadata.st_mode):
+        logger.warning("Ignoring cache directory %s because it's not a directory!", directory)
+    elif metadata.st_uid != os.getuid():
+        logger.warning("Ignoring cache directory %s because it's owned by another user!", directory)
+    elif metadata.st_mode & 0o077:
+        logger.warning("Ignoring cache directory %s because it's accessible by other users!", directory)
+    else:
+        return True
+    return False
+
+
+def cache_filename(name):
+    """
+    Get the pathname of a cache file.
+
+    :param name: The name of the cache (a string).
+    :returns: The pathname of the cache file (a string) or :data:`None` when
+              :func:`find_cache_directory()` returns :data:`None`.
+    """
+    directory = find_cache_directory()
+    return os.path.join(directory, '%s%s.json' % (CACHE_PREFIX, name)) if directory else None
+
+
+def load_cache(name):
+    """
+    Load the contents of a cache file.
+
+    :param name: The name of the cache (a string).
+    :returns: A dictionary or :data:`None` when the cache file doesn't exist,
+              isn't owned by the current user or can't be parsed.
+    """
+    filename = cache_filename(name)
+    if filename:
+        try:
+            with open(filename) as handle:
+                if os.fstat(handle.fileno()).st_uid != os.getuid():
+                    logger.warning("Ignoring cache file %s because it's owned by another user!", filename)
+                    return None
+                value = json.load(handle)
+                if isinstance(value, dict):
+                    return value
+        except (EnvironmentError, ValueError):
+            pass
+    return None
+
+
+def save_cache(name, value):
+    """
+    Atomically replace the contents of a cache file.
+
+    :param name: The name of the cache (a string).
+    :param value: A dictionary that can be serialized to JSON.
+    :returns: :data:`True` if the cache file was written, :data:`False`
+              otherwise (caching is a best effort, errors are logged but
+              otherwise ignored).
+    """
+    filename = cache_filename(name)
+    if filename:
+        try:
+            fd, temporary_file = tempfile.mkstemp(dir=os.path.dirname(filename), prefix=CACHE_PREFIX)
+            try:
+                with os.fdopen(fd, 'w') as handle:
+                    json.dump(value, handle)
+                os.rename(temporary_file, filename)
+                logger.debug("Saved cache file %s.", filename)
+                return True
+            except Exception:
+                os.unlink(temporary_file)
+                raise
+        except Exception as e:
+            logger.debug("Failed to save cache file %s! (%s)", filename, e)
+    return False
+
+
+def clear_cache(name):
+    """
+    Remove a cache file.
+
+    :param name: The name of the cache (a string).
+    """
+    filename = cache_filename(name)
+    if filename and os.path.exists(filename):
+        logger.debug("Removing cache file %s ..", filename)
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+
+def get_process_identity(pid):
+    """
+    Get a value that uniquely identifies a process.
+
+    :param pid: The process ID (an integer).
+    :returns: The start time of the process in clock ticks since boot (an
+              integer) or :data:`None` when the process doesn't exist or
+              has become a zombie.
+    """
+    fields = parse_process_status('/proc/%i' % pid, silent=True)
+    if fields and fields[2] != 'Z':
+        return int(fields[21])
+    return None
+
+
+def check_process_identity(pid, starttime):
+    """
+    Check that a process ID still refers to the same process.
+
+    :param pid: The process ID (an integer).
+    :param starttime: The value previously returned by
+                      :func:`get_process_identity()` (an integer).
+    :returns: :data:`True` if the process is alive and has the given start
+              time, :data:`False` otherwise.
+
+    This reads ``/proc/[pid]/stat`` once, which confirms both that the
+    process is alive and that the process ID hasn't been reused.
+    """
+    return starttime is not None and get_process_identity(pid) == starttime
@@ -0,0 +1,267 @@
+# proc: Simple interface to Linux process information.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://proc.readthedocs.io
+
+"""
+The :mod:`proc.cgroup` module freezes and thaws `control groups`_.
+
+The Linux kernel's cgroup v2 freezer can stop all processes in a control group
+(and its descendant control groups) in one atomic operation by writing ``1``
+to the ``cgroup.freeze`` file of the control group. Once the freeze has taken
+effect the kernel reports ``frozen 1`` in the ``cgroup.events`` file. Compared
+to sending SIGSTOP_ to every process in a process tree this has two important
+advantages:
+
+- Processes can't escape by forking while the processes in the tree are being
+  signaled one by one, because all processes are stopped at once.
+
+- Freezing is a single write regardless of the number of processes, so large
+  process trees are frozen (and thawed) much faster.
+
+The control group of a process is found using ``/proc/[pid]/cgroup`` (refer to
+:func:`find_cgroup_directory()`). Freezing requires write access to the
+``cgroup.freeze`` file (usually this means root privileges) and a cgroup v2
+hierarchy (the unified hierarchy or the hybrid ``/sys/fs/cgroup/unified``
+mount point used by some distributions). When these requirements aren't met
+:class:`CgroupFreezer` reports which processes couldn't be frozen so that the
+caller can fall back to SIGSTOP_.
+
+.. _control groups: https://www.kernel.org/doc/html/latest/admin-guide/cgroup-v2.html
+.. _SIGSTOP: http://en.wikipedia.org/wiki/Unix_signal#SIGSTOP
+"""
+
+# Standard library modules.
+import logging
+import os
+import time
+
+# External dependencies.
+from humanfriendly import Timer
+
+# Public identifiers that require documentation.
+__all__ = (
+    'CgroupFreezer',
+    'DEFAULT_FREEZE_TIMEOUT',
+    'find_cgroup_directory',
+    'find_cgroup_mount',
+    'freeze_cgroup',
+    'is_freezable',
+    'logger',
+    'read_cgroup_events',
+    'set_frozen',
+    'thaw_cgroup',
+)
+
+# Initialize a logger.
+logger = logging.getLogger(__name__)
+
+DEFAULT_FREEZE_TIMEOUT = 10
+"""
+The number of seconds to wait for a freeze or thaw to take effect (a number).
+
+Refer to :func:`freeze_cgroup()` and :func:`thaw_cgroup()` for details about
+how :data:`DEFAULT_FREEZE_TIMEOUT` is used.
+"""
+
+
+class CgroupFreezer(object):
+
+    """
+    Context manager that freezes the control groups of processes.
+
+    Here's an example:
+
+    >>> from proc.cgroup import CgroupFreezer
+    >>> with CgroupFreezer([1234]) as freezer:
+    ...     if freezer.unfrozen:
+    ...         print("Process 1234 couldn't be frozen!")
+    ...     # Inspect the frozen processes here.
+
+    The control groups are thawed when the context is left (also when an
+    exception is raised). Control groups that contain the current process
+    (directly or via a descendant control group) are never frozen, because
+    that would freeze the current process as well.
+    """
+
+    def __init__(self, pids, timeout=DEFAULT_FREEZE_TIMEOUT):
+        """
+        Initialize a :class:`CgroupFreezer` object.
+
+        :param pids: An iterable of process IDs (integers).
+        :param timeout: Refer to :func:`freeze_cgroup()`.
+        """
+        self.pids = list(pids)
+        self.timeout = timeout
+        self.frozen = []
+        self.unfrozen = []
+
+    def __enter__(self):
+        """
+        Freeze the control groups of the processes.
+
+        :returns: The :class:`CgroupFreezer` object. The :attr:`frozen`
+                  attribute is set to a list with the pathnames of the
+                  frozen control groups and the :attr:`unfrozen` attribute
+                  is set to a list with the process IDs whose control group
+                  couldn't be frozen.
+        """
+        own_directory = find_cgroup_directory(os.getpid())
+        for pid in self.pids:
+            directory = find_cgroup_directory(pid)
+            if directory in self.frozen:
+                continue
+            if not (directory and is_freezable(directory)):
+                logger.debug("Control group of process %i can't be frozen.", pid)
+                self.unfrozen.append(pid)
+            elif own_directory and (own_directory + '/').startswith(directory + '/'):
+                logger.debug("Refusing to freeze control group %s because it contains our own process.", directory)
+                self.unfrozen.append(pid)
+            elif freeze_cgroup(directory, timeout=self.timeout):
+                self.frozen.append(directory)
+            else:
+                self.unfrozen.append(pid)
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Thaw the frozen control groups."""
+        while self.frozen:
+            thaw_cgroup(self.frozen.pop(), timeout=self.timeout)
+
+
+def find_cgroup_directory(pid):
+    """
+    Find the cgroup v2 directory of a process.
+
+    :param pid: The process ID (an integer).
+    :returns: The pathname of the control group directory (a string) or
+              :data:`None` when the process doesn't exist or isn't part of
+              a cgroup v2 hierarchy.
+    """
+    mount_point = find_cgroup_mount()
+    if mount_point:
+        try:
+            with open('/proc/%i/cgroup' % pid) as handle:
+                for line in handle:
+                    hierarchy, _, path = line.strip().split(':', 2)
+                    if hierarchy == '0':
+                        directory = os.path.join(mount_point, path.lstrip('/')).rstrip('/')
+                        if os.path.isdir(directory):
+                            return directory
+        except EnvironmentError:
+            pass
+    return None
+
+
+def find_cgroup_mount():
+    """
+    Find the mount point of the cgroup v2 hierarchy.
+
+    :returns: The pathname of the mount point (a string) or :data:`None`
+              when no cgroup v2 hierarchy is mounted.
+    """
+    try:
+        with open('/proc/mounts') as handle:
+            for line in handle:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] == 'cgroup2':
+                    return fields[1]
+    except EnvironmentError:
+        pass
+    return None
+
+
+def is_freezable(directory):
+    """
+    Check whether a control group can be frozen.
+
+    :param directory: The pathname of the control group directory (a string).
+    :returns: :data:`True` if the control group has a writable
+              ``cgroup.freeze`` file, :data:`False` otherwise (the root
+              control group can't be frozen).
+    """
+    return os.access(os.path.join(directory, 'cgroup.freeze'), os.W_OK)
+
+
+def freeze_cgroup(directory, timeout=DEFAULT_FREEZE_TIMEOUT):
+    """
+    Freeze all processes in a control group.
+
+    :param directory: The pathname of the control group directory (a string).
+    :param timeout: The maximum number of seconds to wait for the freeze to
+                    take effect (a number, defaults to
+                    :data:`DEFAULT_FREEZE_TIMEOUT`).
+    :returns: :data:`True` if the control group was frozen, :data:`False`
+              otherwise (in which case it has been thawed again).
+    """
+    logger.info("Freezing control group %s ..", directory)
+    if set_frozen(directory, True, timeout):
+        return True
+    logger.warning("Failed to freeze control group %s!", directory)
+    set_frozen(directory, False, timeout)
+    return False
+
+
+def thaw_cgroup(directory, timeout=DEFAULT_FREEZE_TIMEOUT):
+    """
+    Thaw all processes in a control group.
+
+    :param directory: The pathname of the control group directory (a string).
+    :param timeout: The maximum number of seconds to wait for the thaw to
+                    take effect (a number, defaults to
+                    :data:`DEFAULT_FREEZE_TIMEOUT`).
+    :returns: :data:`True` if the control group was thawed, :data:`False`
+              otherwise.
+    """
+    logger.info("Thawing control group %s ..", directory)
+    if set_frozen(directory, False, timeout):
+        return True
+    logger.warning("Failed to thaw control group %s!", directory)
+    return False
+
+
+def read_cgroup_events(directory):
+    """
+    Read the ``cgroup.events`` file of a control group.
+
+    :param directory: The pathname of the control group directory (a string).
+    :returns: A dictionary with string keys and integer values (empty when
+              the file can't be read).
+    """
+    events = {}
+    try:
+        with open(os.path.join(directory, 'cgroup.events')) as handle:
+            for line in handle:
+                name, _, value = line.partition(' ')
+                if value.strip().isdigit():
+                    events[name] = int(value)
+    except EnvironmentError:
+        pass
+    return events
+
+
+def set_frozen(directory, frozen, timeout):
+    """
+    Write to ``cgroup.freeze`` and wait for the change to take effect.
+
+    :param directory: The pathname of the control group directory (a string).
+    :param frozen: :data:`True` to freeze, :data:`False` to thaw.
+    :param timeout: The maximum number of seconds to wait (a number).
+    :returns: :data:`True` if ``cgroup.events`` reports the expected state
+              within the timeout, :data:`False` otherwise.
+    """
+    try:
+        with open(os.path.join(directory, 'cgroup.freeze'), 'w') as handle:
+            handle.write('1' if frozen else '0')
+    except EnvironmentError as e:
+        logger.debug("Failed to write %s/cgroup.freeze! (%s)", directory, e)
+        return False
+    timer = Timer()
+    delay = 0.001
+    while read_cgroup_events(directory).get('frozen') != int(frozen):
+        if timer.elapsed_time >= timeout:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    return True
@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -30,19 +30,26 @@ import time
 # External dependencies.
 from executor import which
 from proc.unix import UnixProcess
-from property_manager import lazy_property
+from property_manager import clear_property, lazy_property, writable_property
+from humanfriendly.compat import basestring
 from humanfriendly.deprecation import define_aliases
 
 # Public identifiers that require documentation.
 __all__ = (
+    'BULK_LIVENESS_THRESHOLD',
     'NUM_RACE_CONDITIONS',
     'OwnerIDs',
     'Process',
     'ProtectedAccess',
+    'STAT_PROPERTIES',
+    'alive_pids',
     'find_processes',
     'find_system_uptime',
+    'find_unix_sockets',
+    'get_owner_uid',
     'gid_to_name',
     'logger',
+    'parse_pid_namespace',
     'parse_process_cmdline',
     'parse_process_status',
     'sorted_by_pid',
@@ -52,7 +59,25 @@ __all__ = (
 # Initialize a logger.
 logger = logging.getLogger(__name__)
 
-NUM_RACE_CONDITIONS = dict(cmdline=0, environ=0, exe=0, stat=0, status=0)
+BULK_LIVENESS_THRESHOLD = 64
+"""
+The number of processes from which :func:`alive_pids()` switches to listing ``/proc`` (an integer).
+
+Below this number of processes sending signal 0 to each process is cheaper
+than listing ``/proc``, above this number the opposite is true.
+"""
+
+STAT_PROPERTIES = (
+    'comm', 'cstime', 'cutime', 'pgrp', 'pid', 'ppid', 'rss', 'session',
+    'starttime', 'state', 'stime', 'utime', 'vsize',
+)
+"""
+The names of the :class:`Process` properties that are derived from ``/proc/[pid]/stat`` (a tuple of strings).
+
+These are the properties that are reset by :func:`Process.update_status()`.
+"""
+
+NUM_RACE_CONDITIONS = dict(cmdline=0, environ=0, exe=0, fd=0, io=0, stat=0, status=0)
 """
 A dictionary with string keys and integer values that's used to keep global
 counters that track the number of detected race conditions. This is only useful
@@ -91,6 +116,10 @@ class Process(UnixProcess):
     :attr:`ppid`           3
     :attr:`pgrp`           4
     :attr:`session`        5
+    :attr:`utime`         13
+    :attr:`stime`         14
+    :attr:`cutime`        15
+    :attr:`cstime`        16
     :attr:`starttime`     21
     :attr:`vsize`         22
     :attr:`rss`           23
@@ -299,6 +328,42 @@ class Process(UnixProcess):
         return self.cmdline
 
     @property
+    def cpu_time(self):
+        """
+        The CPU time consumed by the process in seconds (a float).
+
+        This is the sum of :attr:`utime` and :attr:`stime`.
+        """
+        return self.utime + self.stime
+
+    @lazy_property
+    def cstime(self):
+        """
+        The time waited-for children have been scheduled in kernel mode in seconds (a float).
+
+        This is the kernel mode counterpart of :attr:`cutime`.
+
+        **Availability:** This property is parsed from the contents of
+        ``/proc/[pid]/stat`` and is always available.
+        """
+        return int(self.stat_fields[16]) / float(os.sysconf('SC_CLK_TCK'))
+
+    @lazy_property
+    def cutime(self):
+        """
+        The time waited-for children have been scheduled in user mode in seconds (a float).
+
+        This includes the CPU time of all descendants of the process that have
+        ended and were reaped, so the sum of :attr:`cpu_time`, :attr:`cutime`
+        and :attr:`cstime` covers the CPU time consumed by processes that are
+        no longer visible in the process tree.
+
+        **Availability:** This property is parsed from the contents of
+        ``/proc/[pid]/stat`` and is always available.
+        """
+        return int(self.stat_fields[15]) / float(os.sysconf('SC_CLK_TCK'))
+
+    @writable_property
     def cwd(self):
         """
         The working directory of the process (a string or :data:`None`).
@@ -467,6 +532,36 @@ class Process(UnixProcess):
         """
         return self._parse_ids('Gid')
 
+    @lazy_property
+    def io_counters(self):
+        """
+        I/O statistics of the process (a dictionary with string keys and integer values).
+
+        The dictionaries constructed by this property are based on the
+        contents of ``/proc/[pid]/io``, for example the ``read_bytes`` and
+        ``write_bytes`` keys give the number of bytes the process caused to be
+        fetched from or sent to the storage layer.
+
+        **Availability:**
+
+        - This property is parsed from the contents of ``/proc/[pid]/io`` the
+          first time it is referenced, after that its value is cached so it
+          will always be available.
+
+        - The ``/proc/[pid]/io`` file is only readable by the owner of the
+          process (and root) and isn't available when the kernel was built
+          without I/O accounting. In these cases an empty dictionary is
+          returned.
+        """
+        counters = {}
+        with ProtectedAccess('io', "read I/O statistics"):
+            with open(os.path.join(self.proc_tree, 'io')) as handle:
+                for line in handle:
+                    name, _, value = line.partition(':')
+                    if value.strip().isdigit():
+                        counters[name.strip()] = int(value)
+        return counters
+
     @property
     def is_alive(self):
         """
@@ -495,6 +590,25 @@ class Process(UnixProcess):
         """
         return self.is_alive
 
+    @lazy_property
+    def namespace_pids(self):
+        """
+        The process IDs of the process in each nested PID namespace (a list of integers).
+
+        The first process ID is the process ID in the outermost PID namespace
+        (the one that :attr:`pid` is based on) and the last process ID is the
+        process ID as seen from inside the PID namespace the process belongs
+        to (for example the init process of a container has 1 as the last
+        process ID).
+
+        **Availability:** This property is parsed from the ``NSpid`` field in
+        ``/proc/[pid]/status`` (refer to :attr:`status_fields`) which was
+        introduced in Linux 4.1. When the field is unavailable a list with
+        only :attr:`pid` is returned.
+        """
+        raw_value = self.status_fields.get('NSpid', '')
+        return [int(n) for n in raw_value.split()] or [self.pid]
+
     @lazy_property
     def pgrp(self):
         """
@@ -515,6 +629,15 @@ class Process(UnixProcess):
         """
         return int(self.stat_fields[0])
 
+    @lazy_property
+    def pid_namespace(self):
+        """
+        The identifier of the PID namespace that the process belongs to (an integer or :data:`None`).
+
+        **Availability:** Refer to :func:`parse_pid_namespace()`.
+        """
+        return parse_pid_namespace(self.proc_tree)
+
     @lazy_property
     def ppid(self):
         """
@@ -586,6 +709,37 @@ class Process(UnixProcess):
         """
         return int(self.stat_fields[5])
 
+    @lazy_property
+    def socket_inodes(self):
+        """
+        The inode numbers of the sockets held open by the process (a list of integers).
+
+        These are the inode numbers of the ``socket:[inode]`` links in
+        ``/proc/[pid]/fd``. They can be mapped to the pathnames of UNIX
+        domain sockets using :func:`find_unix_sockets()`.
+
+        **Availability:**
+
+        - This property is based on the contents of ``/proc/[pid]/fd`` the
+          first time it is referenced, after that its value is cached so it
+          will always be available.
+
+        - The ``/proc/[pid]/fd`` directory is only readable by the owner of
+          the process (and root), in other cases an empty list is returned.
+        """
+        inodes = []
+        directory = os.path.join(self.proc_tree, 'fd')
+        with ProtectedAccess('fd', "list open file descriptors"):
+            for entry in os.listdir(directory):
+                try:
+                    target = os.readlink(os.path.join(directory, entry))
+                except OSError:
+                    # The file descriptor was closed after we listed it.
+                    continue
+                if target.startswith('socket:['):
+                    inodes.append(int(target[8:-1]))
+        return inodes
+
     @lazy_property
     def starttime(self):
         """
@@ -673,6 +827,20 @@ class Process(UnixProcess):
                     fields[name] = value.strip()
         return fields
 
+    @lazy_property
+    def stime(self):
+        """
+        The time the process has been scheduled in kernel mode in seconds (a float).
+
+        This property translates *clock ticks* to *seconds* by dividing the
+        value extracted from ``/proc/[pid]/stat`` with the result of
+        ``os.sysconf('SC_CLK_TCK')``.
+
+        **Availability:** This property is parsed from the contents of
+        ``/proc/[pid]/stat`` and is always available.
+        """
+        return int(self.stat_fields[14]) / float(os.sysconf('SC_CLK_TCK'))
+
     @lazy_property
     def user(self):
         """
@@ -693,6 +861,20 @@ class Process(UnixProcess):
         """
         return self._parse_ids('Uid')
 
+    @lazy_property
+    def utime(self):
+        """
+        The time the process has been scheduled in user mode in seconds (a float).
+
+        This property translates *clock ticks* to *seconds* by dividing the
+        value extracted from ``/proc/[pid]/stat`` with the result of
+        ``os.sysconf('SC_CLK_TCK')``.
+
+        **Availability:** This property is parsed from the contents of
+        ``/proc/[pid]/stat`` and is always available.
+        """
+        return int(self.stat_fields[13]) / float(os.sysconf('SC_CLK_TCK'))
+
     @lazy_property
     def vsize(self):
         """
@@ -703,6 +885,28 @@ class Process(UnixProcess):
         """
         return int(self.stat_fields[22])
 
+    def update_status(self):
+        """
+        Refresh the properties that are based on ``/proc/[pid]/stat``.
+
+        :returns: :data:`True` if ``/proc/[pid]/stat`` was successfully read,
+                  :data:`False` if the process has ended.
+
+        This method re-reads ``/proc/[pid]/stat`` and resets the cached values
+        of the properties listed in :data:`STAT_PROPERTIES` so that they will
+        be recomputed the next time they are referenced. Other cached
+        properties (like :attr:`cmdline` and :attr:`exe`) are left alone.
+        This is useful for long lived :class:`Process` objects whose
+        :attr:`ppid` can change when their parent process ends.
+        """
+        stat_fields = parse_process_status(self.proc_tree, silent=True)
+        if stat_fields:
+            self.stat_fields = stat_fields
+            for name in STAT_PROPERTIES:
+                clear_property(self, name)
+            return True
+        return False
+
     def _parse_ids(self, field_name):
         """Helper for :attr:`user_ids` and :attr:`group_ids`."""
         raw_value = self.status_fields.get(field_name, '')
@@ -721,28 +925,138 @@ class OwnerIDs(collections.namedtuple('OwnerIDs', 'real, effective, saved, fs'))
     """
 
 
-def find_processes(obj_type=Process):
+def find_processes(obj_type=Process, pid_namespace=None, comm=None, uid=None):
     """
     Scan the numerical subdirectories of ``/proc`` for process information.
 
     :param obj_type: The type of process objects to construct (expected to be
                      :class:`Process` or a subclass of :class:`Process`).
+    :param pid_namespace: If this parameter is given, only processes in the
+                          given PID namespace will be returned (an integer,
+                          refer to :func:`parse_pid_namespace()`). Processes
+                          in other PID namespaces are skipped before their
+                          ``/proc/[pid]/stat`` file is read.
+    :param comm: If this parameter is given, only processes with the given
+                 :attr:`~Process.comm` value will be returned (a string or
+                 a collection of strings). Other processes are skipped
+                 before a process object is constructed for them.
+    :param uid: If this parameter is given, only processes owned by the
+                given user ID will be returned (an integer). The owner is
+                determined using :func:`os.stat()` on ``/proc/[pid]``
+                (this is the effective user ID of the process, except for
+                processes that aren't dumpable, e.g. setuid programs, which
+                are owned by root) so processes of other users are skipped
+                before their ``/proc/[pid]/stat`` file is read.
     :returns: A generator of :class:`Process` objects.
     """
     if not issubclass(obj_type, Process):
         raise TypeError("Custom process types should inherit from proc.core.Process!")
+    if comm is not None and isinstance(comm, basestring):
+        comm = (comm,)
     root = '/proc'
     num_processes = 0
     logger.debug("Scanning for process information in %r ..", root)
     for entry in os.listdir(root):
         if entry.isdigit():
-            process = obj_type.from_path(os.path.join(root, entry))
+            directory = os.path.join(root, entry)
+            if uid is not None and get_owner_uid(directory) != uid:
+                continue
+            if pid_namespace is not None and parse_pid_namespace(directory) != pid_namespace:
+                continue
+            if comm is None:
+                process = obj_type.from_path(directory)
+            else:
+                stat_fields = parse_process_status(directory)
+                process = obj_type(directory, stat_fields) if stat_fields and stat_fields[1] in comm else None
             if process:
                 num_processes += 1
                 yield process
     logger.debug("Finished scanning %r, found %i processes.", root, num_processes)
 
 
+def get_owner_uid(directory):
+    """
+    Get the user ID that owns a ``/proc/[pid]`` directory.
+
+    :param directory: The absolute pathname of the numerical subdirectory of
+                      ``/proc`` (a string).
+    :returns: The user ID (an integer) or :data:`None` when the process
+              has ended.
+    """
+    try:
+        return os.stat(directory).st_uid
+    except OSError:
+        return None
+
+
+def alive_pids(processes, exclude_zombies=False, threshold=BULK_LIVENESS_THRESHOLD):
+    """
+    Check which of the given processes are alive, in bulk.
+
+    :param processes: An iterable of process IDs (integers) and/or
+                      :class:`Process` objects.
+    :param exclude_zombies: :data:`True` to consider zombie_ processes dead,
+                            :data:`False` to consider them alive (the
+                            default).
+    :param threshold: The number of processes from which ``/proc`` is listed
+                      instead of signaling each process (an integer, defaults
+                      to :data:`BULK_LIVENESS_THRESHOLD`).
+    :returns: A set with the process IDs of the processes that are alive.
+
+    This function is meant for checking the liveness of many processes at
+    once, without the overhead of :attr:`Process.is_alive` or
+    :attr:`~proc.unix.UnixProcess.is_running` for each of them:
+
+    - When the number of processes reaches `threshold` a single listing of
+      ``/proc`` is used to check which process IDs are in use, otherwise
+      signal 0 is sent to each process (refer to
+      :attr:`~proc.unix.UnixProcess.is_running` for details).
+
+    - For :class:`Process` objects the start time of the process is
+      compared to the start time in ``/proc/[pid]/stat`` so that a process ID
+      that was reused by an unrelated process isn't reported as alive.
+
+    - When `exclude_zombies` is :data:`True` the state of the process is
+      taken from the same ``/proc/[pid]/stat`` file.
+
+    Only the processes that survive the first step have their
+    ``/proc/[pid]/stat`` file read, and only when this is required for the
+    second or third step. Process IDs that aren't positive are never
+    reported as alive.
+    """
+    expected_starttimes = {}
+    pids = set()
+    for process in processes:
+        if isinstance(process, Process):
+            expected_starttimes[process.pid] = process.stat_fields[21]
+            pids.add(process.pid)
+        elif process > 0:
+            # Signal 0 would be sent to process groups for
+            # process IDs that aren't positive, so we skip them.
+            pids.add(process)
+    if len(pids) >= threshold:
+        alive = pids.intersection(int(entry) for entry in os.listdir('/proc') if entry.isdigit())
+    else:
+        alive = set()
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+                alive.add(pid)
+            except OSError as e:
+                if e.errno == errno.EPERM:
+                    alive.add(pid)
+                elif e.errno != errno.ESRCH:
+                    raise
+    for pid in list(alive):
+        if exclude_zombies or pid in expected_starttimes:
+            stat_fields = parse_process_status(os.path.join('/proc', str(pid)), silent=True)
+            if not (stat_fields and
+                    (not exclude_zombies or stat_fields[2] != 'Z') and
+                    expected_starttimes.get(pid, stat_fields[21]) == stat_fields[21]):
+                alive.discard(pid)
+    return alive
+
+
 def find_system_uptime():
     """
     Find the system's uptime.
@@ -757,6 +1071,29 @@ def find_system_uptime():
         return float(fields[0])
 
 
+def find_unix_sockets():
+    """
+    Find the UNIX domain sockets that are bound to a pathname.
+
+    :returns: A dictionary that maps inode numbers (integers) to pathnames
+              (strings). Sockets in the abstract namespace have pathnames
+              that start with ``@``.
+
+    This function parses ``/proc/net/unix`` once, so the resulting index can
+    be used to map the :attr:`~Process.socket_inodes` of any number of
+    processes to pathnames without reading ``/proc/net/unix`` again.
+    """
+    index = {}
+    with open('/proc/net/unix') as handle:
+        # Skip the header line.
+        next(handle, None)
+        for line in handle:
+            fields = line.split(None, 7)
+            if len(fields) == 8 and fields[6].isdigit():
+                index[int(fields[6])] = fields[7].rstrip('\n')
+    return index
+
+
 def sorted_by_pid(processes):
     """
     Sort the given processes by their process ID.
@@ -815,6 +1152,29 @@ def parse_process_status(directory, silent=False):
             return fields
 
 
+def parse_pid_namespace(directory):
+    """
+    Find the PID namespace of a process.
+
+    :param directory: The absolute pathname of the numerical subdirectory of
+                      ``/proc`` to get process information from (a string).
+    :returns: The inode number of the PID namespace (an integer) or
+              :data:`None` when the ``/proc/[pid]/ns/pid`` symbolic link can't
+              be dereferenced (because the process has ended or because
+              you don't have permission to inspect the process).
+
+    The symbolic link ``/proc/[pid]/ns/pid`` points to a string like
+    ``pid:[4026531836]`` where the number uniquely identifies the PID
+    namespace. Two processes are in the same PID namespace when this number
+    is the same.
+    """
+    try:
+        target = os.readlink(os.path.join(directory, 'ns', 'pid'))
+        return int(target[target.index('[') + 1:target.rindex(']')])
+    except Exception:
+        return None
+
+
 def parse_process_cmdline(directory):
     """
     Read and tokenize a ``/proc/[pid]/cmdline`` file.
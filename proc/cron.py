@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -83,38 +83,65 @@ Internal documentation of :mod:`proc.cron`
 """
 
 # Standard library modules.
+import collections
 import functools
 import getopt
+import json
 import logging
+import operator
 import os
 import sys
+import threading
+import time
 
 # External dependencies.
 import coloredlogs
 from executor import ExternalCommandFailed, execute, quote, which
-from humanfriendly import Timer, format_timespan
+from humanfriendly import Timer, format_timespan, parse_timespan
 from humanfriendly.terminal import usage, warning
-from humanfriendly.terminal.spinners import Spinner
+from humanfriendly.terminal.spinners import MINIMUM_INTERVAL, Spinner
 from humanfriendly.text import concatenate, pluralize
 
 # Modules provided by our package.
-from proc.core import sorted_by_pid
-from proc.tree import get_process_tree
+from proc.apache import StatsList
+from proc.cgroup import CgroupFreezer
+from proc.core import Process, find_processes, sorted_by_pid
+from proc.tree import get_subtree
+from proc.unix import wait_for_many
 
 # Public identifiers that require documentation.
 __all__ = (
     'ADDITIONS_SCRIPT_NAME',
+    'CRON_DAEMON',
+    'CRON_PIDFILES',
+    'CRON_SYSTEMD_UNIT',
     'CronDaemonNotRunning',
+    'DEFAULT_KILL_AFTER',
+    'DEFAULT_SAMPLE_INTERVAL',
+    'GracefulOptions',
+    'JobReport',
+    'ResourceLedger',
+    'RunningScheduler',
+    'SCHEDULER_DAEMONS',
+    'SchedulerDaemon',
     'USAGE_TEXT',
     'cron_graceful',
     'ensure_root_privileges',
     'find_cron_daemon',
+    'find_cron_daemon_pid',
+    'find_running_schedulers',
+    'find_scheduler_pid',
+    'find_systemd_main_pid',
+    'is_cron_daemon',
+    'is_scheduler_process',
     'logger',
     'main',
     'parse_arguments',
+    'read_pidfile',
     'run_additions',
     'terminate_cron_daemon',
     'wait_for_processes',
+    'write_report',
 )
 
 # Initialize a logger.
@@ -131,22 +158,55 @@ Refer to :func:`run_additions()` for details about how
 :data:`ADDITIONS_SCRIPT_NAME` is used.
 """
 
+CRON_PIDFILES = ('/run/crond.pid', '/var/run/crond.pid')
+"""
+The pathnames of pidfiles that may contain the process ID of the cron daemon (a tuple of strings).
+
+Refer to :func:`find_cron_daemon_pid()` for details about how
+:data:`CRON_PIDFILES` is used.
+"""
+
+CRON_SYSTEMD_UNIT = 'cron.service'
+"""
+The name of the systemd unit that runs the cron daemon (a string).
+
+Refer to :func:`find_cron_daemon_pid()` for details about how
+:data:`CRON_SYSTEMD_UNIT` is used.
+"""
+
+DEFAULT_KILL_AFTER = 10
+"""
+The number of seconds between SIGTERM and SIGKILL during escalation (a number).
+
+Refer to :func:`wait_for_processes()` for details about how
+:data:`DEFAULT_KILL_AFTER` is used.
+"""
+
+DEFAULT_SAMPLE_INTERVAL = 1
+"""
+The number of seconds between samples of the resource usage of cron jobs (a number).
+
+Refer to :func:`wait_for_processes()` for details about how
+:data:`DEFAULT_SAMPLE_INTERVAL` is used.
+"""
+
 USAGE_TEXT = """
 Usage: cron-graceful [OPTIONS]
 
 Gracefully stop the cron job scheduler by waiting for all running cron
 jobs to finish. The cron-graceful program works as follows:
 
-1. Identify the cron daemon process and send it a SIGSTOP signal to
-   prevent it from scheduling new cron jobs without killing it.
+1. Identify the scheduler daemon processes (cron, cronie, anacron and
+   fcron are supported) and send them a SIGSTOP signal to prevent them
+   from scheduling new jobs without killing them.
 
-2. Identify the currently running cron jobs by navigating the process
-   tree (if the cron daemon process had been killed in step one this
-   wouldn't be possible) and wait for the cron jobs to finish.
+2. Identify the currently running jobs by navigating the process tree
+   (if the daemon processes had been killed in step one this wouldn't
+   be possible) and wait for the jobs of all schedulers to finish.
 
-4. Terminate the cron daemon process (because we've already identified
-   the running cron jobs and no new cron jobs can be scheduled we no
-   longer need the daemon).
+4. Terminate the scheduler daemon processes (because we've already
+   identified the running jobs and no new jobs can be scheduled we no
+   longer need the daemons).
 
 If a command named `cron-graceful-additions' exists in the $PATH it
 will be executed between steps one and two. This allows you to inject
@@ -155,6 +215,45 @@ warning will be logged but the cron-graceful program will continue.
 
 Supported options:
 
+  -t, --timeout=SECONDS
+
+    Wait at most SECONDS for the running cron jobs to finish. Jobs that
+    are still running once the deadline has passed are terminated (in
+    parallel) by sending SIGTERM to the job and its child processes,
+    followed by SIGKILL for processes that don't respond to SIGTERM.
+    The value can also be given with a unit, e.g. `30m' or `2h'.
+
+  --term-after=SECONDS
+
+    Terminate individual cron jobs once their runtime exceeds SECONDS,
+    without waiting for the deadline given by --timeout.
+
+  --kill-after=SECONDS
+
+    The number of seconds that terminated cron jobs are given to exit
+    before they're killed using SIGKILL (defaults to 10 seconds).
+
+  -r, --report=FILE
+
+    Write a JSON report about the drained cron jobs to FILE. The report
+    includes the runtime, exit time and resource usage of each job and
+    the escalation (if any) that was needed to stop it.
+
+  -l, --ledger=FILE
+
+    Append the resource usage (peak memory usage, CPU time and disk I/O)
+    of the drained cron jobs to the ledger FILE. The history in the
+    ledger is used to predict how long the drain will take and to warn
+    about jobs whose resource usage is getting worse.
+
+  -f, --freeze
+
+    Freeze the cgroup v2 control groups of the scheduler daemons while
+    the running jobs are identified, so that jobs can't fork new
+    processes while the process tree is being inspected. The control
+    groups are thawed before waiting for the jobs. When a control group
+    can't be frozen cron-graceful relies on SIGSTOP only.
+
   -n, --dry-run
 
     Don't make any changes (doesn't require root access).
@@ -183,40 +282,73 @@ def cron_graceful(arguments):
     """Command line interface for the ``cron-graceful`` program."""
     runtime_timer = Timer()
     # Initialize logging to the terminal.
-    dry_run = parse_arguments(arguments)
+    options = parse_arguments(arguments)
+    dry_run = options.dry_run
     if not dry_run:
         ensure_root_privileges()
-    try:
-        cron_daemon = find_cron_daemon()
-    except CronDaemonNotRunning:
-        logger.info("No running cron daemon found, assuming it was previously stopped ..")
+    ledger = ResourceLedger(options.ledger) if options.ledger else None
+    schedulers = find_running_schedulers()
+    if not schedulers:
+        logger.info("No running scheduler daemons found, assuming they were previously stopped ..")
     else:
         if not dry_run:
-            # Prevent the cron daemon from starting new cron jobs.
-            cron_daemon.suspend()
+            # Prevent the scheduler daemons from starting new jobs.
+            for running in schedulers:
+                running.process.suspend()
             # Enable user defined additional logic.
             run_additions()
         # Identify the running cron jobs based on the process tree _after_ the
-        # cron daemon has been paused (assuming we're not performing a dry run)
-        # so we know for sure that we see all running cron jobs (also we're not
-        # interested in any processes that have already been stopped by
-        # cron-graceful-additions).
-        cron_daemon = find_cron_daemon()
-        cron_jobs = sorted_by_pid(cron_daemon.grandchildren)
+        # scheduler daemons have been paused (assuming we're not performing a
+        # dry run) so we know for sure that we see all running cron jobs (also
+        # we're not interested in any processes that have already been stopped
+        # by cron-graceful-additions). Only the subtrees of the scheduler
+        # daemons are constructed, the rest of the process tree is irrelevant.
+        # When requested the control groups of the scheduler daemons are
+        # frozen while the subtrees are constructed, so that running jobs
+        # can't fork new processes while we're looking.
+        freeze_pids = [r.process.pid for r in schedulers] if options.freeze and not dry_run else []
+        with CgroupFreezer(freeze_pids) as freezer:
+            if freezer.unfrozen:
+                logger.info("Couldn't freeze control group of %s, relying on SIGSTOP instead.",
+                            pluralize(len(freezer.unfrozen), "scheduler daemon"))
+            schedulers = [r._replace(process=get_subtree(r.process.pid) or r.process) for r in schedulers]
+            cron_jobs = {}
+            for running in schedulers:
+                for job in running.scheduler.find_jobs(running.process):
+                    cron_jobs.setdefault(job.pid, job)
+        cron_jobs = sorted_by_pid(cron_jobs.values())
         if cron_jobs:
             logger.info("Found %s: %s",
                         pluralize(len(cron_jobs), "running cron job"),
                         concatenate(str(j.pid) for j in cron_jobs))
-            # Wait for the running cron jobs to finish.
-            wait_for_processes(cron_jobs)
+            if ledger:
+                prediction = ledger.predict_drain_time(cron_jobs)
+                if prediction is not None:
+                    logger.info("Predicted drain time based on %s: %s", ledger.filename, format_timespan(prediction))
+            # Wait for the running cron jobs (of all schedulers) to finish.
+            reports = wait_for_processes(
+                cron_jobs, timeout=options.timeout, term_after=options.term_after,
+                kill_after=options.kill_after, dry_run=dry_run,
+            )
         else:
             logger.info("No running cron jobs found.")
-        # Terminate the cron daemon.
-        if dry_run:
-            logger.info("Stopping cron daemon with process id %i ..", cron_daemon.pid)
-        else:
-            terminate_cron_daemon(cron_daemon)
-        logger.info("Done! Took %s to gracefully terminate cron.", runtime_timer.rounded)
+            reports = []
+        if options.report:
+            write_report(options.report, reports)
+        if ledger and reports:
+            for report, field, value, median in ledger.find_regressions(reports):
+                logger.warning("Job %i (%s) regressed: %s is %s while the median of previous runs is %s.",
+                               report.pid, quote(report.cmdline), field, value, median)
+            if not dry_run:
+                ledger.record(reports)
+        # Terminate the scheduler daemons.
+        for running in schedulers:
+            if dry_run:
+                logger.info("Stopping %s daemon with process id %i ..", running.scheduler.name, running.process.pid)
+            else:
+                terminate_cron_daemon(running.process, running.scheduler)
+        logger.info("Done! Took %s to gracefully terminate %s.", runtime_timer.rounded,
+                    concatenate(r.scheduler.name for r in schedulers))
 
 
 def parse_arguments(arguments):
@@ -224,15 +356,34 @@ def parse_arguments(arguments):
     Parse the command line arguments.
 
     :param arguments: A list of strings with command line arguments.
-    :returns: ``True`` if a dry run was requested, ``False`` otherwise.
+    :returns: A :class:`GracefulOptions` object.
     """
     dry_run = False
+    timeout = None
+    term_after = None
+    kill_after = DEFAULT_KILL_AFTER
+    report = None
+    ledger = None
+    freeze = False
     try:
-        options, arguments = getopt.gnu_getopt(arguments, 'nvqh', [
-            'dry-run', 'verbose', 'quiet', 'help'
+        options, arguments = getopt.gnu_getopt(arguments, 't:r:l:fnvqh', [
+            'timeout=', 'term-after=', 'kill-after=', 'report=', 'ledger=', 'freeze',
+            'dry-run', 'verbose', 'quiet', 'help',
         ])
         for option, value in options:
-            if option in ('-n', '--dry-run'):
+            if option in ('-t', '--timeout'):
+                timeout = parse_timespan(value)
+            elif option == '--term-after':
+                term_after = parse_timespan(value)
+            elif option == '--kill-after':
+                kill_after = parse_timespan(value)
+            elif option in ('-r', '--report'):
+                report = value
+            elif option in ('-l', '--ledger'):
+                ledger = value
+            elif option in ('-f', '--freeze'):
+                freeze = True
+            elif option in ('-n', '--dry-run'):
                 dry_run = True
             elif option in ('-v', '--verbose'):
                 coloredlogs.increase_verbosity()
@@ -243,7 +394,9 @@ def parse_arguments(arguments):
                 sys.exit(0)
             else:
                 assert False, "Unhandled option!"
-        return dry_run
+        return GracefulOptions(dry_run=dry_run, timeout=timeout, term_after=term_after,
+                               kill_after=kill_after, report=report, ledger=ledger,
+                               freeze=freeze)
     except Exception as e:
         warning("Error: Failed to parse command line arguments! (%s)", e)
         sys.exit(1)
@@ -262,17 +415,167 @@ def find_cron_daemon():
     """
     Find the cron daemon process.
 
-    :returns: A :class:`~proc.tree.ProcessNode` object.
+    :returns: A :class:`~proc.tree.ProcessNode` object (the root of the
+              subtree constructed by :func:`~proc.tree.get_subtree()`).
     :raises: :exc:`CronDaemonNotRunning` when the cron daemon process cannot
              be located.
     """
-    init = get_process_tree()
-    cron = init.find(exe_name='cron')
+    pid = find_cron_daemon_pid()
+    cron = get_subtree(pid) if pid else None
     if not cron:
         raise CronDaemonNotRunning("Failed to determine process id of cron daemon process! Is it running?")
     return cron
 
 
+def find_cron_daemon_pid():
+    """
+    Find the process ID of the cron daemon.
+
+    :returns: The process ID (an integer) or :data:`None`.
+
+    This function calls :func:`find_scheduler_pid()` for :data:`CRON_DAEMON`.
+    """
+    return find_scheduler_pid(CRON_DAEMON)
+
+
+def find_running_schedulers(schedulers=None):
+    """
+    Find the scheduler daemons that are currently running.
+
+    :param schedulers: A list of :class:`SchedulerDaemon` objects (defaults
+                       to :data:`SCHEDULER_DAEMONS`).
+    :returns: A list of :class:`RunningScheduler` objects.
+
+    Processes are scanned at most once (refer to :func:`find_scheduler_pid()`),
+    regardless of the number of schedulers. Scheduler daemons that are running
+    as a descendant of another scheduler daemon (for example anacron started
+    by a cron job) are ignored, because suspending them would prevent the
+    cron job of the other scheduler from ever finishing.
+    """
+    schedulers = SCHEDULER_DAEMONS if schedulers is None else schedulers
+    scanned = []
+
+    def scan_processes():
+        if not scanned:
+            names = set(name for scheduler in schedulers for name in scheduler.exe_names)
+            scanned.append(list(find_processes(comm=names)))
+        return scanned[0]
+
+    running = []
+    for scheduler in schedulers:
+        pid = find_scheduler_pid(scheduler, scan_processes)
+        process = get_subtree(pid) if pid else None
+        if process and not any(r.process.pid == process.pid for r in running):
+            running.append(RunningScheduler(scheduler=scheduler, process=process))
+    nested = set(p.pid for r in running for p in r.process.descendants)
+    for r in running:
+        if r.process.pid in nested:
+            logger.info("Ignoring %s daemon %i because it's running as a descendant of another scheduler.",
+                        r.scheduler.name, r.process.pid)
+    return [r for r in running if r.process.pid not in nested]
+
+
+def find_scheduler_pid(scheduler, scan_processes=None):
+    """
+    Find the process ID of a scheduler daemon.
+
+    :param scheduler: A :class:`SchedulerDaemon` object.
+    :param scan_processes: A callable that returns a list of candidate
+                           :class:`~proc.core.Process` objects (defaults to
+                           :func:`~proc.core.find_processes()` filtered on the
+                           executable names of the scheduler).
+    :returns: The process ID (an integer) or :data:`None`.
+
+    The following methods are tried in the given order (the first process ID
+    that :func:`is_scheduler_process()` accepts is returned):
+
+    1. The pidfiles given by :attr:`SchedulerDaemon.pidfiles` are read.
+
+    2. The processes whose :attr:`~proc.core.Process.comm` value matches one
+       of the :attr:`SchedulerDaemon.exe_names` are inspected (refer to the
+       `comm` parameter of :func:`~proc.core.find_processes()`). The process
+       whose parent process isn't also a scheduler process is selected, this
+       excludes the worker processes that execute jobs.
+
+    3. When systemd is running, the main process ID of the
+       :attr:`SchedulerDaemon.systemd_units` is queried. This runs
+       ``systemctl`` (once per unit) so it's only done when the previous
+       methods didn't find the scheduler.
+    """
+    for filename in scheduler.pidfiles:
+        pid = read_pidfile(filename)
+        if pid and is_scheduler_process(pid, scheduler):
+            logger.debug("Found %s daemon process %i using pidfile %s.", scheduler.name, pid, filename)
+            return pid
+    candidates = scan_processes() if scan_processes else find_processes(comm=scheduler.exe_names)
+    candidates = dict((p.pid, p) for p in candidates if p.exe_name in scheduler.exe_names)
+    for pid, process in sorted(candidates.items()):
+        if process.ppid not in candidates:
+            logger.debug("Found %s daemon process %i by scanning processes.", scheduler.name, pid)
+            return pid
+    for unit in scheduler.systemd_units:
+        pid = find_systemd_main_pid(unit)
+        if pid and is_scheduler_process(pid, scheduler):
+            logger.debug("Found %s daemon process %i using systemd unit %s.", scheduler.name, pid, unit)
+            return pid
+
+
+def is_cron_daemon(pid):
+    """
+    Check whether a process ID belongs to a cron daemon.
+
+    :param pid: The process ID (an integer).
+    :returns: :data:`True` if the process exists and its executable is
+              called ``cron``, :data:`False` otherwise.
+    """
+    return is_scheduler_process(pid, CRON_DAEMON)
+
+
+def is_scheduler_process(pid, scheduler):
+    """
+    Check whether a process ID belongs to a scheduler daemon.
+
+    :param pid: The process ID (an integer).
+    :param scheduler: A :class:`SchedulerDaemon` object.
+    :returns: :data:`True` if the process exists and the base name of its
+              executable is one of :attr:`SchedulerDaemon.exe_names`,
+              :data:`False` otherwise.
+    """
+    process = Process.from_pid(pid)
+    return bool(process and process.exe_name in scheduler.exe_names)
+
+
+def read_pidfile(filename):
+    """
+    Read the process ID in a pidfile.
+
+    :param filename: The pathname of the pidfile (a string).
+    :returns: The process ID (an integer) or :data:`None` when the pidfile
+              doesn't exist or doesn't contain a process ID.
+    """
+    try:
+        with open(filename) as handle:
+            return int(handle.read().strip())
+    except Exception:
+        return None
+
+
+def find_systemd_main_pid(unit):
+    """
+    Find the main process ID of a systemd unit.
+
+    :param unit: The name of the systemd unit (a string).
+    :returns: The process ID (an integer) or :data:`None` when systemd isn't
+              running or the unit doesn't have a main process.
+    """
+    if os.path.isdir('/run/systemd/system') and which('systemctl'):
+        output = execute('systemctl', 'show', '--property=MainPID', unit,
+                         capture=True, check=False, silent=True)
+        name, _, value = (output or '').partition('=')
+        if name.strip() == 'MainPID' and value.strip().isdigit():
+            return int(value.strip()) or None
+
+
 def run_additions():
     """
     Allow local additions to the behavior of ``cron-graceful``.
@@ -292,7 +595,8 @@ def run_additions():
             logger.warning("Command failed with exit status %i!", e.returncode)
 
 
-def wait_for_processes(processes):
+def wait_for_processes(processes, timeout=None, term_after=None, kill_after=DEFAULT_KILL_AFTER, dry_run=False,
+                       sample_interval=DEFAULT_SAMPLE_INTERVAL):
     """
     Wait for the given processes to end.
 
@@ -301,51 +605,501 @@ def wait_for_processes(processes):
 
     This function is not specific to :mod:`proc.cron` at all (it doesn't
     even need to know what cron jobs are), it just waits until all of the given
-    processes have ended.
+    processes have ended. It uses :func:`~proc.unix.wait_for_many()` so that
+    each process is reported the moment it ends.
 
     :param processes: A list of :class:`~proc.tree.ProcessNode` objects.
+    :param timeout: The maximum number of seconds to wait for the processes
+                    to end by themselves (a number or :data:`None`).
+    :param term_after: The maximum runtime of an individual process in seconds
+                       (a number or :data:`None`).
+    :param kill_after: The number of seconds between SIGTERM and SIGKILL
+                       (a number, defaults to :data:`DEFAULT_KILL_AFTER`).
+    :param dry_run: :data:`True` to log the escalation that would be
+                    performed instead of actually signaling processes.
+    :param sample_interval: The number of seconds between samples of the
+                            resource usage of the processes (a number,
+                            defaults to :data:`DEFAULT_SAMPLE_INTERVAL`).
+                            Use :data:`None` to disable sampling.
+    :returns: A list of :class:`JobReport` objects (in the order of
+              `processes`).
+
+    While waiting, the resource usage of each process (and its descendants) is
+    sampled using :func:`JobReport.sample()`.
+
+    When a process is still running once the `timeout` has passed or once its
+    runtime exceeds `term_after`, the process and its descendants are stopped
+    using :func:`~proc.tree.ProcessNode.terminate_tree()` (with `kill_after`
+    as the grace period). This happens in a background thread per process,
+    so processes that run into their deadline are escalated in parallel while
+    we continue to wait for the other processes.
     """
     wait_timer = Timer()
-    running_processes = list(processes)
-    for process in running_processes:
+    reports = [JobReport(p) for p in processes]
+    for report in reports:
         logger.info("Waiting for process %i: %s (runtime is %s)",
-                    process.pid, quote(process.cmdline), format_timespan(round(process.runtime)))
+                    report.pid, quote(report.cmdline), format_timespan(round(report.process.runtime)))
+        report.plan_escalation(timeout, term_after)
+        if sample_interval:
+            report.sample()
+    by_process = dict((id(r.process), r) for r in reports)
+    sampled_at = [time.time()]
+    pending = list(reports)
+    threads = []
     with Spinner(timer=wait_timer) as spinner:
-        while True:
-            for process in list(running_processes):
-                if not process.is_alive:
-                    running_processes.remove(process)
-            if not running_processes:
-                break
-            num_processes = pluralize(len(running_processes), "process", "processes")
-            process_ids = concatenate(str(p.pid) for p in running_processes)
+
+        def report_exit(process):
+            spinner.clear()
+            by_process[id(process)].exited = time.time()
+            by_process[id(process)].status = 'exited'
+            logger.info("Process %i finished after %s: %s",
+                        process.pid, format_timespan(round(process.runtime)), quote(process.cmdline))
+
+        def report_progress(remaining):
+            if sample_interval and time.time() >= sampled_at[0] + sample_interval:
+                for process in remaining:
+                    by_process[id(process)].sample()
+                sampled_at[0] = time.time()
+            num_processes = pluralize(len(remaining), "process", "processes")
+            process_ids = concatenate(str(p.pid) for p in remaining)
             spinner.step(label="Waiting for %s: %s" % (num_processes, process_ids))
-            spinner.sleep()
+
+        while pending:
+            overdue = [r for r in pending if r.escalate_at is not None and r.escalate_at <= wait_timer.elapsed_time]
+            for report in overdue:
+                spinner.clear()
+                pending.remove(report)
+                threads.append(report.escalate(kill_after, dry_run))
+            if pending:
+                deadlines = [r.escalate_at for r in pending if r.escalate_at is not None]
+                remaining = wait_for_many(
+                    [r.process for r in pending],
+                    timeout=max(0, min(deadlines) - wait_timer.elapsed_time) if deadlines else None,
+                    on_exit=report_exit, on_progress=report_progress, interval=MINIMUM_INTERVAL,
+                )
+                running = set(id(p) for p in remaining)
+                pending = [r for r in pending if id(r.process) in running]
+        for thread in threads:
+            thread.join()
     logger.info("All processes have finished, we're done waiting (took %s).", wait_timer.rounded)
+    return reports
+
+
+def write_report(filename, reports):
+    """
+    Write a JSON report about drained processes.
+
+    :param filename: The pathname of the report file (a string).
+    :param reports: A list of :class:`JobReport` objects (as returned by
+                    :func:`wait_for_processes()`).
+    """
+    logger.info("Writing report about %s to %s ..", pluralize(len(reports), "job"), filename)
+    with open(filename, 'w') as handle:
+        json.dump(dict(created=time.time(), jobs=[r.to_dict() for r in reports]), handle, indent=2, sort_keys=True)
+        handle.write('\n')
 
 
-def terminate_cron_daemon(cron_daemon):
+def terminate_cron_daemon(cron_daemon, scheduler=None):
     """
-    Terminate the cron daemon.
+    Terminate the cron daemon (or another scheduler daemon).
 
     :param cron_daemon: The :class:`~proc.tree.ProcessNode` of the cron
                         daemon process.
+    :param scheduler: The :class:`SchedulerDaemon` that `cron_daemon` belongs
+                      to (defaults to :data:`CRON_DAEMON`).
     """
-    # We'll first try to terminate the cron daemon using whatever daemon
+    scheduler = scheduler or CRON_DAEMON
+    # We'll first try to terminate the scheduler daemon using whatever daemon
     # supervision system is in place (e.g. upstart or systemd) instead of
-    # simply killing the cron process, as a signal that we don't want the cron
+    # simply killing the daemon process, as a signal that we don't want the
     # daemon to be restarted.
-    logger.info("Stopping cron daemon (service cron stop) ..")
-    if not execute('service', 'cron', 'stop', check=False):
-        logger.warning("The 'service cron stop' command reported an error!")
-    # If the service command failed to terminate the cron daemon we will
-    # terminate cron explicitly, in the assumption that we're dealing with a
-    # naive /etc/init.d/cron script that doesn't use SIGKILL when SIGTERM fails
+    command = ' '.join(scheduler.stop_command)
+    logger.info("Stopping %s daemon (%s) ..", scheduler.name, command)
+    if not execute(*scheduler.stop_command, check=False):
+        logger.warning("The '%s' command reported an error!", command)
+    # If the service command failed to terminate the daemon we will terminate
+    # it explicitly, in the assumption that we're dealing with a naive
+    # /etc/init.d/cron script that doesn't use SIGKILL when SIGTERM fails
     # (due to our earlier SIGSTOP).
     if cron_daemon.is_alive:
         cron_daemon.kill()
 
 
+class SchedulerDaemon(collections.namedtuple('SchedulerDaemon', (
+        'name', 'exe_names', 'pidfiles', 'systemd_units', 'find_jobs', 'stop_command'))):
+
+    """
+    Description of a job scheduler daemon that can be drained by ``cron-graceful`` (a named tuple).
+
+    .. attribute:: name
+
+       The human friendly name of the scheduler (a string).
+
+    .. attribute:: exe_names
+
+       The base names of the executables of the scheduler daemon (a tuple of
+       strings, also used to filter on :attr:`~proc.core.Process.comm`).
+
+    .. attribute:: pidfiles
+
+       The pathnames of pidfiles that may contain the process ID of the
+       scheduler daemon (a tuple of strings).
+
+    .. attribute:: systemd_units
+
+       The names of systemd units that may run the scheduler daemon (a tuple
+       of strings).
+
+    .. attribute:: find_jobs
+
+       A callable that takes the :class:`~proc.tree.ProcessNode` of the
+       scheduler daemon and returns an iterable with the
+       :class:`~proc.tree.ProcessNode` objects of the running jobs.
+
+    .. attribute:: stop_command
+
+       The command that stops the scheduler daemon (a tuple of strings).
+
+    To add support for a custom job runner create a :class:`SchedulerDaemon`
+    object and append it to :data:`SCHEDULER_DAEMONS`.
+    """
+
+
+class RunningScheduler(collections.namedtuple('RunningScheduler', 'scheduler, process')):
+
+    """
+    A scheduler daemon that was found by :func:`find_running_schedulers()` (a named tuple).
+
+    .. attribute:: scheduler
+
+       The :class:`SchedulerDaemon` object.
+
+    .. attribute:: process
+
+       The :class:`~proc.tree.ProcessNode` of the scheduler daemon.
+    """
+
+
+class GracefulOptions(collections.namedtuple('GracefulOptions', (
+        'dry_run', 'timeout', 'term_after', 'kill_after', 'report', 'ledger', 'freeze'))):
+
+    """
+    The command line options of ``cron-graceful`` (a named tuple).
+
+    Refer to :func:`parse_arguments()` and :data:`USAGE_TEXT` for details
+    about the available options.
+    """
+
+
+class JobReport(object):
+
+    """Runtime, exit time and escalation of a process that was drained by :func:`wait_for_processes()`."""
+
+    def __init__(self, process):
+        """
+        Initialize a :class:`JobReport` object.
+
+        :param process: A :class:`~proc.tree.ProcessNode` object.
+        """
+        self.process = process
+        self.pid = process.pid
+        self.cmdline = process.cmdline
+        self.started = time.time() - process.runtime
+        self.exited = None
+        self.status = None
+        self.escalate_at = None
+        self.escalate_reason = None
+        self.escalation = None
+        self.peak_rss = 0
+        self.cpu_time = 0.0
+        self.read_bytes = 0
+        self.write_bytes = 0
+
+    def sample(self):
+        """
+        Sample the resource usage of the process and its descendants.
+
+        Updates :attr:`peak_rss` (the highest combined resident set size in
+        bytes), :attr:`cpu_time` (the combined CPU time in seconds, including
+        the CPU time of descendants that already ended, refer to
+        :attr:`~proc.core.Process.cutime`) and :attr:`read_bytes` and
+        :attr:`write_bytes` (the combined storage I/O in bytes, refer to
+        :attr:`~proc.core.Process.io_counters`). Processes that ended
+        between samples are only accounted for up to the last sample.
+        """
+        root = get_subtree(self.pid)
+        if root and root.stat_fields[21] == self.process.stat_fields[21]:
+            processes = [root] + list(root.descendants)
+            counters = [p.io_counters for p in processes]
+            self.peak_rss = max(self.peak_rss, sum(p.rss for p in processes))
+            self.cpu_time = max(self.cpu_time, sum(p.cpu_time + p.cutime + p.cstime for p in processes))
+            self.read_bytes = max(self.read_bytes, sum(c.get('read_bytes', 0) for c in counters))
+            self.write_bytes = max(self.write_bytes, sum(c.get('write_bytes', 0) for c in counters))
+
+    def plan_escalation(self, timeout=None, term_after=None):
+        """
+        Determine when the process should be escalated.
+
+        :param timeout: The drain deadline in seconds (a number or :data:`None`).
+        :param term_after: The maximum runtime in seconds (a number or :data:`None`).
+
+        Sets :attr:`escalate_at` (the number of seconds after the start of
+        :func:`wait_for_processes()`) and :attr:`escalate_reason` (the option
+        that caused the escalation, ``timeout`` or ``term-after``).
+        """
+        candidates = []
+        if timeout is not None:
+            candidates.append((timeout, 'timeout'))
+        if term_after is not None:
+            candidates.append((max(0, term_after - self.process.runtime), 'term-after'))
+        if candidates:
+            self.escalate_at, self.escalate_reason = min(candidates)
+
+    def escalate(self, kill_after, dry_run=False):
+        """
+        Terminate the process and its descendants in a background thread.
+
+        :param kill_after: The grace period before SIGKILL is used (a number).
+        :param dry_run: :data:`True` to only log what would be done.
+        :returns: The started :class:`~threading.Thread` object.
+        """
+        self.escalation = self.escalate_reason
+        if dry_run:
+            logger.info("Would terminate process %i and its descendants (%s reached).", self.pid, self.escalation)
+            target = self.skip
+        else:
+            logger.warning("Terminating process %i and its descendants (%s reached) ..", self.pid, self.escalation)
+            target = functools.partial(self.terminate, kill_after)
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def skip(self):
+        """Mark the process as still running (used during dry runs)."""
+        self.status = 'running'
+
+    def terminate(self, kill_after):
+        """
+        Terminate the process and its descendants (blocks until done).
+
+        :param kill_after: The grace period before SIGKILL is used (a number).
+        """
+        started = time.time()
+        outcome = self.process.terminate_tree(grace=kill_after).get(self.pid)
+        self.status = outcome.status if outcome else 'exited'
+        if self.status != 'survived':
+            self.exited = started + (outcome.elapsed if outcome else 0)
+
+    @property
+    def runtime(self):
+        """The number of seconds the process ran (a number or :data:`None` if the process didn't end)."""
+        return self.exited - self.started if self.exited is not None else None
+
+    def to_dict(self):
+        """Convert the report to a dictionary that can be serialized to JSON."""
+        return dict(
+            cmdline=self.cmdline,
+            cpu_time=self.cpu_time,
+            escalation=self.escalation,
+            exited=self.exited,
+            peak_rss=self.peak_rss,
+            pid=self.pid,
+            read_bytes=self.read_bytes,
+            runtime=self.runtime,
+            started=self.started,
+            status=self.status,
+            write_bytes=self.write_bytes,
+        )
+
+
+class ResourceLedger(object):
+
+    """
+    Append-only ledger with the resource usage of drained jobs.
+
+    Each line in the ledger file is a JSON object based on
+    :func:`JobReport.to_dict()` with an additional ``key`` field (the quoted
+    command line of the job) that's used to group the runs of the same job.
+    Over time the ledger can be used to predict how long a drain will take
+    (refer to :func:`predict_drain_time()`) and to spot jobs whose resource
+    usage is getting worse (refer to :func:`find_regressions()`).
+    """
+
+    def __init__(self, filename):
+        """
+        Initialize a :class:`ResourceLedger` object.
+
+        :param filename: The pathname of the ledger file (a string).
+        """
+        self.filename = filename
+
+    def load(self):
+        """
+        Load the entries in the ledger.
+
+        :returns: A generator of dictionaries. Lines that can't be parsed
+                  are ignored (the ledger may have been written concurrently).
+        """
+        if os.path.isfile(self.filename):
+            with open(self.filename) as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and 'key' in entry:
+                        yield entry
+
+    def history(self):
+        """
+        Group the completed runs in the ledger by job.
+
+        :returns: A dictionary that maps ledger keys (refer to
+                  :func:`get_key()`) to lists of dictionaries with the
+                  entries of jobs that ended by themselves.
+        """
+        grouped = collections.defaultdict(list)
+        for entry in self.load():
+            if entry.get('status') == 'exited' and entry.get('runtime') is not None:
+                grouped[entry['key']].append(entry)
+        return grouped
+
+    def get_key(self, cmdline):
+        """
+        Get the ledger key for a job.
+
+        :param cmdline: The command line of the job (a list of strings).
+        :returns: The quoted command line (a string).
+        """
+        return quote(cmdline)
+
+    def record(self, reports):
+        """
+        Append the resource usage of drained jobs to the ledger.
+
+        :param reports: A list of :class:`JobReport` objects (as returned by
+                        :func:`wait_for_processes()`).
+        """
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        logger.info("Recording resource usage of %s in %s ..", pluralize(len(reports), "job"), self.filename)
+        with open(self.filename, 'a') as handle:
+            for report in reports:
+                entry = report.to_dict()
+                entry['key'] = self.get_key(report.cmdline)
+                handle.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    def predict_drain_time(self, processes):
+        """
+        Predict how long it will take for running jobs to finish.
+
+        :param processes: A list of :class:`~proc.core.Process` objects.
+        :returns: The predicted number of seconds (a float) or :data:`None`
+                  when none of the jobs have history in the ledger.
+
+        For each job with history the remaining runtime is the median runtime
+        of previous runs minus the current runtime (jobs that have already
+        exceeded the median are expected to run until the longest runtime in
+        the ledger). Jobs run in parallel so the prediction is the maximum of
+        the remaining runtimes.
+        """
+        history = self.history()
+        predictions = []
+        for process in processes:
+            runtimes = StatsList(e['runtime'] for e in history.get(self.get_key(process.cmdline), []))
+            if runtimes:
+                remaining = runtimes.median - process.runtime
+                if remaining < 0:
+                    remaining = runtimes.max - process.runtime
+                predictions.append(max(0, remaining))
+        return max(predictions) if predictions else None
+
+    def find_regressions(self, reports, factor=1.5, minimum=3):
+        """
+        Find jobs whose resource usage is getting worse.
+
+        :param reports: A list of :class:`JobReport` objects.
+        :param factor: How much larger than the median of previous runs a
+                       value needs to be to be considered a regression (a
+                       number, defaults to 1.5).
+        :param minimum: The minimum number of previous runs required before
+                        comparisons are made (an integer, defaults to 3).
+        :returns: A list of tuples with four values each: The
+                  :class:`JobReport` object, the name of the field (one of
+                  ``runtime``, ``peak_rss``, ``cpu_time``, ``read_bytes`` or
+                  ``write_bytes``), the current value and the median of
+                  previous runs.
+
+        This should be called before :func:`record()`, otherwise the current
+        run is included in the comparison.
+        """
+        history = self.history()
+        regressions = []
+        for report in reports:
+            entries = history.get(self.get_key(report.cmdline), [])
+            if report.status == 'exited' and len(entries) >= minimum:
+                for field in ('runtime', 'peak_rss', 'cpu_time', 'read_bytes', 'write_bytes'):
+                    value = getattr(report, field)
+                    median = StatsList(e.get(field) or 0 for e in entries).median
+                    if median > 0 and value > median * factor:
+                        regressions.append((report, field, value, median))
+        return regressions
+
+
 class CronDaemonNotRunning(Exception):
 
     """Exception raised by :func:`find_cron_daemon()` when it cannot locate the cron daemon process."""
+
+
+CRON_DAEMON = SchedulerDaemon(
+    name='cron',
+    exe_names=('cron',),
+    pidfiles=CRON_PIDFILES,
+    systemd_units=(CRON_SYSTEMD_UNIT,),
+    find_jobs=operator.attrgetter('grandchildren'),
+    stop_command=('service', 'cron', 'stop'),
+)
+"""
+The :class:`SchedulerDaemon` for the Vixie cron daemon (as used on Debian and Ubuntu).
+
+The cron daemon forks a copy of itself for every cron job it starts, which in
+turn starts the cron job, so the cron jobs are the grandchildren of the cron
+daemon.
+"""
+
+SCHEDULER_DAEMONS = [
+    CRON_DAEMON,
+    SchedulerDaemon(
+        name='cronie',
+        exe_names=('crond',),
+        pidfiles=('/run/crond.pid', '/var/run/crond.pid'),
+        systemd_units=('crond.service', 'cronie.service'),
+        find_jobs=operator.attrgetter('grandchildren'),
+        stop_command=('service', 'crond', 'stop'),
+    ),
+    SchedulerDaemon(
+        name='anacron',
+        exe_names=('anacron',),
+        pidfiles=(),
+        systemd_units=('anacron.service',),
+        find_jobs=operator.attrgetter('grandchildren'),
+        stop_command=('service', 'anacron', 'stop'),
+    ),
+    SchedulerDaemon(
+        name='fcron',
+        exe_names=('fcron',),
+        pidfiles=('/run/fcron.pid', '/var/run/fcron.pid'),
+        systemd_units=('fcron.service',),
+        find_jobs=operator.attrgetter('grandchildren'),
+        stop_command=('service', 'fcron', 'stop'),
+    ),
+]
+"""
+The scheduler daemons that are drained by ``cron-graceful`` (a list of :class:`SchedulerDaemon` objects).
+
+By default cron (:data:`CRON_DAEMON`), cronie, anacron and fcron are
+supported. You can append your own :class:`SchedulerDaemon` objects to
+add support for custom job runners.
+"""
@@ -0,0 +1,637 @@
+# proc: Simple interface to Linux process information.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://proc.readthedocs.io
+
+"""
+The :mod:`proc.dbus` module implements a minimal D-Bus_ client.
+
+The only purpose of this module is to deliver desktop notifications (using the
+``org.freedesktop.Notifications.Notify`` method) without running the
+``notify-send`` program. It implements just enough of the `D-Bus wire
+protocol`_ to do so:
+
+- Connecting to UNIX socket addresses (``unix:path=...`` and
+  ``unix:abstract=...``) and authenticating using the ``EXTERNAL``
+  mechanism. When the current process runs as root and connects to the
+  session bus of another user, the connection is established by a child
+  process running as that user (refer to :func:`connect_as_user()`).
+
+- Marshalling and unmarshalling of the basic and container types (refer to
+  :class:`MessageWriter` and :class:`MessageReader`).
+
+- Synchronous method calls (refer to :func:`Connection.call()`).
+
+Connections are reused between notifications (refer to :func:`get_connection()`)
+so that chatty programs don't pay for connection setup and authentication on
+every notification. Here's an example:
+
+>>> from proc.dbus import notify
+>>> notify('unix:path=/run/user/1000/bus', "Backup finished", "All files were copied.")
+
+.. _D-Bus: https://www.freedesktop.org/wiki/Software/dbus/
+.. _D-Bus wire protocol: https://dbus.freedesktop.org/doc/dbus-specification.html
+"""
+
+# Standard library modules.
+import binascii
+import errno
+import logging
+import os
+import pwd
+import signal
+import socket
+import struct
+import threading
+
+# Public identifiers that require documentation.
+__all__ = (
+    'ALIGNMENT',
+    'CONNECTIONS',
+    'Connection',
+    'DBusError',
+    'DEFAULT_TIMEOUT',
+    'MESSAGE_TYPES',
+    'MessageReader',
+    'MessageWriter',
+    'URGENCY_LEVELS',
+    'connect_as_user',
+    'connect_socket',
+    'create_socket',
+    'encode_message',
+    'get_connection',
+    'logger',
+    'notify',
+    'parse_address',
+    'split_signature',
+)
+
+# Initialize a logger for this module.
+logger = logging.getLogger(__name__)
+
+ALIGNMENT = dict(y=1, b=4, n=2, q=2, i=4, u=4, x=8, t=8, d=8, h=4, s=4, o=4, g=1, a=4, v=1)
+ALIGNMENT.update({'(': 8, '{': 8})
+"""A dictionary that maps D-Bus type codes to their alignment in bytes."""
+
+CONNECTIONS = {}
+"""
+A dictionary that caches connections created by :func:`get_connection()`.
+
+The keys are tuples with a bus address and user ID, the values are
+:class:`Connection` objects.
+"""
+
+DEFAULT_TIMEOUT = 5
+"""The default number of seconds to wait for the reply to a method call (a number)."""
+
+MESSAGE_TYPES = dict(method_call=1, method_return=2, error=3, signal=4)
+"""A dictionary that maps D-Bus message type names to their numeric values."""
+
+URGENCY_LEVELS = dict(low=0, normal=1, critical=2)
+"""A dictionary that maps the urgency levels of notifications to their numeric values."""
+
+# Mapping of simple type codes to struct format characters.
+STRUCT_FORMATS = dict(y='B', b='I', n='h', q='H', i='i', u='I', x='q', t='Q', d='d', h='I')
+
+# The header fields defined by the D-Bus specification.
+HEADER_FIELDS = dict(path=1, interface=2, member=3, error_name=4, reply_serial=5, destination=6, sender=7, signature=8)
+
+# Lock that serializes reading and switching the effective user ID (refer to connect_socket()).
+CREDENTIALS_LOCK = threading.Lock()
+
+
+def notify(address, summary, body='', uid=None, app_name='proc', app_icon='', urgency=None,
+           category=None, expire_timeout=-1, timeout=DEFAULT_TIMEOUT):
+    """
+    Deliver a desktop notification using ``org.freedesktop.Notifications.Notify``.
+
+    :param address: The address of the session bus (the value of
+                    ``$DBUS_SESSION_BUS_ADDRESS``, a string).
+    :param summary: The summary of the notification (a string).
+    :param body: The body of the notification (a string).
+    :param uid: Refer to :func:`get_connection()`.
+    :param app_name: The name of the application sending the notification (a string).
+    :param app_icon: The name or pathname of an icon (a string).
+    :param urgency: One of the strings in :data:`URGENCY_LEVELS` (optional).
+    :param category: The category of the notification (a string, optional).
+    :param expire_timeout: The number of milliseconds after which the
+                           notification expires (an integer, defaults to -1
+                           which means the notification server decides).
+    :param timeout: Refer to :func:`Connection.call()`.
+    :returns: The ID of the notification (an integer) or :data:`None` when
+              the notification server didn't return an ID.
+    :raises: :exc:`DBusError` or :exc:`~exceptions.EnvironmentError` when
+             delivery fails (the cached connection is discarded in that case,
+             so the next call will reconnect).
+    """
+    hints = {}
+    if urgency is not None:
+        hints['urgency'] = ('y', URGENCY_LEVELS[urgency])
+    if category is not None:
+        hints['category'] = ('s', category)
+    connection = get_connection(address, uid)
+    try:
+        reply = connection.call(
+            destination='org.freedesktop.Notifications',
+            path='/org/freedesktop/Notifications',
+            interface='org.freedesktop.Notifications',
+            member='Notify',
+            signature='susssasa{sv}i',
+            body=(app_name, 0, app_icon, summary, body, [], hints, expire_timeout),
+            timeout=timeout,
+        )
+    except socket.error:
+        connection.close()
+        raise
+    return reply[0] if reply else None
+
+
+def get_connection(address, uid=None):
+    """
+    Get a (cached) connection to a message bus.
+
+    :param address: The address of the message bus (a string).
+    :param uid: The user ID used to connect to the message bus (an integer,
+                defaults to the effective user ID of the current process).
+                Refer to :func:`connect_socket()` for details.
+    :returns: A :class:`Connection` object.
+
+    Connections are cached in :data:`CONNECTIONS`. Closed connections are
+    replaced by new connections.
+    """
+    key = (address, uid)
+    connection = CONNECTIONS.get(key)
+    if not (connection and connection.is_connected):
+        connection = Connection(address, uid)
+        connection.connect()
+        CONNECTIONS[key] = connection
+    return connection
+
+
+class Connection(object):
+
+    """Minimal synchronous connection to a D-Bus message bus."""
+
+    def __init__(self, address, uid=None):
+        """
+        Initialize a :class:`Connection` object.
+
+        :param address: Refer to :func:`get_connection()`.
+        :param uid: Refer to :func:`get_connection()`.
+        """
+        self.address = address
+        self.uid = uid
+        self.socket = None
+        self.buffer = b''
+        self.serial = 0
+        self.unique_name = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_connected(self):
+        """:data:`True` if the connection is open, :data:`False` otherwise."""
+        return self.socket is not None
+
+    def connect(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Connect and authenticate to the message bus.
+
+        :param timeout: The maximum number of seconds to wait for the message
+                        bus (a number).
+        :raises: :exc:`DBusError` or :exc:`~exceptions.EnvironmentError` when
+                 the connection fails.
+        """
+        errors = []
+        for family, location in parse_address(self.address):
+            try:
+                self.socket = connect_socket(location, self.uid, timeout)
+                break
+            except socket.error as e:
+                errors.append(e)
+        else:
+            raise DBusError("Failed to connect to message bus! (%s)" % (errors or self.address))
+        try:
+            self.authenticate()
+            self.unique_name = self.call(
+                destination='org.freedesktop.DBus',
+                path='/org/freedesktop/DBus',
+                interface='org.freedesktop.DBus',
+                member='Hello',
+                timeout=timeout,
+            )[0]
+            logger.debug("Connected to message bus %s as %s.", self.address, self.unique_name)
+        except Exception:
+            self.close()
+            raise
+
+    def authenticate(self):
+        """Authenticate using the ``EXTERNAL`` mechanism."""
+        if self.uid is None:
+            with CREDENTIALS_LOCK:
+                uid = os.geteuid()
+        else:
+            uid = self.uid
+        identity = binascii.hexlify(str(uid).encode('ascii')).decode('ascii')
+        self.socket.sendall(b'\0' + ('AUTH EXTERNAL %s\r\n' % identity).encode('ascii'))
+        response = self.read_line()
+        if not response.startswith(b'OK '):
+            raise DBusError("Authentication to message bus failed! (%r)" % response)
+        self.socket.sendall(b'BEGIN\r\n')
+
+    def call(self, destination, path, interface, member, signature='', body=(), timeout=DEFAULT_TIMEOUT):
+        """
+        Call a method and wait for the reply.
+
+        :param destination: The bus name of the receiver (a string).
+        :param path: The object path (a string).
+        :param interface: The interface name (a string).
+        :param member: The method name (a string).
+        :param signature: The signature of the arguments (a string).
+        :param body: The arguments (a tuple).
+        :param timeout: The maximum number of seconds to wait for the reply
+                        (a number, defaults to :data:`DEFAULT_TIMEOUT`).
+        :returns: The values in the body of the reply (a list).
+        :raises: :exc:`DBusError` when an error reply is received.
+        """
+        with self.lock:
+            self.serial += 1
+            serial = self.serial
+            fields = [
+                (HEADER_FIELDS['path'], ('o', path)),
+                (HEADER_FIELDS['interface'], ('s', interface)),
+                (HEADER_FIELDS['member'], ('s', member)),
+                (HEADER_FIELDS['destination'], ('s', destination)),
+            ]
+            self.socket.settimeout(timeout)
+            self.socket.sendall(encode_message(MESSAGE_TYPES['method_call'], serial, fields, signature, body))
+            while True:
+                message_type, headers, values = self.read_message()
+                if headers.get(HEADER_FIELDS['reply_serial']) == serial:
+                    if message_type == MESSAGE_TYPES['error']:
+                        error_name = headers.get(HEADER_FIELDS['error_name'])
+                        raise DBusError("%s: %s" % (error_name, values[0] if values else "(no message)"))
+                    return values
+                # Signals (like NameAcquired) and unrelated messages are ignored.
+
+    def close(self):
+        """Close the connection."""
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            finally:
+                self.socket = None
+                self.buffer = b''
+
+    def read_line(self):
+        """Read a line of the authentication protocol (a byte string without line terminator)."""
+        while b'\r\n' not in self.buffer:
+            self.receive()
+        line, _, self.buffer = self.buffer.partition(b'\r\n')
+        return line
+
+    def read_message(self):
+        """
+        Read a message from the message bus.
+
+        :returns: A tuple with three values: The message type (an integer),
+                  the header fields (a dictionary that maps header field
+                  codes to values) and the values in the body (a list).
+        """
+        self.read_bytes(16)
+        byte_order = '<' if self.buffer[:1] == b'l' else '>'
+        body_length, fields_length = struct.unpack_from(byte_order + 'I4xI', self.buffer, 4)
+        header_length = 16 + fields_length + (-fields_length % 8)
+        data = self.read_bytes(header_length + body_length)
+        self.buffer = self.buffer[len(data):]
+        reader = MessageReader(data, byte_order)
+        message_type = reader.read('y', offset=1)
+        headers = dict(reader.read('a(yv)', offset=12))
+        body_reader = MessageReader(data[header_length:], byte_order)
+        signature = headers.get(HEADER_FIELDS['signature'], '')
+        values = [body_reader.read(type_code) for type_code in split_signature(signature)]
+        return message_type, headers, values
+
+    def read_bytes(self, count):
+        """Make sure that the buffer contains at least the given number of bytes (returns the bytes)."""
+        while len(self.buffer) < count:
+            self.receive()
+        return self.buffer[:count]
+
+    def receive(self):
+        """Receive data from the message bus into the buffer."""
+        data = self.socket.recv(65536)
+        if not data:
+            self.close()
+            raise DBusError("Message bus closed the connection!")
+        self.buffer += data
+
+
+class DBusError(Exception):
+
+    """Raised by :mod:`proc.dbus` when communication with a message bus fails."""
+
+
+class MessageWriter(object):
+
+    """Marshal values according to the D-Bus wire format (little endian)."""
+
+    def __init__(self):
+        """Initialize a :class:`MessageWriter` object."""
+        self.buffer = bytearray()
+
+    def align(self, alignment):
+        """Pad the buffer with null bytes to the given alignment."""
+        self.buffer.extend(b'\0' * (-len(self.buffer) % alignment))
+
+    def write(self, type_code, value):
+        """
+        Marshal a value.
+
+        :param type_code: A single complete type (a string).
+        :param value: The value to marshal. Arrays are given as lists,
+                      dictionaries as dictionaries, structures as tuples
+                      and variants as tuples with a type code and a value.
+        """
+        code = type_code[0]
+        self.align(ALIGNMENT[code])
+        if code in STRUCT_FORMATS:
+            self.buffer.extend(struct.pack('<' + STRUCT_FORMATS[code], value))
+        elif code in 'so':
+            data = value.encode('UTF-8')
+            self.buffer.extend(struct.pack('<I', len(data)) + data + b'\0')
+        elif code == 'g':
+            data = value.encode('ascii')
+            self.buffer.extend(struct.pack('<B', len(data)) + data + b'\0')
+        elif code == 'v':
+            signature, inner_value = value
+            self.write('g', signature)
+            self.write(signature, inner_value)
+        elif code == 'a':
+            length_offset = len(self.buffer)
+            self.buffer.extend(b'\0\0\0\0')
+            element_type = type_code[1:]
+            self.align(ALIGNMENT[element_type[0]])
+            start = len(self.buffer)
+            for item in (sorted(value.items()) if element_type[0] == '{' else value):
+                self.write(element_type, item)
+            struct.pack_into('<I', self.buffer, length_offset, len(self.buffer) - start)
+        elif code in '({':
+            for member_type, member_value in zip(split_signature(type_code[1:-1]), value):
+                self.write(member_type, member_value)
+        else:
+            raise ValueError("Unsupported D-Bus type code! (%r)" % type_code)
+
+
+class MessageReader(object):
+
+    """Unmarshal values according to the D-Bus wire format."""
+
+    def __init__(self, data, byte_order='<'):
+        """
+        Initialize a :class:`MessageReader` object.
+
+        :param data: The marshalled data (a byte string).
+        :param byte_order: The :mod:`struct` byte order character (a string).
+        """
+        self.data = data
+        self.byte_order = byte_order
+        self.offset = 0
+
+    def read(self, type_code, offset=None):
+        """
+        Unmarshal a value.
+
+        :param type_code: A single complete type (a string).
+        :param offset: The offset to start reading at (an integer, defaults to
+                       the end of the previously read value).
+        :returns: The unmarshalled value. Arrays are returned as lists,
+                  dictionaries as dictionaries, structures as tuples and
+                  variants as their contained value.
+        """
+        if offset is not None:
+            self.offset = offset
+        code = type_code[0]
+        self.offset += -self.offset % ALIGNMENT[code]
+        if code in STRUCT_FORMATS:
+            value = self.unpack(STRUCT_FORMATS[code])
+            return bool(value) if code == 'b' else value
+        elif code in 'sog':
+            length = self.unpack('B' if code == 'g' else 'I')
+            value = self.data[self.offset:self.offset + length].decode('UTF-8')
+            self.offset += length + 1
+            return value
+        elif code == 'v':
+            return self.read(self.read('g'))
+        elif code == 'a':
+            length = self.unpack('I')
+            element_type = type_code[1:]
+            self.offset += -self.offset % ALIGNMENT[element_type[0]]
+            end = self.offset + length
+            items = []
+            while self.offset < end:
+                items.append(self.read(element_type))
+            return dict(items) if element_type[0] == '{' else items
+        elif code in '({':
+            return tuple(self.read(member_type) for member_type in split_signature(type_code[1:-1]))
+        raise ValueError("Unsupported D-Bus type code! (%r)" % type_code)
+
+    def unpack(self, format):
+        """Unpack a single value using :func:`struct.unpack_from()`."""
+        value = struct.unpack_from(self.byte_order + format, self.data, self.offset)[0]
+        self.offset += struct.calcsize(format)
+        return value
+
+
+def encode_message(message_type, serial, fields, signature='', body=()):
+    """
+    Encode a D-Bus message.
+
+    :param message_type: One of the values in :data:`MESSAGE_TYPES` (an integer).
+    :param serial: The serial number of the message (an integer).
+    :param fields: A list of tuples with a header field code and a variant.
+    :param signature: The signature of the body (a string).
+    :param body: The values in the body (a tuple).
+    :returns: The encoded message (a byte string).
+    """
+    payload = MessageWriter()
+    for type_code, value in zip(split_signature(signature), body):
+        payload.write(type_code, value)
+    if signature:
+        fields = list(fields) + [(HEADER_FIELDS['signature'], ('g', signature))]
+    header = MessageWriter()
+    header.buffer.extend(b'l' + struct.pack('<BBBII', message_type, 0, 1, len(payload.buffer), serial))
+    header.write('a(yv)', fields)
+    header.align(8)
+    return bytes(header.buffer + payload.buffer)
+
+
+def split_signature(signature):
+    """
+    Split a D-Bus signature into single complete types.
+
+    :param signature: A D-Bus signature (a string).
+    :returns: A list of strings.
+    """
+    types = []
+    start = 0
+    while start < len(signature):
+        end = start
+        while signature[end] == 'a':
+            end += 1
+        if signature[end] in '({':
+            depth = 0
+            while True:
+                if signature[end] in '({':
+                    depth += 1
+                elif signature[end] in ')}':
+                    depth -= 1
+                end += 1
+                if depth == 0:
+                    break
+        else:
+            end += 1
+        types.append(signature[start:end])
+        start = end
+    return types
+
+
+def parse_address(address):
+    """
+    Parse a D-Bus server address.
+
+    :param address: The address of the message bus (a string).
+    :returns: A list of tuples with two strings each: The socket type
+              (``path`` or ``abstract``) and the socket address (for
+              abstract sockets this starts with a null byte). Unsupported
+              transports are ignored.
+    """
+    sockets = []
+    for entry in address.split(';'):
+        transport, _, parameters = entry.partition(':')
+        if transport == 'unix':
+            for parameter in parameters.split(','):
+                name, _, value = parameter.partition('=')
+                value = unquote(value)
+                if name == 'path':
+                    sockets.append(('path', value))
+                elif name == 'abstract':
+                    sockets.append(('abstract', '\0' + value))
+    return sockets
+
+
+def unquote(value):
+    """Decode the ``%XX`` escape sequences used in D-Bus addresses."""
+    parts = value.split('%')
+    for i in range(1, len(parts)):
+        parts[i] = chr(int(parts[i][:2], 16)) + parts[i][2:]
+    return ''.join(parts)
+
+
+def connect_socket(location, uid=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Connect to a UNIX socket.
+
+    :param location: The socket address (a string).
+    :param uid: The user ID to connect as (an integer or :data:`None`).
+    :param timeout: The connection timeout in seconds (a number).
+    :returns: A connected :class:`socket.socket` object.
+    :raises: :exc:`socket.error` when the connection fails.
+
+    Message buses authenticate clients based on the credentials of the
+    process that connected the socket, so when the current process runs as
+    root and `uid` refers to another user the socket is connected by
+    :func:`connect_as_user()`.
+    """
+    with CREDENTIALS_LOCK:
+        euid = os.geteuid()
+    if uid is not None and uid != euid and euid == 0:
+        if hasattr(socket.socket, 'sendmsg'):
+            return connect_as_user(location, uid, timeout)
+        # Python 2 can't pass file descriptors between processes, so we
+        # temporarily switch the effective user ID instead. This affects all
+        # threads, so every credential sensitive operation takes the lock.
+        with CREDENTIALS_LOCK:
+            os.seteuid(uid)
+            try:
+                return create_socket(location, timeout)
+            finally:
+                os.seteuid(0)
+    return create_socket(location, timeout)
+
+
+def connect_as_user(location, uid, timeout=DEFAULT_TIMEOUT):
+    """
+    Connect to a UNIX socket from a child process that runs as another user.
+
+    :param location: The socket address (a string).
+    :param uid: The user ID to connect as (an integer).
+    :param timeout: The connection timeout in seconds (a number).
+    :returns: A connected :class:`socket.socket` object.
+    :raises: :exc:`socket.error` when the connection fails.
+
+    The child process drops its privileges to `uid` (and the primary group of
+    that user), connects the socket and passes the file descriptor back to
+    the current process using ``SCM_RIGHTS``. This avoids changing the
+    credentials of the current process, which would affect all threads.
+    """
+    try:
+        gid = pwd.getpwuid(uid).pw_gid
+    except KeyError:
+        gid = uid
+    parent, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    pid = os.fork()
+    if pid == 0:
+        # In the child process we avoid logging and other code that might
+        # need locks held by threads that don't exist in the child.
+        status = 1
+        try:
+            parent.close()
+            try:
+                os.setgroups([])
+                os.setgid(gid)
+                os.setuid(uid)
+                client = create_socket(location, timeout)
+                child.sendmsg([struct.pack('i', 0)], [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                                                       struct.pack('i', client.fileno()))])
+            except EnvironmentError as e:
+                child.sendall(struct.pack('i', e.errno or errno.EIO))
+            status = 0
+        finally:
+            os._exit(status)
+    child.close()
+    try:
+        parent.settimeout(timeout)
+        data, ancillary, flags, address = parent.recvmsg(4, socket.CMSG_LEN(4))
+        descriptors = [struct.unpack('i', value[:4])[0] for level, type, value in ancillary
+                       if level == socket.SOL_SOCKET and type == socket.SCM_RIGHTS]
+    except socket.timeout:
+        os.kill(pid, signal.SIGKILL)
+        raise
+    finally:
+        parent.close()
+        os.waitpid(pid, 0)
+    if descriptors:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM, fileno=descriptors[0])
+        client.settimeout(timeout)
+        return client
+    number = struct.unpack('i', data)[0] if len(data) == 4 else errno.EIO
+    raise socket.error(number, "Failed to connect to %s as user %i! (%s)" % (location, uid, os.strerror(number)))
+
+
+def create_socket(location, timeout=DEFAULT_TIMEOUT):
+    """
+    Create a UNIX socket and connect it.
+
+    :param location: The socket address (a string).
+    :param timeout: The connection timeout in seconds (a number).
+    :returns: A connected :class:`socket.socket` object.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(location)
+    except Exception:
+        client.close()
+        raise
+    return client
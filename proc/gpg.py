@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -61,6 +61,11 @@ completely different angle: Why not search for an existing ``gpg-agent``
 process and infer the required ``$GPG_AGENT_INFO`` value by inspecting the
 process using lsof_?
 
+Nowadays lsof_ is no longer used: The UNIX sockets held open by the agent are
+found by joining the ``socket:[inode]`` links in ``/proc/[pid]/fd`` against an
+index of ``/proc/net/unix`` (refer to :func:`find_open_unix_sockets()`), which
+is much faster and works on systems where lsof_ isn't installed.
+
 The revised solution has worked quite well for me and so I'm now publishing it
 as the :mod:`proc.gpg` module which implements the command line program
 ``with-gpg-agent``.
@@ -75,11 +80,16 @@ Internal documentation of :mod:`proc.gpg`
 """
 
 # Standard library modules.
+import collections
+import ctypes
 import functools
 import getopt
 import os
+import pwd
+import select
 import stat
 import sys
+import time
 
 # External dependencies.
 import coloredlogs
@@ -90,17 +100,29 @@ from humanfriendly.terminal.spinners import Spinner
 from verboselogs import VerboseLogger
 
 # Modules included in our package.
-from proc.core import find_processes
+from proc.cache import check_process_identity, get_process_identity, load_cache, save_cache
+from proc.core import Process, find_processes, find_unix_sockets
 
 # Public identifiers that require documentation.
 __all__ = (
+    'AGENT_CACHE_NAME',
+    'AgentIndex',
+    'AgentInfo',
+    'DEFAULT_INDEX_TTL',
+    'DirectoryWatcher',
+    'INOTIFY_EVENTS',
     'LAUNCH_TIMEOUT',
     'NEW_STYLE_SOCKET',
     'USAGE_TEXT',
     'enable_gpg_agent',
+    'find_agents',
+    'find_cached_agent_info',
     'find_fixed_agent_socket',
+    'find_fixed_agent_sockets',
     'find_gpg_agent_info',
     'find_open_unix_sockets',
+    'find_socket_directories',
+    'find_terminal',
     'get_gpg_variables',
     'have_agent_program',
     'have_valid_agent_info',
@@ -112,6 +134,27 @@ __all__ = (
     'with_gpg_agent',
 )
 
+AGENT_CACHE_NAME = 'gpg-agent'
+"""
+The name of the cache used to remember the running gpg-agent (a string).
+
+Refer to :func:`find_cached_agent_info()` and :mod:`proc.cache` for details.
+"""
+
+DEFAULT_INDEX_TTL = 10
+"""
+The number of seconds that an :class:`AgentIndex` is reused (a number).
+
+Refer to :class:`AgentIndex` for details.
+"""
+
+INOTIFY_EVENTS = 0x00000100 | 0x00000080
+"""
+The inotify events watched by :class:`DirectoryWatcher` (an integer).
+
+This is the combination of ``IN_CREATE`` and ``IN_MOVED_TO``.
+"""
+
 LAUNCH_TIMEOUT = 30
 """
 The timeout for a newly launched GPG agent daemon to come online (a number).
@@ -138,6 +181,12 @@ new one will be spawned in the background.
 
 Supported options:
 
+  -e, --exec
+
+    Replace the with-gpg-agent process with COMMAND (using execvpe())
+    instead of running COMMAND as a child process. This avoids the
+    overhead of supervising a child process.
+
   -v, --verbose
 
     Make more noise (increase verbosity).
@@ -160,7 +209,16 @@ def main():
 
 def with_gpg_agent(arguments):
     """Command line interface for the ``with-gpg-agent`` program."""
-    command_line = parse_arguments(arguments)
+    command_line, exec_command = parse_arguments(arguments)
+    if exec_command:
+        environment = dict(os.environ)
+        environment.update(get_gpg_variables())
+        logger.debug("Replacing process with command: %s", command_line)
+        try:
+            os.execvpe(command_line[0], command_line, environment)
+        except OSError as e:
+            logger.error("Failed to execute %s! (%s)", command_line[0], e)
+            sys.exit(1)
     try:
         execute(*command_line, environment=get_gpg_variables())
     except ExternalCommandFailed as e:
@@ -173,14 +231,23 @@ def parse_arguments(arguments):
     Parse the command line arguments.
 
     :param arguments: A list of strings with command line options and/or arguments.
-    :returns: A list of strings with the positional arguments.
+    :returns: A tuple with two values:
+
+              1. A list of strings with the positional arguments.
+              2. :data:`True` if the ``--exec`` option was given,
+                 :data:`False` otherwise.
     """
+    exec_command = False
     try:
-        options, arguments = getopt.gnu_getopt(arguments, 'vqh', [
-            'verbose', 'quiet', 'help'
+        # Options are only recognized before the command, so that options of
+        # the command aren't mistaken for our options.
+        options, arguments = getopt.getopt(arguments, 'evqh', [
+            'exec', 'verbose', 'quiet', 'help'
         ])
         for option, value in options:
-            if option in ('-v', '--verbose'):
+            if option in ('-e', '--exec'):
+                exec_command = True
+            elif option in ('-v', '--verbose'):
                 coloredlogs.increase_verbosity()
             elif option in ('-q', '--quiet'):
                 coloredlogs.decrease_verbosity()
@@ -192,7 +259,7 @@ def parse_arguments(arguments):
         if not arguments:
             usage(USAGE_TEXT)
             sys.exit(0)
-        return arguments
+        return arguments, exec_command
     except Exception as e:
         warning("Error: Failed to parse command line arguments! (%s)", e)
         sys.exit(1)
@@ -207,24 +274,29 @@ def enable_gpg_agent(**options):
     os.environ.update(get_gpg_variables(**options))
 
 
-def get_gpg_variables(timeout=LAUNCH_TIMEOUT):
+def get_gpg_variables(timeout=LAUNCH_TIMEOUT, use_cache=True):
     """
     Prepare the environment variable(s) required by the gpg_ program.
 
     :param timeout: The timeout for a newly launched GPG agent daemon to
                     start (a number, defaults to :data:`LAUNCH_TIMEOUT`).
+    :param use_cache: :data:`True` to use :func:`find_cached_agent_info()`
+                      before falling back to :func:`find_gpg_agent_info()`,
+                      :data:`False` to always search for the agent.
     :returns: A dictionary with environment variables.
 
     This function tries to figure out the correct values of two
     environment variables that are used by the gpg_ program:
 
-    - ``$GPG_AGENT_INFO`` is generated using :func:`find_gpg_agent_info()`,
-      spawning a new agent if :func:`find_gpg_agent_info()` initially returns
-      :data:`None`.
+    - ``$GPG_AGENT_INFO`` is generated using :func:`find_cached_agent_info()`
+      or :func:`find_gpg_agent_info()`, spawning a new agent if
+      :func:`find_gpg_agent_info()` initially returns :data:`None`.
 
-    - ``$GPG_TTY`` is generated using `/usr/bin/tty`_.
+    - ``$GPG_TTY`` is generated using :func:`find_terminal()`.
 
-    .. _/usr/bin/tty: https://manpages.debian.org/cgi-bin/man.cgi?query=tty
+    No external programs are executed unless a new agent needs to be started,
+    so when an agent is already running (and especially when it was cached)
+    this function is very fast.
     """
     environment = {}
     # Try to figure out the correct value of $GPG_AGENT_INFO.
@@ -233,7 +305,7 @@ def get_gpg_variables(timeout=LAUNCH_TIMEOUT):
         logger.debug("Using existing value of $GPG_AGENT_INFO ..")
         environment['GPG_AGENT_INFO'] = os.environ['GPG_AGENT_INFO']
     else:
-        gpg_agent_info = find_gpg_agent_info()
+        gpg_agent_info = (use_cache and find_cached_agent_info()) or find_gpg_agent_info()
         if not gpg_agent_info:
             # Start a new GPG agent daemon?
             if have_agent_program():
@@ -245,7 +317,7 @@ def get_gpg_variables(timeout=LAUNCH_TIMEOUT):
             environment['GPG_AGENT_INFO'] = gpg_agent_info
     # Try to figure out the correct value of $GPG_TTY.
     logger.debug("Preparing $GPG_TTY variable ..")
-    gpg_tty = execute('tty', capture=True, check=False, shell=False, tty=True)
+    gpg_tty = find_terminal()
     if gpg_tty:
         environment['GPG_TTY'] = gpg_tty
     logger.debug("GPG environment: %s", environment)
@@ -259,13 +331,22 @@ def find_gpg_agent_info():
     :returns: A string or :data:`None`.
 
     This function uses :func:`~proc.core.find_processes()` to search for
-    ``gpg-agent`` processes and runs lsof_ to find out which UNIX socket is
-    being used by the agent. Based on this information it reconstructs
-    the expected value of ``$GPG_AGENT_INFO``.
+    ``gpg-agent`` processes owned by the current user (filtering on the owner
+    and :attr:`~proc.core.Process.comm` before any executable is resolved,
+    so the cost of the search barely grows with the number of processes on
+    the system) and :func:`find_open_unix_sockets()` to find out
+    which UNIX socket is being used by the agent. Based on this information
+    it reconstructs the expected value of ``$GPG_AGENT_INFO``.
+
+    The result is saved in the :data:`AGENT_CACHE_NAME` cache so that
+    :func:`find_cached_agent_info()` can reuse it.
     """
     logger.debug("Searching for running GPG agent ..")
     our_uid = os.getuid()
-    for process in find_processes():
+    # Filter on the owner of /proc/[pid] and the comm field of /proc/[pid]/stat
+    # before looking at the executable, because resolving the executable of
+    # every process on the system is relatively expensive.
+    for process in find_processes(comm='gpg-agent', uid=our_uid):
         if process.exe_name == 'gpg-agent':
             logger.debug("Found GPG agent with PID %i, checking user id .. ", process.pid)
             their_uid = process.user_ids.real if process.user_ids else 'unknown'
@@ -277,9 +358,9 @@ def find_gpg_agent_info():
                     logger.debug("Found GnuPG >= 2.1 compatible socket: %s", fixed_socket)
                     socket_file = fixed_socket
                 else:
-                    logger.debug("Using `lsof' to find open UNIX sockets ..")
+                    logger.debug("Using /proc/net/unix to find open UNIX sockets ..")
                     for filename in find_open_unix_sockets(process.pid):
-                        logger.debug("UNIX domain socket reported by lsof: %s", filename)
+                        logger.debug("UNIX domain socket held open by agent: %s", filename)
                         if validate_unix_socket(filename):
                             socket_file = filename
                             break
@@ -289,20 +370,215 @@ def find_gpg_agent_info():
                 if socket_file:
                     agent_info = ':'.join([socket_file, str(process.pid), '1'])
                     logger.debug("Reconstructed $GPG_AGENT_INFO: %s", agent_info)
+                    save_cache(AGENT_CACHE_NAME, dict(
+                        socket=socket_file,
+                        pid=process.pid,
+                        starttime=get_process_identity(process.pid),
+                    ))
                     return agent_info
             else:
                 logger.debug("GPG agent user id (%s) doesn't match ours (%i), ignoring process %i.",
                              their_uid, our_uid, process.pid)
 
 
+def find_agents(include_ssh_agent=False):
+    """
+    Find the running agents of all users in a single pass over ``/proc``.
+
+    :param include_ssh_agent: :data:`True` to include ``ssh-agent`` processes,
+                              :data:`False` to search for ``gpg-agent``
+                              processes only (the default).
+    :returns: A generator of :class:`AgentInfo` objects.
+
+    Processes are prefiltered on :attr:`~proc.core.Process.comm` by
+    :func:`~proc.core.find_processes()` and ``/proc/net/unix`` is parsed at
+    most once (refer to :func:`~proc.core.find_unix_sockets()`). Only sockets
+    owned by the same user as the agent are considered, so that a socket
+    created by another user can't be mistaken for the agent's socket. To see
+    the agents of other users this needs to run as root.
+    """
+    programs = ('gpg-agent', 'ssh-agent') if include_ssh_agent else ('gpg-agent',)
+    index = None
+    for process in find_processes(comm=programs):
+        uid = process.user_ids.real if process.user_ids else None
+        if uid is None or process.exe_name != process.comm:
+            continue
+        candidates = []
+        if process.comm == 'gpg-agent':
+            candidates = [s for s in find_fixed_agent_sockets(uid) if validate_unix_socket(s, uid=uid)][:1]
+        if not candidates:
+            if index is None:
+                index = find_unix_sockets()
+            for inode in process.socket_inodes:
+                filename = index.get(inode)
+                if filename and validate_unix_socket(filename, uid=uid):
+                    candidates.append(filename)
+            # A gpg-agent can listen on several sockets (for example
+            # S.gpg-agent.ssh and S.gpg-agent.extra) so prefer the
+            # standard socket when it's available.
+            candidates.sort(key=lambda filename: os.path.basename(filename) != 'S.gpg-agent')
+        if candidates:
+            yield AgentInfo(program=process.comm, uid=uid, pid=process.pid, socket=candidates[0])
+
+
+class AgentInfo(collections.namedtuple('AgentInfo', 'program, uid, pid, socket')):
+
+    """
+    A running agent that was found by :func:`find_agents()` (a named tuple).
+
+    .. attribute:: program
+
+       The name of the agent program (the string ``gpg-agent`` or ``ssh-agent``).
+
+    .. attribute:: uid
+
+       The user ID of the owner of the agent (an integer).
+
+    .. attribute:: pid
+
+       The process ID of the agent (an integer).
+
+    .. attribute:: socket
+
+       The pathname of the UNIX socket of the agent (a string).
+    """
+
+    @property
+    def environment(self):
+        """
+        The environment variables required to connect to the agent (a dictionary).
+
+        For ``gpg-agent`` this sets ``$GPG_AGENT_INFO``, for ``ssh-agent``
+        this sets ``$SSH_AUTH_SOCK`` and ``$SSH_AGENT_PID``.
+        """
+        if self.program == 'ssh-agent':
+            return dict(SSH_AUTH_SOCK=self.socket, SSH_AGENT_PID=str(self.pid))
+        return dict(GPG_AGENT_INFO=':'.join([self.socket, str(self.pid), '1']))
+
+
+class AgentIndex(object):
+
+    """
+    Index of the running agents of all users.
+
+    This is intended for daemons running as root that need to find the agents
+    of many users: Instead of scanning ``/proc`` once per user, a single scan
+    (refer to :func:`find_agents()`) is used to find the agents of all users
+    and the result is reused for :attr:`ttl` seconds. Here's an example:
+
+    >>> from proc.gpg import AgentIndex
+    >>> index = AgentIndex(include_ssh_agent=True)
+    >>> for uid in (1000, 1001, 1002):
+    ...     agent = index.find_gpg_agent(uid)
+    ...     if agent:
+    ...         print(agent.environment)
+
+    Before an agent is returned its socket is checked (one :func:`os.stat()`
+    call) so that agents that have ended since the scan aren't returned.
+    """
+
+    def __init__(self, include_ssh_agent=False, ttl=DEFAULT_INDEX_TTL):
+        """
+        Initialize an :class:`AgentIndex` object.
+
+        :param include_ssh_agent: Refer to :func:`find_agents()`.
+        :param ttl: The number of seconds that the result of a scan is reused
+                    (a number, defaults to :data:`DEFAULT_INDEX_TTL`).
+        """
+        self.include_ssh_agent = include_ssh_agent
+        self.ttl = ttl
+        self.agents = {}
+        self.timer = None
+
+    @property
+    def is_expired(self):
+        """:data:`True` if the index needs to be refreshed, :data:`False` otherwise."""
+        return self.timer is None or self.timer.elapsed_time >= self.ttl
+
+    def refresh(self):
+        """Scan ``/proc`` and replace the contents of the index."""
+        timer = Timer()
+        agents = {}
+        for agent in find_agents(include_ssh_agent=self.include_ssh_agent):
+            agents.setdefault((agent.program, agent.uid), agent)
+        logger.debug("Found %i agents in %s.", len(agents), timer)
+        self.agents = agents
+        self.timer = timer
+
+    def find_agent(self, program, uid):
+        """
+        Find the agent of a user.
+
+        :param program: The name of the agent program (a string).
+        :param uid: The user ID (an integer).
+        :returns: An :class:`AgentInfo` object or :data:`None`.
+        """
+        if self.is_expired:
+            self.refresh()
+        agent = self.agents.get((program, uid))
+        if agent and validate_unix_socket(agent.socket, uid=uid):
+            return agent
+        return None
+
+    def find_gpg_agent(self, uid):
+        """Shortcut for :func:`find_agent()` that finds the ``gpg-agent`` of a user."""
+        return self.find_agent('gpg-agent', uid)
+
+    def find_ssh_agent(self, uid):
+        """Shortcut for :func:`find_agent()` that finds the ``ssh-agent`` of a user."""
+        return self.find_agent('ssh-agent', uid)
+
+
+def find_cached_agent_info():
+    """
+    Reconstruct ``$GPG_AGENT_INFO`` based on the result of a previous search.
+
+    :returns: A string or :data:`None`.
+
+    This function loads the socket pathname, process ID and start time of the
+    agent that was last found by :func:`find_gpg_agent_info()` from the
+    :data:`AGENT_CACHE_NAME` cache (refer to :mod:`proc.cache`). The cached
+    information is only used when the socket still exists (one
+    :func:`os.stat()` call, refer to :func:`validate_unix_socket()`) and the
+    agent process is still alive (one read of ``/proc/[pid]/stat``, refer to
+    :func:`~proc.cache.check_process_identity()`).
+    """
+    cached = load_cache(AGENT_CACHE_NAME)
+    if cached:
+        socket_file = cached.get('socket')
+        pid = cached.get('pid')
+        if isinstance(pid, int) and validate_unix_socket(socket_file):
+            if check_process_identity(pid, cached.get('starttime')):
+                agent_info = ':'.join([socket_file, str(pid), '1'])
+                logger.debug("Using cached $GPG_AGENT_INFO: %s", agent_info)
+                return agent_info
+        logger.debug("Ignoring stale cache of $GPG_AGENT_INFO.")
+    return None
+
+
 def find_fixed_agent_socket():
     """
     Search for a GPG agent UNIX socket in one of the "fixed locations".
 
     :returns: The pathname of the found socket file (a string) or :data:`None`.
 
-    Two locations are searched, in the given order (the first that is found is
-    returned):
+    The locations given by :func:`find_fixed_agent_sockets()` are searched,
+    the first that is found is returned.
+    """
+    for socket in find_fixed_agent_sockets():
+        if os.path.exists(socket):
+            return socket
+
+
+def find_fixed_agent_sockets(uid=None):
+    """
+    Get the "fixed locations" of the GPG agent UNIX socket.
+
+    :param uid: The user ID of the agent (an integer, defaults to the user ID
+                of the current process).
+    :returns: A list of socket pathnames (strings).
+
+    Two locations are returned, in the following order:
 
     - Starting from GnuPG 2.1.13 the location ``/run/user/$UID/gnupg/S.gpg-agent``
       is used (only when the directory ``/run/user/$UID`` exists).
@@ -310,32 +586,61 @@ def find_fixed_agent_socket():
     - GnuPG 2.1 removed the ``$GPG_AGENT_INFO`` related code and switched to
       the fixed location ``~/.gnupg/S.gpg-agent``.
     """
-    socket_on_tmpfs = '/run/user/%i/gnupg/S.gpg-agent' % os.getuid()
-    for socket in (socket_on_tmpfs, parse_path(NEW_STYLE_SOCKET)):
-        if os.path.exists(socket):
-            return socket
+    if uid is None or uid == os.getuid():
+        return ['/run/user/%i/gnupg/S.gpg-agent' % os.getuid(), parse_path(NEW_STYLE_SOCKET)]
+    sockets = ['/run/user/%i/gnupg/S.gpg-agent' % uid]
+    try:
+        home = pwd.getpwuid(uid).pw_dir
+        sockets.append(os.path.join(home, NEW_STYLE_SOCKET.replace('~/', '', 1)))
+    except KeyError:
+        pass
+    return sockets
 
 
-def find_open_unix_sockets(pid):
+def find_open_unix_sockets(pid, index=None):
     """
     Find the pathnames of any UNIX sockets held open by a process.
 
     :param pid: The process ID (a number).
+    :param index: The result of :func:`~proc.core.find_unix_sockets()` (a
+                  dictionary). If you're going to inspect multiple processes
+                  you can pass the same index to avoid parsing
+                  ``/proc/net/unix`` more than once.
     :returns: A generator of pathnames (strings).
+
+    The inode numbers of the sockets held open by the process are taken from
+    :attr:`~proc.core.Process.socket_inodes` and joined against the index.
     """
-    # A quick lsof tutorial :-)
-    #  -F enables output that is easy to parse,
-    #  -p lists the open files of a specific PID,
-    #  -a combines -p and -U using AND instead of OR,
-    #  -U lists only UNIX domain socket files.
-    output = execute('lsof', '-F', '-p', str(pid), '-a', '-U', capture=True, check=False, silent=True)
-    for line in output.splitlines():
-        if line and line[0] == 'n':
-            filename = line[1:]
+    process = Process.from_pid(pid)
+    if process:
+        if index is None:
+            index = find_unix_sockets()
+        for inode in process.socket_inodes:
+            filename = index.get(inode)
             if filename:
                 yield filename
 
 
+def find_terminal():
+    """
+    Find the name of the terminal connected to the standard streams.
+
+    :returns: The pathname of the terminal device (a string) or :data:`None`.
+
+    The standard input, output and error streams are checked (in that order)
+    using :func:`os.ttyname()`, this gives the same result as `/usr/bin/tty`_
+    without running an external program.
+
+    .. _/usr/bin/tty: https://manpages.debian.org/cgi-bin/man.cgi?query=tty
+    """
+    for fd in (0, 1, 2):
+        try:
+            return os.ttyname(fd)
+        except EnvironmentError:
+            pass
+    return None
+
+
 def have_agent_program():
     """
     Check whether the ``gpg-agent`` program is installed.
@@ -361,17 +666,19 @@ def have_valid_agent_info():
     return components and validate_unix_socket(components[0])
 
 
-def validate_unix_socket(pathname):
+def validate_unix_socket(pathname, uid=None):
     """
     Check whether a filename points to a writable UNIX socket.
 
     :param pathname: The pathname of the socket file (a string).
+    :param uid: If this is given the socket must be owned by the given user
+                ID (an integer).
     :returns: :data:`True` if the socket exists and is writable,
               :data:`False` in all other cases.
     """
     try:
         metadata = os.stat(pathname)
-        if stat.S_ISSOCK(metadata.st_mode):
+        if stat.S_ISSOCK(metadata.st_mode) and (uid is None or metadata.st_uid == uid):
             return os.access(pathname, os.W_OK)
     except Exception:
         pass
@@ -385,16 +692,146 @@ def start_gpg_agent(timeout=LAUNCH_TIMEOUT):
     :param timeout: The timeout for the newly launched GPG agent daemon to
                     start (a number, defaults to :data:`LAUNCH_TIMEOUT`).
     :returns: The return value of :func:`find_gpg_agent_info()`.
+
+    Instead of repeatedly scanning ``/proc`` while the agent starts, the
+    directories where the agent creates its socket (refer to
+    :func:`find_socket_directories()`) are watched using
+    :class:`DirectoryWatcher` and the expected socket pathnames are checked
+    using :func:`validate_unix_socket()` whenever one of these directories
+    changes. :func:`find_gpg_agent_info()` is called only once: As soon as
+    one of the sockets appears or when the launched ``gpg-agent --daemon``
+    process exits (it forks the actual agent and exits once the agent is
+    ready, this supports older GnuPG versions that create their socket
+    elsewhere). Launch failures are reported without waiting for the timeout.
     """
     timer = Timer()
     logger.info("Starting a new GPG agent daemon ..")
-    execute('gpg-agent', '--daemon', asynchronous=True, silent=True)
-    with Spinner(timer=timer) as spinner:
-        while timer.elapsed_time < LAUNCH_TIMEOUT:
-            gpg_agent_info = find_gpg_agent_info()
-            if gpg_agent_info:
-                logger.debug("Waited %s for GPG agent daemon to start.", timer)
-                return gpg_agent_info
-            spinner.step(label="Waiting for GPG agent daemon")
-            spinner.sleep()
+    sockets = find_fixed_agent_sockets()
+    with DirectoryWatcher(find_socket_directories()) as watcher:
+        launcher = execute('gpg-agent', '--daemon', asynchronous=True, check=False, silent=True)
+        with Spinner(timer=timer) as spinner:
+            changed = True
+            while timer.elapsed_time < timeout:
+                if launcher.is_finished and launcher.failed:
+                    logger.warning("Failed to start GPG agent! (gpg-agent exited with status %i)",
+                                   launcher.returncode)
+                    return None
+                if launcher.is_finished or (changed and any(validate_unix_socket(s) for s in sockets)):
+                    gpg_agent_info = find_gpg_agent_info()
+                    if gpg_agent_info:
+                        logger.debug("Waited %s for GPG agent daemon to start.", timer)
+                        return gpg_agent_info
+                    logger.warning("Failed to locate spawned GPG agent! (waited for %s)", timer)
+                    return None
+                spinner.step(label="Waiting for GPG agent daemon")
+                # Without inotify we check the sockets on every iteration.
+                changed = watcher.wait(0.2) or not watcher.is_watching
     logger.warning("Failed to locate spawned GPG agent! (waited for %s)", timer)
+
+
+def find_socket_directories():
+    """
+    Find the directories in which the GPG agent creates its socket.
+
+    :returns: A list of directory pathnames (strings).
+
+    The directories of the "fixed locations" searched by
+    :func:`find_fixed_agent_socket()` are returned (these directories
+    may not exist yet, refer to :class:`DirectoryWatcher`).
+    """
+    directories = []
+    for socket in find_fixed_agent_sockets():
+        directory = os.path.dirname(socket)
+        if directory not in directories:
+            directories.append(directory)
+    return directories
+
+
+class DirectoryWatcher(object):
+
+    """
+    Wait for changes to directories using inotify_.
+
+    This is a minimal :mod:`ctypes` wrapper for the Linux inotify_ API that
+    reports the creation of files in a set of directories. When a directory
+    doesn't exist yet its nearest existing parent directory is watched
+    instead, and as soon as the directory is created it is watched as well.
+    When inotify_ isn't available (e.g. because the C library doesn't expose
+    it) the :func:`wait()` method simply sleeps for the given timeout, which
+    turns the callers loop into a stat polling loop.
+
+    .. _inotify: https://manpages.debian.org/cgi-bin/man.cgi?query=inotify
+    """
+
+    def __init__(self, directories):
+        """
+        Initialize a :class:`DirectoryWatcher` object.
+
+        :param directories: A list of directory pathnames (strings).
+        """
+        self.directories = directories
+        self.fd = None
+        self.libc = None
+        self.watched = set()
+
+    def __enter__(self):
+        """Start watching the directories."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+            self.libc = libc
+            self.fd = fd
+            self.add_watches()
+        except (AttributeError, OSError) as e:
+            logger.debug("Falling back to polling because inotify isn't available! (%s)", e)
+        return self
+
+    def add_watches(self):
+        """Watch the directories (or their nearest existing parent directories) that aren't watched yet."""
+        for directory in self.directories:
+            while directory and not os.path.isdir(directory):
+                directory = os.path.dirname(directory)
+            if directory and directory not in self.watched:
+                if self.libc.inotify_add_watch(self.fd, directory.encode('UTF-8'), INOTIFY_EVENTS) < 0:
+                    logger.debug("Failed to watch %s using inotify!", directory)
+                else:
+                    logger.debug("Watching %s using inotify ..", directory)
+                self.watched.add(directory)
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Stop watching the directories."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watched.clear()
+
+    @property
+    def is_watching(self):
+        """:data:`True` if inotify is being used, :data:`False` if :func:`wait()` falls back to sleeping."""
+        return self.fd is not None
+
+    def wait(self, timeout):
+        """
+        Wait for a file to be created in one of the directories.
+
+        :param timeout: The maximum number of seconds to wait (a number).
+        :returns: :data:`True` if a change was reported, :data:`False`
+                  otherwise.
+        """
+        if self.fd is None:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            # Drain the queued events, we don't care about the details.
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except OSError:
+                pass
+            # Watch directories that were just created.
+            self.add_watches()
+            return True
+        return False
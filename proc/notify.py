@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -33,13 +33,49 @@ The notify-send-headless program
 
 This module builds on top of the :mod:`proc.core` module as a trivial (but
 already useful :-) example of how the `proc` package can be used to search
-through the environments of all available processes. It looks for the variables
-in :attr:`REQUIRED_VARIABLES` in the environments of all available processes
-and uses the values it finds to run the notify-send program. It's available on
+through the environments of processes. It looks for the variables in
+:attr:`REQUIRED_VARIABLES` in the environments of the processes that are most
+likely to be part of a graphical session (refer to
+:func:`find_session_candidates()`) and uses the values it finds to run the
+notify-send program. It's available on
 the command line as ``notify-send-headless`` (which accepts the same arguments
 as ``notify-send``). Given super-user privileges this should work fine out of
 the box on any Linux system.
 
+The notification daemon
+-----------------------
+
+Running ``notify-send-headless --daemon`` starts a long running process that
+listens on a UNIX socket in the user's runtime directory (refer to
+:func:`find_daemon_socket()`). When the daemon is running
+``notify-send-headless`` and :func:`queue_notification()` hand their
+notifications to the daemon (a single datagram, no process scan and no
+``notify-send`` process) and the daemon takes care of delivery. Bursts of
+notifications are coalesced and rate limited by :class:`NotificationDaemon`.
+
+Delivery using D-Bus
+--------------------
+
+The Python API (:func:`notify_desktop()`) and the notification daemon don't
+need to run ``notify-send`` at all: They deliver notifications by calling the
+``org.freedesktop.Notifications.Notify`` method on the session bus of the
+graphical session using the minimal D-Bus client in :mod:`proc.dbus` (which
+reuses its connection between notifications). When that fails for whatever
+reason ``notify-send`` is used as a fall back (refer to
+:func:`deliver_notification()`).
+
+Multiple graphical sessions
+---------------------------
+
+By default notifications are delivered to a single graphical session (the
+"most popular" one). On multi-seat systems and shared servers where several
+users are logged in to a desktop session, the ``--all-sessions`` option of
+``notify-send-headless`` (and :func:`notify_all_desktops()` in the Python API)
+delivers the notification to every graphical session found by
+:func:`find_graphical_sessions()`. Delivery to the individual sessions
+happens concurrently, so a slow or hung session bus doesn't delay the
+notification in other sessions (refer to :func:`deliver_to_sessions()`).
+
 The with-gui-environment program
 --------------------------------
 
@@ -60,40 +96,213 @@ default run commands as root, disconnected from the desktop session).
 
 # Standard library modules.
 import collections
+import errno
+import json
 import logging
 import os
+import select
+import socket
+import struct
 import sys
+import threading
+import time
 
 # External dependencies.
 import coloredlogs
 from executor import CommandNotFound, ExternalCommandFailed
 from executor.contexts import LocalContext
+from humanfriendly import Timer
+from humanfriendly.text import pluralize
 
 # Modules included in our package.
-from proc.core import find_processes
+from proc.dbus import DBusError, DEFAULT_TIMEOUT, URGENCY_LEVELS, notify
+from proc.cache import (
+    check_process_identity,
+    clear_cache,
+    find_cache_directory,
+    get_process_identity,
+    load_cache,
+    save_cache,
+)
+from proc.core import ProtectedAccess, find_processes, get_owner_uid, parse_process_status
 
 # Public identifiers that require documentation.
 __all__ = (
+    'DAEMON_SOCKET_NAME',
+    'DEFAULT_CONFIDENCE',
+    'DEFAULT_DELIVERY_TIMEOUT',
+    'DEFAULT_MAX_PENDING',
+    'DEFAULT_RATE_INTERVAL',
+    'DEFAULT_SESSION_LIFETIME',
+    'DESKTOP_COMPONENTS',
+    'GraphicalSession',
+    'NOTIFY_SEND_OPTIONS',
+    'NotificationDaemon',
     'REQUIRED_VARIABLES',
+    'RUNTIME_DIRECTORY',
+    'SESSION_CACHE_NAME',
+    'X11_SOCKET_DIRECTORY',
+    'check_session',
+    'create_context',
+    'deliver_notification',
+    'deliver_to_sessions',
+    'deliver_using_dbus',
+    'find_cached_session',
+    'find_daemon_socket',
     'find_graphical_context',
+    'find_graphical_session',
+    'find_graphical_sessions',
+    'find_session_candidates',
+    'find_session_sockets',
+    'find_session_users',
+    'group_sessions',
     'logger',
     'main',
+    'notify_all_desktops',
     'notify_desktop',
+    'notify_send_arguments',
+    'parse_notify_send_arguments',
+    'queue_notification',
+    'rank_environments',
+    'read_session_variables',
+    'send_to_daemon',
     'with_gui_environment',
 )
 
+DAEMON_SOCKET_NAME = 'notify-send-headless.sock'
+"""
+The filename of the UNIX socket of the notification daemon (a string).
+
+Refer to :func:`find_daemon_socket()` for details.
+"""
+
+DEFAULT_CONFIDENCE = 3
+"""
+The number of processes that must agree on a graphical session (an integer).
+
+Refer to :func:`rank_environments()` for details.
+"""
+
+DEFAULT_DELIVERY_TIMEOUT = 10
+"""
+The maximum number of seconds to wait for notifications to be delivered to all sessions (a number).
+
+Refer to :func:`deliver_to_sessions()` for details.
+"""
+
+DEFAULT_MAX_PENDING = 10
+"""
+The maximum number of distinct notifications queued by the daemon (an integer).
+
+Refer to :class:`NotificationDaemon` for details.
+"""
+
+DEFAULT_RATE_INTERVAL = 0.5
+"""
+The minimum number of seconds between notifications delivered by the daemon (a number).
+
+Refer to :class:`NotificationDaemon` for details.
+"""
+
+DEFAULT_SESSION_LIFETIME = 60
+"""
+The maximum number of seconds the daemon reuses the graphical sessions it found (a number).
+
+Refer to :func:`NotificationDaemon.find_sessions()` for details.
+"""
+
+DESKTOP_COMPONENTS = frozenset([
+    'cinnamon',
+    'gnome-session-b',
+    'gnome-shell',
+    'i3',
+    'ksmserver',
+    'kwin_wayland',
+    'kwin_x11',
+    'lxqt-session',
+    'lxsession',
+    'mate-session',
+    'openbox',
+    'plasmashell',
+    'sway',
+    'xfce4-panel',
+    'xfce4-session',
+    'xfwm4',
+])
+"""
+The :attr:`~proc.core.Process.comm` values of well known desktop components (a set of strings).
+
+Processes with these names are the first candidates searched by
+:func:`find_session_candidates()`. Keep in mind that the kernel truncates
+:attr:`~proc.core.Process.comm` to 15 characters (this is why
+``gnome-session-binary`` is listed as ``gnome-session-b``).
+"""
+
 REQUIRED_VARIABLES = 'DBUS_SESSION_BUS_ADDRESS', 'DISPLAY', 'XAUTHORITY'
 """The names of environment variables required by ``notify-send`` (a tuple of strings)."""
 
+NOTIFY_SEND_OPTIONS = {
+    'app-name': 'app_name',
+    'category': 'category',
+    'expire-time': 'expire_timeout',
+    'icon': 'app_icon',
+    'urgency': 'urgency',
+}
+"""
+A dictionary that maps ``notify-send`` options to :func:`proc.dbus.notify()` keyword arguments.
+
+Refer to :func:`parse_notify_send_arguments()` for details.
+"""
+
+RUNTIME_DIRECTORY = '/run/user'
+"""The directory that contains the runtime directories of logged in users (a string)."""
+
+SESSION_CACHE_NAME = 'graphical-session'
+"""
+The name of the cache used to remember the graphical session (a string).
+
+Refer to :func:`find_cached_session()` and :mod:`proc.cache` for details.
+"""
+
+X11_SOCKET_DIRECTORY = '/tmp/.X11-unix'
+"""The directory that contains the UNIX sockets of local X servers (a string)."""
+
 # Initialize a logger for this module.
 logger = logging.getLogger(__name__)
 
+# Threads started by deliver_to_sessions() (used to skip sessions whose previous delivery is still running).
+DELIVERY_THREADS = {}
+DELIVERY_LOCK = threading.Lock()
+
 
 def main():
-    """Command line interface for ``notify-send-headless``."""
+    """
+    Command line interface for ``notify-send-headless``.
+
+    When the first argument is ``--daemon`` a :class:`NotificationDaemon` is
+    started. When the first argument is ``--all-sessions`` the notification is
+    delivered to all graphical sessions (refer to :func:`deliver_to_sessions()`,
+    the two options can be combined). Otherwise the arguments are handed to the
+    notification daemon (when it's running) or passed to ``notify-send``.
+    """
     coloredlogs.install(syslog=True)
-    context = find_graphical_context()
-    context.execute('notify-send', *sys.argv[1:])
+    arguments = sys.argv[1:]
+    options = set()
+    while arguments and arguments[0] in ('--all-sessions', '--daemon'):
+        options.add(arguments.pop(0))
+    if '--daemon' in options:
+        with NotificationDaemon(all_sessions=('--all-sessions' in options)) as daemon:
+            try:
+                daemon.run()
+            except KeyboardInterrupt:
+                logger.info("Interrupted, shutting down ..")
+    elif '--all-sessions' in options:
+        results = deliver_to_sessions(arguments)
+        if not any(results.values()):
+            sys.exit(1)
+    elif not send_to_daemon(arguments):
+        context = find_graphical_context()
+        context.execute('notify-send', *arguments)
 
 
 def with_gui_environment():
@@ -115,58 +324,814 @@ def notify_desktop(body, summary=None, **options):
                     arguments to the ``notify-send`` command (see the examples
                     below).
 
-    This function is a wrapper around ``notify-send`` that knows how to run the
-    ``notify-send`` command in the execution environment required to deliver
+    This function is a wrapper around ``notify-send`` that knows how to deliver
     notifications to the current graphical session, even if the current process
-    is not part of a graphical session. Here's an example:
+    is not part of a graphical session (refer to :func:`deliver_notification()`
+    for details). Here's an example:
 
     >>> from proc.notify import notify_desktop
     >>> notify_desktop(summary="Battery low", body="Your laptop is about to die!", urgency="critical")
     """
-    command_line = ['notify-send']
-    for name, value in sorted(options.items()):
-        command_line.append('--%s=%s' % (name.replace('_', '-'), value))
-    if summary:
-        command_line.append(summary)
-    command_line.append(body)
-    context = find_graphical_context()
+    deliver_notification(notify_send_arguments(body, summary, **options))
+
+
+def notify_all_desktops(body, summary=None, **options):
+    """
+    Deliver a notification to all graphical sessions.
+
+    :param body: Refer to :func:`notify_desktop()`.
+    :param summary: Refer to :func:`notify_desktop()`.
+    :param options: Refer to :func:`notify_desktop()`.
+    :returns: The return value of :func:`deliver_to_sessions()`.
+    """
+    return deliver_to_sessions(notify_send_arguments(body, summary, **options))
+
+
+def deliver_to_sessions(arguments, sessions=None, timeout=DEFAULT_DELIVERY_TIMEOUT):
+    """
+    Deliver a notification to multiple graphical sessions concurrently.
+
+    :param arguments: The command line arguments for ``notify-send`` (a list
+                      of strings).
+    :param sessions: A list of :class:`GraphicalSession` objects (defaults to
+                     the result of :func:`find_graphical_sessions()`).
+    :param timeout: The maximum number of seconds to wait for delivery (a
+                    number, defaults to :data:`DEFAULT_DELIVERY_TIMEOUT`).
+    :returns: A dictionary that maps :attr:`GraphicalSession.uid` and
+              :attr:`GraphicalSession.pid` tuples to booleans (:data:`True`
+              when the notification was delivered to the session,
+              :data:`False` when delivery failed or didn't finish within the
+              timeout).
+
+    Each session is handled by a separate (daemon) thread that calls
+    :func:`deliver_notification()` with the time remaining until the deadline,
+    so a slow or hung session bus only delays the delivery to its own session.
+    Threads that don't finish within the timeout are abandoned (they don't
+    prevent the current process from exiting). Sessions whose previous
+    delivery is still running are skipped (they're reported as failed).
+    """
+    if sessions is None:
+        sessions = find_graphical_sessions()
+    timer = Timer()
+    results = {}
+    threads = []
+    for session in sessions:
+        key = (session.uid, session.pid)
+        results[key] = False
+        with DELIVERY_LOCK:
+            previous = DELIVERY_THREADS.get(key)
+            if previous and previous.is_alive():
+                logger.warning("Skipping session of user %i (previous delivery by %s is still running).",
+                               session.uid, previous.name)
+                continue
+
+            def deliver(key=key, session=session):
+                remaining = max(0, timeout - timer.elapsed_time)
+                results[key] = deliver_notification(arguments, session=session, timeout=remaining)
+            thread = threading.Thread(target=deliver, name='notify-%i-%i' % key)
+            thread.daemon = True
+            thread.start()
+            DELIVERY_THREADS[key] = thread
+        threads.append(thread)
+    for thread in threads:
+        thread.join(max(0, timeout - timer.elapsed_time))
+        if thread.is_alive():
+            logger.warning("Delivery of notification by %s didn't finish within %s!", thread.name, timer)
+    with DELIVERY_LOCK:
+        for key, thread in list(DELIVERY_THREADS.items()):
+            if not thread.is_alive():
+                del DELIVERY_THREADS[key]
+    logger.debug("Delivered notification to %i of %i sessions in %s.",
+                 sum(map(bool, results.values())), len(results), timer)
+    return dict(results)
+
+
+def deliver_notification(arguments, use_dbus=True, session=None, timeout=DEFAULT_TIMEOUT):
+    """
+    Deliver a notification to the current graphical session.
+
+    :param arguments: The command line arguments for ``notify-send`` (a list
+                      of strings).
+    :param use_dbus: :data:`True` to try :func:`deliver_using_dbus()` before
+                     falling back to ``notify-send``, :data:`False` to always
+                     use ``notify-send``.
+    :param session: The :class:`GraphicalSession` to deliver the notification
+                    to (defaults to the current graphical session).
+    :param timeout: The maximum number of seconds to wait for delivery (a
+                    number, defaults to :data:`proc.dbus.DEFAULT_TIMEOUT`).
+                    This applies to :func:`deliver_using_dbus()` as well as
+                    ``notify-send`` (which is killed when it doesn't finish
+                    within the remaining time).
+    :returns: :data:`True` if the notification was delivered, :data:`False`
+              otherwise (the reason is logged).
+    """
+    timer = Timer()
+    session = session or find_cached_session() or find_graphical_session()
+    if use_dbus and session and deliver_using_dbus(arguments, session, timeout=timeout):
+        return True
+    remaining = timeout - timer.elapsed_time
+    if remaining <= 0:
+        logger.debug("Desktop notification failed (no time left to run `notify-send').")
+        return False
+    context = create_context(session)
     try:
-        context.execute(*command_line)
+        command = context.execute('notify-send', *arguments, asynchronous=True)
+        command.wait_for_process(timeout=remaining, use_spinner=False)
+        if command.is_running:
+            logger.debug("Desktop notification failed (the `notify-send' program didn't finish within %s).",
+                         timer)
+            command.kill()
+            return False
+        command.wait()
+        return True
     except CommandNotFound:
         logger.debug("Desktop notification failed (the `notify-send' program isn't installed).")
     except ExternalCommandFailed:
         logger.debug("Desktop notification failed (the `notify-send' program reported an error).")
+    return False
+
+
+def deliver_using_dbus(arguments, session, timeout=DEFAULT_TIMEOUT):
+    """
+    Deliver a notification using :func:`proc.dbus.notify()`.
+
+    :param arguments: The command line arguments for ``notify-send`` (a list
+                      of strings).
+    :param session: A :class:`GraphicalSession` object.
+    :param timeout: The maximum number of seconds to wait for the session bus
+                    (a number, defaults to :data:`proc.dbus.DEFAULT_TIMEOUT`).
+    :returns: :data:`True` if the notification was delivered, :data:`False`
+              when the session doesn't define a session bus, the arguments
+              aren't supported by :func:`parse_notify_send_arguments()` or
+              delivery failed.
+    """
+    address = session.environment.get('DBUS_SESSION_BUS_ADDRESS')
+    parsed = parse_notify_send_arguments(arguments)
+    if address and parsed:
+        summary, body, options = parsed
+        try:
+            notify(address, summary, body, uid=session.uid, timeout=timeout, **options)
+            return True
+        except (DBusError, EnvironmentError, struct.error, UnicodeError, ValueError) as e:
+            logger.debug("Failed to deliver notification using D-Bus, falling back to notify-send! (%s)", e)
+    return False
+
+
+def parse_notify_send_arguments(arguments):
+    """
+    Translate command line arguments for ``notify-send`` to :func:`proc.dbus.notify()` arguments.
+
+    :param arguments: The command line arguments for ``notify-send`` (a list
+                      of strings).
+    :returns: A tuple with three values (the summary, the body and a
+              dictionary with keyword arguments) or :data:`None` when the
+              arguments use options that aren't in :data:`NOTIFY_SEND_OPTIONS`
+              (in which case ``notify-send`` should be used).
+    """
+    options = {}
+    positional = []
+    for argument in arguments:
+        if argument.startswith('--') and '=' in argument:
+            name, _, value = argument[2:].partition('=')
+            if name not in NOTIFY_SEND_OPTIONS:
+                return None
+            if name == 'expire-time':
+                # The expire_timeout argument of the Notify method is an int32.
+                try:
+                    value = int(value)
+                except ValueError:
+                    return None
+                if not 0 <= value < 2 ** 31:
+                    return None
+            elif name == 'urgency' and value not in URGENCY_LEVELS:
+                return None
+            options[NOTIFY_SEND_OPTIONS[name]] = value
+        elif argument.startswith('-'):
+            return None
+        else:
+            positional.append(argument)
+    if len(positional) == 1:
+        return positional[0], '', options
+    elif len(positional) == 2:
+        return positional[0], positional[1], options
+    return None
+
+
+def queue_notification(body, summary=None, **options):
+    """
+    Hand a notification to the notification daemon.
 
+    :param body: Refer to :func:`notify_desktop()`.
+    :param summary: Refer to :func:`notify_desktop()`.
+    :param options: Refer to :func:`notify_desktop()`.
 
-def find_graphical_context():
+    When the notification daemon is running (refer to
+    :class:`NotificationDaemon`) the notification is sent to the daemon
+    using :func:`send_to_daemon()`, which returns without waiting for the
+    notification to be delivered. When the daemon isn't running this falls
+    back to :func:`notify_desktop()`.
+    """
+    if not send_to_daemon(notify_send_arguments(body, summary, **options)):
+        notify_desktop(body, summary, **options)
+
+
+def notify_send_arguments(body, summary=None, **options):
+    """
+    Translate a notification to command line arguments for ``notify-send``.
+
+    :param body: Refer to :func:`notify_desktop()`.
+    :param summary: Refer to :func:`notify_desktop()`.
+    :param options: Refer to :func:`notify_desktop()`.
+    :returns: A list of strings.
+    """
+    arguments = []
+    for name, value in sorted(options.items()):
+        arguments.append('--%s=%s' % (name.replace('_', '-'), value))
+    if summary:
+        arguments.append(summary)
+    arguments.append(body)
+    return arguments
+
+
+def send_to_daemon(arguments, pathname=None):
+    """
+    Send a notification to the notification daemon.
+
+    :param arguments: The command line arguments for ``notify-send`` (a list
+                      of strings).
+    :param pathname: The pathname of the daemon's socket (a string, defaults
+                     to the result of :func:`find_daemon_socket()`).
+    :returns: :data:`True` if the notification was handed to the daemon,
+              :data:`False` if the daemon isn't running (or its queue is
+              full).
+
+    The notification is sent as a single datagram without waiting for a
+    reply, so this takes a fraction of a millisecond.
+    """
+    pathname = pathname or find_daemon_socket()
+    if pathname and os.path.exists(pathname):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            client.setblocking(False)
+            client.sendto(json.dumps(list(arguments)).encode('UTF-8'), pathname)
+            return True
+        except socket.error as e:
+            logger.debug("Failed to send notification to daemon! (%s)", e)
+        finally:
+            client.close()
+    return False
+
+
+def find_daemon_socket():
+    """
+    Find the pathname of the UNIX socket of the notification daemon.
+
+    :returns: The pathname of :data:`DAEMON_SOCKET_NAME` in the user's runtime
+              directory (refer to :func:`~proc.cache.find_cache_directory()`)
+              or :data:`None` when no runtime directory is available.
+    """
+    directory = find_cache_directory()
+    return os.path.join(directory, DAEMON_SOCKET_NAME) if directory else None
+
+
+def find_graphical_context(confidence=DEFAULT_CONFIDENCE, use_cache=True):
     """
     Create a command execution context for the current graphical session.
 
+    :param confidence: Refer to :func:`rank_environments()`.
+    :param use_cache: :data:`True` to reuse the result of a previous search
+                      when it's still valid (refer to
+                      :func:`find_cached_session()`), :data:`False` to
+                      always search for the graphical session.
     :returns: A :class:`~executor.contexts.LocalContext` object.
 
-    This function scans the process tree for processes that are running in a
-    graphical session and collects information about graphical sessions from
-    each of these processes. The collected information is then ranked by
-    "popularity" (number of occurrences) and the most popular information is
-    used to create a command execution context that targets the graphical
-    session.
+    This function uses :func:`find_graphical_session()` to find the user ID
+    and environment variables of the current graphical session and uses this
+    information to create a command execution context that targets the
+    graphical session.
+    """
+    return create_context((use_cache and find_cached_session()) or find_graphical_session(confidence))
+
+
+def create_context(session):
+    """
+    Create a command execution context for a graphical session.
+
+    :param session: A :class:`GraphicalSession` object or :data:`None`.
+    :returns: A :class:`~executor.contexts.LocalContext` object.
     """
     options = {}
-    # Collect information about graphical sessions from running processes.
-    matches = collections.defaultdict(int)
-    for process in find_processes():
-        environment = dict((k, v) for k, v in process.environ.items() if k in REQUIRED_VARIABLES and v)
-        if environment:
-            hashable_environment = tuple(sorted(environment.items()))
-            matches[(process.user_ids.real, hashable_environment)] += 1
-    ordered = sorted((counter, key) for key, counter in matches.items())
-    if ordered:
-        # Pick the most popular graphical session.
-        counter, key = ordered[-1]
-        uid, environment = key
+    if session:
         # Apply the user ID to the context?
-        if os.getuid() != uid:
-            options['uid'] = uid
+        if os.getuid() != session.uid:
+            options['uid'] = session.uid
         # Apply the environment to the context.
-        options['environment'] = dict(environment)
+        options['environment'] = dict(session.environment)
     return LocalContext(**options)
+
+
+def find_graphical_session(confidence=DEFAULT_CONFIDENCE):
+    """
+    Find the user ID and environment variables of the current graphical session.
+
+    :param confidence: Refer to :func:`rank_environments()`.
+    :returns: A :class:`GraphicalSession` object or :data:`None`.
+
+    The processes that are most likely to be part of a graphical session are
+    searched first (refer to :func:`find_session_candidates()`). Only when
+    none of these processes reveal a graphical session all processes are
+    searched (as a fall back).
+
+    The result is saved in the :data:`SESSION_CACHE_NAME` cache so that
+    :func:`find_cached_session()` can reuse it.
+    """
+    timer = Timer()
+    session = rank_environments(find_session_candidates(), confidence)
+    if not session:
+        logger.debug("No graphical session found among candidates, searching all processes ..")
+        session = rank_environments(((p.pid, p.user_ids.real) for p in find_processes() if p.user_ids), confidence)
+    logger.debug("Searched for graphical session in %s.", timer)
+    if session:
+        save_cache(SESSION_CACHE_NAME, dict(
+            uid=session.uid,
+            environment=session.environment,
+            pid=session.pid,
+            starttime=get_process_identity(session.pid),
+        ))
+    else:
+        clear_cache(SESSION_CACHE_NAME)
+    return session
+
+
+def find_graphical_sessions():
+    """
+    Find all graphical sessions.
+
+    :returns: A list of :class:`GraphicalSession` objects (ordered by
+              "popularity", refer to :func:`group_sessions()`).
+
+    The same candidates as :func:`find_graphical_session()` are searched (in
+    a single pass) but instead of stopping at the first graphical session
+    that reaches the required level of confidence, all candidates are
+    searched and every distinct graphical session is returned.
+    """
+    timer = Timer()
+    sessions = group_sessions(find_session_candidates())
+    if not sessions:
+        logger.debug("No graphical sessions found among candidates, searching all processes ..")
+        sessions = group_sessions((p.pid, p.user_ids.real) for p in find_processes() if p.user_ids)
+    logger.debug("Found %i graphical sessions in %s.", len(sessions), timer)
+    return sessions
+
+
+def group_sessions(candidates):
+    """
+    Group the environments of processes into distinct graphical sessions.
+
+    :param candidates: Refer to :func:`rank_environments()`.
+    :returns: A list of :class:`GraphicalSession` objects.
+
+    Processes are grouped by the user that owns them and the place where
+    notifications are delivered (the session bus address when it's available,
+    otherwise the X display), so that a user with multiple graphical sessions
+    that share a session bus doesn't receive duplicate notifications. Within
+    each group the most popular environment is used. Environments that define
+    neither a session bus nor an X display are ignored. The resulting
+    sessions are ordered by popularity (most popular first).
+    """
+    matches = collections.defaultdict(int)
+    first_pids = {}
+    for pid, uid in candidates:
+        environment = read_session_variables(pid)
+        if environment:
+            key = (uid, tuple(sorted(environment.items())))
+            matches[key] += 1
+            first_pids.setdefault(key, pid)
+    groups = {}
+    for key, counter in matches.items():
+        uid, environment = key
+        variables = dict(environment)
+        target = variables.get('DBUS_SESSION_BUS_ADDRESS') or variables.get('DISPLAY')
+        if target and (counter, key) > groups.get((uid, target), (0,)):
+            groups[(uid, target)] = (counter, key)
+    sessions = []
+    for counter, key in sorted(groups.values(), reverse=True):
+        uid, environment = key
+        sessions.append(GraphicalSession(uid=uid, environment=dict(environment), pid=first_pids[key]))
+    return sessions
+
+
+def find_cached_session():
+    """
+    Get the graphical session that was found by a previous search.
+
+    :returns: A :class:`GraphicalSession` object or :data:`None`.
+
+    This function loads the user ID, environment variables and session
+    process that were last found by :func:`find_graphical_session()` from the
+    :data:`SESSION_CACHE_NAME` cache (refer to :mod:`proc.cache`). The cached
+    information is only used when the following cheap checks pass:
+
+    - The session process is still alive and its process ID hasn't been
+      reused (one read of ``/proc/[pid]/stat``, refer to
+      :func:`~proc.cache.check_process_identity()`).
+
+    - The sockets of the X server and session bus still exist (one
+      :func:`os.path.exists()` call per socket, refer to
+      :func:`find_session_sockets()`).
+    """
+    cached = load_cache(SESSION_CACHE_NAME)
+    if cached:
+        uid = cached.get('uid')
+        pid = cached.get('pid')
+        environment = cached.get('environment')
+        if isinstance(uid, int) and isinstance(pid, int) and isinstance(environment, dict):
+            session = GraphicalSession(uid=uid, environment=environment, pid=pid)
+            if check_session(session, cached.get('starttime')):
+                logger.debug("Using cached graphical session of user %i.", uid)
+                return session
+        logger.debug("Ignoring stale cache of graphical session.")
+    return None
+
+
+def check_session(session, starttime):
+    """
+    Check whether a graphical session found earlier is still usable.
+
+    :param session: A :class:`GraphicalSession` object.
+    :param starttime: The identity of the session process (refer to
+                      :func:`~proc.cache.get_process_identity()`).
+    :returns: :data:`True` if the session process is still alive and the
+              sockets returned by :func:`find_session_sockets()` still exist,
+              :data:`False` otherwise.
+    """
+    return (check_process_identity(session.pid, starttime) and
+            all(os.path.exists(s) for s in find_session_sockets(session.environment)))
+
+
+def find_session_sockets(environment):
+    """
+    Find the UNIX sockets that a graphical session depends on.
+
+    :param environment: A dictionary with the variables in
+                        :data:`REQUIRED_VARIABLES`.
+    :returns: A list of socket pathnames (strings).
+
+    The socket of the X server is derived from ``$DISPLAY`` (only for local
+    displays like ``:0``) and the socket of the session bus is derived from
+    ``$DBUS_SESSION_BUS_ADDRESS`` (only for ``unix:path=...`` addresses,
+    abstract sockets don't exist on the filesystem).
+    """
+    sockets = []
+    display = environment.get('DISPLAY', '')
+    if display.startswith(':'):
+        number = display[1:].partition('.')[0]
+        if number.isdigit():
+            sockets.append(os.path.join(X11_SOCKET_DIRECTORY, 'X%s' % number))
+    for address in environment.get('DBUS_SESSION_BUS_ADDRESS', '').split(';'):
+        transport, _, parameters = address.partition(':')
+        if transport == 'unix':
+            for parameter in parameters.split(','):
+                name, _, value = parameter.partition('=')
+                if name == 'path' and value:
+                    sockets.append(value)
+    return sockets
+
+
+def find_session_candidates():
+    """
+    Find the processes that are most likely to be part of a graphical session.
+
+    :returns: A list of tuples with two integers each (a process ID and the
+              user ID that owns the process). The tuples are ordered by
+              priority (see below).
+
+    Only processes owned by users that have a runtime directory (refer to
+    :func:`find_session_users()`) are considered. The owner of a process is
+    checked before its ``/proc/[pid]/stat`` file is read (refer to
+    :func:`~proc.core.get_owner_uid()`) so processes of other users (e.g.
+    system daemons) cost a single :func:`os.stat()` call. The remaining
+    processes are prioritized as follows:
+
+    1. Well known desktop components (refer to :data:`DESKTOP_COMPONENTS`).
+    2. Session leaders (processes whose process ID is equal to their session
+       ID, for example the shells running in terminal emulators).
+
+    Other processes are not considered.
+    """
+    users = find_session_users()
+    components = []
+    leaders = []
+    if users:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                directory = os.path.join('/proc', entry)
+                uid = get_owner_uid(directory)
+                if uid in users:
+                    fields = parse_process_status(directory, silent=True)
+                    if fields:
+                        if fields[1] in DESKTOP_COMPONENTS:
+                            components.append((int(entry), uid))
+                        elif fields[0] == fields[5]:
+                            leaders.append((int(entry), uid))
+    logger.debug("Found %i desktop components and %i session leaders owned by %i users.",
+                 len(components), len(leaders), len(users))
+    return components + leaders
+
+
+def find_session_users():
+    """
+    Find the users that have a runtime directory.
+
+    :returns: A set of user IDs (integers).
+
+    The subdirectories of :data:`RUNTIME_DIRECTORY` are named after the user
+    IDs of the users that are logged in (they're managed by
+    ``systemd-logind``). When :data:`RUNTIME_DIRECTORY` doesn't exist an
+    empty set is returned.
+    """
+    try:
+        return set(int(entry) for entry in os.listdir(RUNTIME_DIRECTORY) if entry.isdigit())
+    except OSError:
+        return set()
+
+
+def rank_environments(candidates, confidence=DEFAULT_CONFIDENCE):
+    """
+    Rank the graphical sessions found in the environments of processes.
+
+    :param candidates: An iterable of tuples with two integers each (a process
+                       ID and a user ID).
+    :param confidence: The number of processes that must agree on a graphical
+                       session before the search stops (an integer, defaults
+                       to :data:`DEFAULT_CONFIDENCE`). If this is zero or
+                       :data:`None` all candidates are searched.
+    :returns: A :class:`GraphicalSession` object or :data:`None`.
+
+    As soon as the given number of processes agree on a graphical session it
+    is returned. When all candidates have been searched without reaching this
+    level of confidence the information is ranked by "popularity" (number of
+    occurrences) and the most popular information is returned. The
+    :attr:`~GraphicalSession.pid` of the result is the first candidate that
+    reported the graphical session.
+    """
+    matches = collections.defaultdict(int)
+    first_pids = {}
+    for pid, uid in candidates:
+        environment = read_session_variables(pid)
+        if environment:
+            key = (uid, tuple(sorted(environment.items())))
+            matches[key] += 1
+            first_pids.setdefault(key, pid)
+            if confidence and matches[key] >= confidence:
+                logger.debug("Process %i confirmed graphical session of user %i.", pid, uid)
+                break
+    else:
+        if not matches:
+            return None
+        # Pick the most popular graphical session.
+        counter, key = max((counter, key) for key, counter in matches.items())
+    uid, environment = key
+    return GraphicalSession(uid=uid, environment=dict(environment), pid=first_pids[key])
+
+
+def read_session_variables(pid):
+    """
+    Read the variables in :data:`REQUIRED_VARIABLES` from the environment of a process.
+
+    :param pid: The process ID (an integer).
+    :returns: A dictionary with string key/value pairs (empty when the process
+              doesn't exist, can't be accessed or none of the variables are
+              set).
+
+    Unlike :attr:`proc.core.Process.environ` this only decodes the
+    variables in :data:`REQUIRED_VARIABLES` instead of the whole environment.
+    """
+    variables = {}
+    with ProtectedAccess('environ', "read process environment"):
+        with open('/proc/%i/environ' % pid) as handle:
+            contents = handle.read()
+        for name in REQUIRED_VARIABLES:
+            prefix = name + '='
+            if contents.startswith(prefix):
+                offset = len(prefix)
+            else:
+                offset = contents.find('\0' + prefix)
+                if offset == -1:
+                    continue
+                offset += len(prefix) + 1
+            end = contents.find('\0', offset)
+            value = contents[offset:] if end == -1 else contents[offset:end]
+            if value:
+                variables[name] = value
+    return variables
+
+
+class GraphicalSession(collections.namedtuple('GraphicalSession', 'uid, environment, pid')):
+
+    """
+    A graphical session that was found by :func:`find_graphical_session()` (a named tuple).
+
+    .. attribute:: uid
+
+       The user ID of the owner of the graphical session (an integer).
+
+    .. attribute:: environment
+
+       A dictionary with the variables in :data:`REQUIRED_VARIABLES` that
+       were found in the environment of processes in the session.
+
+    .. attribute:: pid
+
+       The process ID of a process in the session (an integer). This is used
+       by :func:`find_cached_session()` to check whether the session still
+       exists.
+    """
+
+
+class NotificationDaemon(object):
+
+    """
+    Long running process that delivers queued notifications.
+
+    The daemon receives notifications (sent by :func:`send_to_daemon()`) on
+    a UNIX datagram socket and delivers them to the graphical session using
+    :func:`deliver_notification()`. Compared to running ``notify-send-headless``
+    for every notification this has the following advantages:
+
+    - The graphical session is found once and revalidated using the cheap
+      checks of :func:`find_cached_session()` before each delivery (when
+      notifications are delivered to all graphical sessions the same is done
+      by :func:`find_sessions()`).
+
+    - Identical notifications that arrive while earlier notifications are
+      waiting to be delivered are coalesced into a single notification (the
+      number of occurrences is appended to the body).
+
+    - Notifications are delivered at most once per :attr:`interval` seconds.
+      When more than :attr:`max_pending` distinct notifications are waiting
+      the oldest are dropped and a summary of the number of dropped
+      notifications is delivered instead.
+    """
+
+    def __init__(self, pathname=None, interval=DEFAULT_RATE_INTERVAL, max_pending=DEFAULT_MAX_PENDING,
+                 all_sessions=False, session_lifetime=DEFAULT_SESSION_LIFETIME):
+        """
+        Initialize a :class:`NotificationDaemon` object.
+
+        :param pathname: The pathname of the UNIX socket (a string, defaults
+                         to the result of :func:`find_daemon_socket()`).
+        :param interval: The minimum number of seconds between notifications
+                         (a number, defaults to :data:`DEFAULT_RATE_INTERVAL`).
+        :param max_pending: The maximum number of distinct notifications that
+                            are queued (an integer, defaults to
+                            :data:`DEFAULT_MAX_PENDING`).
+        :param all_sessions: :data:`True` to deliver notifications to all
+                             graphical sessions (refer to
+                             :func:`deliver_to_sessions()`), :data:`False`
+                             to deliver notifications to the current
+                             graphical session only (the default).
+        :param session_lifetime: The maximum number of seconds that the
+                                 graphical sessions are reused (a number,
+                                 defaults to :data:`DEFAULT_SESSION_LIFETIME`).
+        :raises: :exc:`~exceptions.EnvironmentError` when no runtime directory
+                 is available.
+        """
+        self.pathname = pathname or find_daemon_socket()
+        if not self.pathname:
+            raise EnvironmentError("No runtime directory available for notification daemon socket!")
+        self.interval = interval
+        self.max_pending = max_pending
+        self.all_sessions = all_sessions
+        self.session_lifetime = session_lifetime
+        self.session_timer = None
+        self.sessions = []
+        self.pending = collections.OrderedDict()
+        self.dropped = 0
+        self.last_delivery = 0
+        self.running = False
+        self.server = None
+
+    def __enter__(self):
+        """Create the UNIX socket."""
+        if os.path.exists(self.pathname):
+            if send_to_daemon([], self.pathname):
+                raise EnvironmentError("Notification daemon already running! (%s)" % self.pathname)
+            logger.debug("Removing stale socket %s ..", self.pathname)
+            os.unlink(self.pathname)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.server.bind(self.pathname)
+        os.chmod(self.pathname, 0o600)
+        self.server.setblocking(False)
+        logger.info("Listening for notifications on %s ..", self.pathname)
+        return self
+
+    def __exit__(self, exc_type=None, exc_value=None, traceback=None):
+        """Close and remove the UNIX socket."""
+        if self.server:
+            self.server.close()
+            self.server = None
+            if os.path.exists(self.pathname):
+                os.unlink(self.pathname)
+
+    def run(self):
+        """Receive and deliver notifications until :func:`stop()` is called."""
+        self.running = True
+        while self.running:
+            if self.pending:
+                timeout = max(0, self.last_delivery + self.interval - time.time())
+            else:
+                timeout = 1
+            self.receive(timeout)
+            if self.pending and time.time() >= self.last_delivery + self.interval:
+                self.deliver_next()
+
+    def stop(self):
+        """Make :func:`run()` return (after at most one second)."""
+        self.running = False
+
+    def receive(self, timeout):
+        """
+        Wait for notifications and add them to the queue.
+
+        :param timeout: The maximum number of seconds to wait (a number).
+        """
+        readable, _, _ = select.select([self.server], [], [], timeout)
+        while readable:
+            try:
+                data = self.server.recv(65536)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            try:
+                arguments = json.loads(data.decode('UTF-8'))
+            except ValueError:
+                logger.warning("Ignoring malformed notification! (%r)", data)
+                continue
+            # Empty datagrams are used to check whether the daemon is running.
+            if arguments and isinstance(arguments, list):
+                self.enqueue([str(a) for a in arguments])
+
+    def enqueue(self, arguments):
+        """
+        Add a notification to the queue.
+
+        :param arguments: The command line arguments for ``notify-send`` (a
+                          list of strings).
+        """
+        key = tuple(arguments)
+        if key in self.pending:
+            self.pending[key] += 1
+        else:
+            self.pending[key] = 1
+            while len(self.pending) > self.max_pending:
+                _, count = self.pending.popitem(last=False)
+                self.dropped += count
+
+    def deliver_next(self):
+        """Deliver the oldest notification in the queue (or a summary of dropped notifications)."""
+        if self.dropped:
+            arguments = ["Notifications suppressed", "Dropped %s." % pluralize(self.dropped, "notification")]
+            self.dropped = 0
+        else:
+            key, count = self.pending.popitem(last=False)
+            arguments = list(key)
+            if count > 1 and not arguments[-1].startswith('-'):
+                arguments[-1] += " (%i times)" % count
+        self.last_delivery = time.time()
+        self.deliver(arguments)
+
+    def deliver(self, arguments):
+        """
+        Deliver a notification to the graphical session.
+
+        :param arguments: The command line arguments for ``notify-send`` (a
+                          list of strings).
+
+        Refer to :func:`deliver_notification()` and :func:`deliver_to_sessions()`
+        for details.
+        """
+        if self.all_sessions:
+            if not any(deliver_to_sessions(arguments, sessions=self.find_sessions()).values()):
+                logger.warning("Failed to deliver desktop notification to any session! (%s)", arguments)
+        elif not deliver_notification(arguments):
+            logger.warning("Failed to deliver desktop notification! (%s)", arguments)
+
+    def find_sessions(self):
+        """
+        Find the graphical sessions that notifications are delivered to.
+
+        :returns: A list of :class:`GraphicalSession` objects.
+
+        The result of :func:`find_graphical_sessions()` is reused as long as
+        :func:`check_session()` passes for every session, but at most for
+        :attr:`session_lifetime` seconds (so that new sessions are noticed).
+        """
+        if self.session_timer and self.session_timer.elapsed_time < self.session_lifetime:
+            if all(check_session(session, starttime) for session, starttime in self.sessions):
+                return [session for session, starttime in self.sessions]
+            logger.debug("Ignoring stale graphical sessions.")
+        self.session_timer = Timer()
+        self.sessions = [(session, get_process_identity(session.pid)) for session in find_graphical_sessions()]
+        return [session for session, starttime in self.sessions]
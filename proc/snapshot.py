@@ -0,0 +1,292 @@
+# proc: Simple interface to Linux process information.
+#
+# Author: Peter Odding <peter@peterodding.com>
+# Last Change: October 18, 2026
+# URL: https://proc.readthedocs.io
+
+"""
+The :mod:`proc.snapshot` module saves and restores process information.
+
+:class:`~proc.core.Process` objects gather their information from ``/proc``
+on demand, which means they can't be stored or shipped to another host as is.
+This module defines a compact snapshot format that can be used to persist the
+result of :func:`~proc.core.find_processes()` for post-mortem analysis or
+offline tooling:
+
+- Snapshots are `JSON lines`_ documents. The first line is a header that
+  contains the format version and the names of the fields included in the
+  snapshot (this enables field projection). Each following line is a JSON
+  array that contains the values of these fields for one process.
+
+- Snapshots are read and written using binary file handles, so compressing a
+  snapshot is as easy as using :func:`gzip.open()` (:func:`open_snapshot()`
+  does this automatically for filenames ending in ``.gz``).
+
+- Snapshots are written one process at a time by :class:`SnapshotWriter`, so
+  memory usage stays flat regardless of the number of processes.
+
+Here's an example:
+
+>>> from proc.snapshot import load_snapshot, open_snapshot, write_snapshot
+>>> with open_snapshot('/tmp/processes.jsonl.gz', 'w') as handle:
+...     write_snapshot(handle)
+...
+>>> with open_snapshot('/tmp/processes.jsonl.gz') as handle:
+...     processes = list(load_snapshot(handle))
+
+The loaded objects answer questions about the snapshotted fields without
+touching ``/proc``. Properties that aren't included in the snapshot report
+empty values. Keep in mind that methods that act on live processes (like
+:attr:`~proc.core.Process.is_alive` and
+:func:`~proc.unix.UnixProcess.suspend()`) still act on whatever process has
+the same process ID on the current host.
+
+.. _JSON lines: http://jsonlines.org/
+"""
+
+# Standard library modules.
+import collections
+import gzip
+import json
+import logging
+import os
+import time
+
+# External dependencies.
+from property_manager import set_property
+
+# Modules provided by our package.
+from proc.core import OwnerIDs, Process, find_processes
+from proc.tree import ProcessNode, check_node_type, connect_nodes
+
+# Public identifiers that require documentation.
+__all__ = (
+    'DEFAULT_FIELDS',
+    'SNAPSHOT_FIELDS',
+    'SNAPSHOT_FORMAT',
+    'SNAPSHOT_VERSION',
+    'SnapshotWriter',
+    'check_fields',
+    'construct_process',
+    'load_snapshot',
+    'load_snapshot_table',
+    'load_snapshot_tree',
+    'logger',
+    'open_snapshot',
+    'read_snapshot',
+    'write_snapshot',
+)
+
+# Initialize a logger.
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 'proc-snapshot'
+"""The format identifier stored in the header of snapshots (a string)."""
+
+SNAPSHOT_VERSION = 1
+"""The version of the snapshot format written by :class:`SnapshotWriter` (an integer)."""
+
+SNAPSHOT_FIELDS = (
+    'pid', 'ppid', 'comm', 'state', 'pgrp', 'session', 'starttime', 'utime', 'stime',
+    'vsize', 'rss', 'cmdline', 'environ', 'exe', 'exe_path', 'exe_name', 'user_ids', 'group_ids',
+)
+"""The names of the :class:`~proc.core.Process` properties that can be included in snapshots (a tuple of strings)."""
+
+DEFAULT_FIELDS = (
+    'pid', 'ppid', 'comm', 'state', 'pgrp', 'session', 'starttime', 'utime', 'stime',
+    'vsize', 'rss', 'cmdline', 'exe_name',
+)
+"""The names of the properties included in snapshots by default (a tuple of strings)."""
+
+# Mapping of field names to their index in /proc/[pid]/stat.
+STAT_INDEXES = dict(pid=0, comm=1, state=2, ppid=3, pgrp=4, session=5, vsize=22)
+
+# Empty values for the properties based on /proc that aren't included in a snapshot.
+EMPTY_VALUES = dict(
+    cmdline=list, cwd=str, environ=dict, exe=str, exe_path=str, io_counters=dict, namespace_pids=list,
+    pid_namespace=lambda: None, socket_inodes=list, starttime=float, status_fields=dict,
+)
+
+
+class SnapshotWriter(object):
+
+    """Streaming writer for process snapshots."""
+
+    def __init__(self, handle, fields=DEFAULT_FIELDS):
+        """
+        Initialize a :class:`SnapshotWriter` object and write the snapshot header.
+
+        :param handle: A file like object opened in binary mode.
+        :param fields: The names of the properties to include in the snapshot
+                       (an iterable of strings, defaults to
+                       :data:`DEFAULT_FIELDS`). The ``pid`` field is always
+                       included.
+        :raises: :exc:`~exceptions.ValueError` when an unsupported field
+                 name is given.
+        """
+        self.handle = handle
+        self.fields = check_fields(fields)
+        self.count = 0
+        self.write_line(dict(format=SNAPSHOT_FORMAT, version=SNAPSHOT_VERSION,
+                             created=time.time(), fields=list(self.fields)))
+
+    def write(self, process):
+        """
+        Write a process to the snapshot.
+
+        :param process: A :class:`~proc.core.Process` object.
+        """
+        values = []
+        for name in self.fields:
+            value = getattr(process, name)
+            if isinstance(value, OwnerIDs):
+                value = list(value)
+            values.append(value)
+        self.write_line(values)
+        self.count += 1
+
+    def write_line(self, value):
+        """Encode a value as a single line of JSON and write it to the snapshot."""
+        self.handle.write((json.dumps(value, separators=(',', ':')) + '\n').encode('UTF-8'))
+
+
+def write_snapshot(handle, processes=None, fields=DEFAULT_FIELDS):
+    """
+    Write a snapshot of processes to a file.
+
+    :param handle: A file like object opened in binary mode.
+    :param processes: An iterable of :class:`~proc.core.Process` objects
+                      (defaults to the result of
+                      :func:`~proc.core.find_processes()`).
+    :param fields: Refer to :class:`SnapshotWriter`.
+    :returns: The number of processes written (an integer).
+    """
+    writer = SnapshotWriter(handle, fields=fields)
+    for process in (find_processes() if processes is None else processes):
+        writer.write(process)
+    logger.debug("Wrote snapshot of %i processes.", writer.count)
+    return writer.count
+
+
+def read_snapshot(handle):
+    """
+    Read the raw records in a snapshot.
+
+    :param handle: A file like object opened in binary mode.
+    :returns: A generator of dictionaries that map field names to values.
+    :raises: :exc:`~exceptions.ValueError` when the header of the snapshot
+             is invalid or the snapshot version isn't supported.
+    """
+    header = json.loads(handle.readline().decode('UTF-8') or 'null')
+    if not (isinstance(header, dict) and header.get('format') == SNAPSHOT_FORMAT):
+        raise ValueError("Not a process snapshot! (invalid header)")
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported process snapshot version! (%r)" % header.get('version'))
+    fields = check_fields(header['fields'])
+    for line in handle:
+        line = line.strip()
+        if line:
+            yield dict(zip(fields, json.loads(line.decode('UTF-8'))))
+
+
+def load_snapshot(handle, obj_type=Process):
+    """
+    Load the processes in a snapshot.
+
+    :param handle: A file like object opened in binary mode.
+    :param obj_type: The type of process objects to construct (expected to be
+                     :class:`~proc.core.Process` or a subclass of
+                     :class:`~proc.core.Process`).
+    :returns: A generator of :class:`~proc.core.Process` objects.
+    """
+    if not issubclass(obj_type, Process):
+        raise TypeError("Custom process types should inherit from proc.core.Process!")
+    for record in read_snapshot(handle):
+        yield construct_process(record, obj_type)
+
+
+def load_snapshot_tree(handle, obj_type=ProcessNode):
+    """
+    Load the processes in a snapshot as a process tree.
+
+    :param handle: A file like object opened in binary mode.
+    :param obj_type: The type of process objects to construct (expected to be
+                     :class:`~proc.tree.ProcessNode` or a subclass of
+                     :class:`~proc.tree.ProcessNode`).
+    :returns: A dictionary that maps process IDs to connected
+              :class:`~proc.tree.ProcessNode` objects.
+    """
+    check_node_type(obj_type)
+    return connect_nodes(load_snapshot(handle, obj_type=obj_type))
+
+
+def load_snapshot_table(handle):
+    """
+    Load the records in a snapshot as a table.
+
+    :param handle: A file like object opened in binary mode.
+    :returns: A generator of named tuples whose fields are the fields
+              included in the snapshot.
+
+    This is the cheapest way to analyze a snapshot because no
+    :class:`~proc.core.Process` objects are constructed.
+    """
+    row_type = None
+    for record in read_snapshot(handle):
+        if row_type is None:
+            row_type = collections.namedtuple('SnapshotRow', sorted(record, key=SNAPSHOT_FIELDS.index))
+        yield row_type(**record)
+
+
+def construct_process(record, obj_type=Process):
+    """
+    Construct a process information object from a snapshot record.
+
+    :param record: A dictionary that maps field names to values (as produced
+                   by :func:`read_snapshot()`).
+    :param obj_type: The type of process object to construct.
+    :returns: A process information object whose properties are based on
+              the snapshot record instead of ``/proc``.
+    """
+    stat_fields = ['0'] * 52
+    for name, index in STAT_INDEXES.items():
+        if name in record:
+            stat_fields[index] = str(record[name])
+    process = obj_type(os.path.join('/proc', str(record['pid'])), stat_fields)
+    for name, factory in EMPTY_VALUES.items():
+        set_property(process, name, factory())
+    for name, value in record.items():
+        if name in ('user_ids', 'group_ids') and value is not None:
+            value = OwnerIDs(*value)
+        set_property(process, name, value)
+    return process
+
+
+def open_snapshot(filename, mode='r'):
+    """
+    Open a snapshot file.
+
+    :param filename: The pathname of the snapshot file (a string). When the
+                     filename ends in ``.gz`` the snapshot is (de)compressed
+                     using :mod:`gzip`.
+    :param mode: ``r`` to read a snapshot, ``w`` to write a snapshot.
+    :returns: A file like object opened in binary mode.
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 'b')
+    return open(filename, mode + 'b')
+
+
+def check_fields(fields):
+    """
+    Validate the names of the fields to include in a snapshot.
+
+    :param fields: An iterable of strings.
+    :returns: A tuple of strings (that starts with ``pid``).
+    :raises: :exc:`~exceptions.ValueError` when an unsupported field name is given.
+    """
+    fields = tuple(fields)
+    for name in fields:
+        if name not in SNAPSHOT_FIELDS:
+            raise ValueError("Unsupported snapshot field! (%r)" % name)
+    return ('pid',) + tuple(name for name in fields if name != 'pid')
@@ -7,13 +7,24 @@
 """Test suite for the `proc` package."""
 
 # Standard library modules.
+import errno
 import getpass
+import io
+import json
 import logging
 import multiprocessing
 import operator
 import os
 import random
+import shutil
+import signal
+import socket
+import stat
+import struct
 import subprocess
+import sys
+import tempfile
+import threading
 import time
 
 from pprint import pformat
@@ -23,16 +34,108 @@ from executor import ExternalCommand, which
 from executor.contexts import AbstractContext
 from humanfriendly import parse_size, Timer
 from humanfriendly.compat import basestring
-from humanfriendly.testing import CustomSearchPath, MockedProgram, TestCase
+from humanfriendly.testing import CustomSearchPath, MockedProgram, PatchedAttribute, PatchedItem, TestCase
 
 # Modules included in our package.
-from proc.apache import find_apache_memory_usage, StatsList
-from proc.core import Process, find_processes, gid_to_name, num_race_conditions, uid_to_name
-from proc.cron import ADDITIONS_SCRIPT_NAME, cron_graceful, ensure_root_privileges, run_additions, wait_for_processes
-from proc.gpg import get_gpg_variables, with_gpg_agent
-from proc.notify import REQUIRED_VARIABLES, find_graphical_context, notify_desktop
-from proc.tree import get_process_tree
-from proc.unix import UnixProcess
+from proc.apache import find_apache_memory_usage, StatsList, StreamingStats
+from proc.cache import (
+    check_process_identity,
+    find_cache_directory,
+    get_process_identity,
+    load_cache,
+    save_cache,
+    validate_private_directory,
+)
+from proc.core import (
+    Process,
+    alive_pids,
+    find_processes,
+    find_unix_sockets,
+    gid_to_name,
+    num_race_conditions,
+    parse_pid_namespace,
+    uid_to_name,
+)
+from proc.cgroup import CgroupFreezer, find_cgroup_directory, find_cgroup_mount, read_cgroup_events
+from proc.cron import (
+    ADDITIONS_SCRIPT_NAME,
+    CRON_DAEMON,
+    ResourceLedger,
+    SchedulerDaemon,
+    cron_graceful,
+    ensure_root_privileges,
+    find_cron_daemon,
+    find_cron_daemon_pid,
+    find_running_schedulers,
+    run_additions,
+    wait_for_processes,
+    write_report,
+)
+from proc.snapshot import (
+    load_snapshot,
+    load_snapshot_table,
+    load_snapshot_tree,
+    open_snapshot,
+    write_snapshot,
+)
+from proc.dbus import (
+    CONNECTIONS,
+    DBusError,
+    MessageReader,
+    MessageWriter,
+    connect_socket,
+    get_connection,
+    notify,
+    parse_address,
+    split_signature,
+)
+from proc.gpg import (
+    AGENT_CACHE_NAME,
+    AgentIndex,
+    DirectoryWatcher,
+    find_agents,
+    find_cached_agent_info,
+    find_fixed_agent_sockets,
+    find_open_unix_sockets,
+    find_socket_directories,
+    find_terminal,
+    get_gpg_variables,
+    start_gpg_agent,
+    with_gpg_agent,
+)
+from proc.gpg import parse_arguments as parse_gpg_arguments
+from proc.notify import (
+    REQUIRED_VARIABLES,
+    GraphicalSession,
+    NotificationDaemon,
+    deliver_notification,
+    deliver_to_sessions,
+    deliver_using_dbus,
+    find_cached_session,
+    find_daemon_socket,
+    find_graphical_context,
+    find_graphical_session,
+    find_graphical_sessions,
+    find_session_candidates,
+    find_session_sockets,
+    find_session_users,
+    group_sessions,
+    notify_desktop,
+    notify_send_arguments,
+    parse_notify_send_arguments,
+    rank_environments,
+    read_session_variables,
+    send_to_daemon,
+)
+from proc.tree import LiveProcessTree, get_process_forest, get_process_tree, get_subtree
+import proc.apache
+import proc.cache
+import proc.cron
+import proc.gpg
+import proc.notify
+import proc.tree
+import proc.unix
+from proc.unix import UnixProcess, wait_for_many
 
 # Initialize a logger.
 logger = logging.getLogger(__name__)
@@ -42,6 +145,19 @@ class ProcTestCase(TestCase):
 
     """:mod:`unittest` compatible container for the test suite of `proc`."""
 
+    def setUp(self):
+        """Keep the test suite from populating :data:`proc.cache.ROOT_CACHE_DIRECTORY`."""
+        super(ProcTestCase, self).setUp()
+        self.cache_directory = tempfile.mkdtemp()
+        self.original_root_cache = proc.cache.ROOT_CACHE_DIRECTORY
+        proc.cache.ROOT_CACHE_DIRECTORY = os.path.join(self.cache_directory, 'proc-cache')
+
+    def tearDown(self):
+        """Restore :data:`proc.cache.ROOT_CACHE_DIRECTORY` and clean up."""
+        proc.cache.ROOT_CACHE_DIRECTORY = self.original_root_cache
+        shutil.rmtree(self.cache_directory)
+        super(ProcTestCase, self).tearDown()
+
     def test_uid_to_name(self):
         """Make sure :func:`uid_to_name()` never raises exceptions."""
         self.check_id_to_name(uid_to_name)
@@ -108,6 +224,15 @@ class ProcTestCase(TestCase):
         assert processes[1].comm in ('init', 'systemd')
         assert os.getpid() in processes, "Current process not found in output of find_processes()!"
 
+    def test_find_processes_filters(self):
+        """Test the `comm` and `uid` filters of :func:`proc.core.find_processes()`."""
+        ourselves = Process.from_pid(os.getpid())
+        matches = [p.pid for p in find_processes(comm=ourselves.comm, uid=os.getuid())]
+        assert os.getpid() in matches
+        assert all(p.comm == ourselves.comm for p in find_processes(comm=[ourselves.comm, 'init']))
+        assert os.getpid() not in [p.pid for p in find_processes(uid=os.getuid() + 1)]
+        assert os.getpid() not in [p.pid for p in find_processes(comm='proc-test-none')]
+
     def test_is_alive(self):
         """Test the :func:`proc.core.Process.is_alive` property."""
         # Spawn a child that will live for a minute.
@@ -123,6 +248,35 @@ class ProcTestCase(TestCase):
             # Make sure the process object agrees the child is dead.
             assert not process.is_alive, "Child is still alive even though we killed it?!"
 
+    def test_alive_pids(self):
+        """Test the :func:`proc.core.alive_pids()` function."""
+        zombie = subprocess.Popen(['sleep', '60'])
+        running = subprocess.Popen(['sleep', '60'])
+        try:
+            zombie.kill()
+            # Wait for the child to become a zombie (we don't reclaim it yet).
+            timer = Timer()
+            while Process.from_pid(zombie.pid).state != 'Z' and timer.elapsed_time < 10:
+                time.sleep(0.1)
+            dead = subprocess.Popen(['true'])
+            dead.wait()
+            pids = [zombie.pid, running.pid, dead.pid]
+            for threshold in (0, 1000):
+                # Test both the /proc listing and the signal 0 strategy.
+                assert alive_pids(pids, threshold=threshold) == set([zombie.pid, running.pid])
+                assert alive_pids(pids, exclude_zombies=True, threshold=threshold) == set([running.pid])
+                # Process IDs that aren't positive are never alive.
+                assert alive_pids([0, -1, running.pid], threshold=threshold) == set([running.pid])
+                # Test verification of the identity of Process objects.
+                impostor = Process.from_pid(running.pid)
+                impostor.stat_fields[21] = str(int(impostor.stat_fields[21]) + 1)
+                assert alive_pids([Process.from_pid(running.pid)], threshold=threshold) == set([running.pid])
+                assert alive_pids([impostor], threshold=threshold) == set()
+        finally:
+            for child in (zombie, running):
+                child.kill()
+                child.wait()
+
     def test_environ(self):
         """Test that parsing of process environments works as expected."""
         unique_value = str(random.random())
@@ -137,6 +291,184 @@ class ProcTestCase(TestCase):
         variables = get_gpg_variables()
         assert variables['GPG_AGENT_INFO']
 
+    def test_find_open_unix_sockets(self):
+        """Test :func:`proc.gpg.find_open_unix_sockets()` and :func:`proc.core.find_unix_sockets()`."""
+        directory = tempfile.mkdtemp()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            pathname = os.path.join(directory, 'test.sock')
+            server.bind(pathname)
+            server.listen(1)
+            index = find_unix_sockets()
+            assert pathname in index.values()
+            assert pathname in list(find_open_unix_sockets(os.getpid(), index=index))
+            assert pathname in list(find_open_unix_sockets(os.getpid()))
+            # Processes that don't exist don't have sockets.
+            assert list(find_open_unix_sockets(2 ** 22 + 1)) == []
+        finally:
+            server.close()
+            shutil.rmtree(directory)
+
+    def test_agent_info_cache(self):
+        """Test :func:`proc.gpg.find_cached_agent_info()` and :mod:`proc.cache`."""
+        directory = tempfile.mkdtemp()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            pathname = os.path.join(directory, 'S.gpg-agent')
+            server.bind(pathname)
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', directory):
+                assert find_cached_agent_info() is None
+                identity = get_process_identity(os.getpid())
+                assert check_process_identity(os.getpid(), identity)
+                assert save_cache(AGENT_CACHE_NAME, dict(socket=pathname, pid=os.getpid(), starttime=identity))
+                assert find_cached_agent_info() == '%s:%i:1' % (pathname, os.getpid())
+                # Reused process IDs are detected.
+                save_cache(AGENT_CACHE_NAME, dict(socket=pathname, pid=os.getpid(), starttime=identity + 1))
+                assert find_cached_agent_info() is None
+                # Stale sockets are detected.
+                save_cache(AGENT_CACHE_NAME, dict(socket=pathname + '.old', pid=os.getpid(), starttime=identity))
+                assert find_cached_agent_info() is None
+            # Without a runtime directory caching is disabled.
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', ''), \
+                    PatchedAttribute(proc.cache, 'ROOT_CACHE_DIRECTORY', os.path.join(directory, 'missing', 'x')):
+                assert not save_cache(AGENT_CACHE_NAME, dict(socket=pathname))
+                assert load_cache(AGENT_CACHE_NAME) is None
+            # Runtime directories that aren't private are ignored.
+            os.chmod(directory, 0o755)
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', directory):
+                assert find_cache_directory() != directory
+        finally:
+            server.close()
+            shutil.rmtree(directory)
+
+    def test_root_cache_directory(self):
+        """Test the fall back to :data:`proc.cache.ROOT_CACHE_DIRECTORY`."""
+        if os.getuid() != 0 or os.path.isdir('/run/user/0'):
+            return self.skipTest("Fall back to private cache directory only applies to root without runtime directory!")
+        directory = tempfile.mkdtemp()
+        try:
+            private_directory = os.path.join(directory, 'proc-cache')
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', ''):
+                with PatchedAttribute(proc.cache, 'ROOT_CACHE_DIRECTORY', private_directory):
+                    assert find_cache_directory() == private_directory
+                    assert stat.S_IMODE(os.stat(private_directory).st_mode) == 0o700
+                    # Directories that can be accessed by other users are ignored.
+                    os.chmod(private_directory, 0o755)
+                    assert not validate_private_directory(private_directory)
+                    assert find_cache_directory() is None
+        finally:
+            shutil.rmtree(directory)
+
+    def test_with_gpg_agent_exec(self):
+        """Test that ``with-gpg-agent --exec`` replaces the current process."""
+        script = 'from proc.gpg import with_gpg_agent; with_gpg_agent(%r)'
+        arguments = ['--exec', 'sh', '-c', 'test -n "$PATH" && exit 42']
+        environment = dict(os.environ, XDG_RUNTIME_DIR=self.cache_directory)
+        assert subprocess.call([sys.executable, '-c', script % arguments], env=environment) == 42
+        # Missing commands are reported without a traceback.
+        process = subprocess.Popen([sys.executable, '-c', script % ['--exec', 'proc-test-missing-command']],
+                                   env=environment, stderr=subprocess.PIPE)
+        output = process.communicate()[1]
+        assert process.returncode == 1
+        assert b'Traceback' not in output
+        # Options after the command are passed to the command.
+        assert parse_gpg_arguments(['-e', 'git', 'commit', '-v']) == (['git', 'commit', '-v'], True)
+        assert parse_gpg_arguments(['git', '-e']) == (['git', '-e'], False)
+        # The terminal is found without running external programs.
+        terminal = find_terminal()
+        assert terminal is None or terminal.startswith('/dev/')
+
+    def test_agent_index(self):
+        """Test :class:`proc.gpg.AgentIndex` and :func:`proc.gpg.find_agents()`."""
+        if not which('ssh-agent'):
+            return self.skipTest("ssh-agent is not installed!")
+        directory = tempfile.mkdtemp()
+        pathname = os.path.join(directory, 'agent.sock')
+        agent = subprocess.Popen(['ssh-agent', '-D', '-a', pathname], stdout=subprocess.PIPE)
+        try:
+            timer = Timer()
+            while not os.path.exists(pathname) and timer.elapsed_time < 10:
+                time.sleep(0.05)
+            found = [a for a in find_agents(include_ssh_agent=True) if a.pid == agent.pid]
+            assert len(found) == 1
+            assert found[0].program == 'ssh-agent'
+            assert found[0].uid == os.getuid()
+            assert found[0].socket == pathname
+            assert found[0].environment == dict(SSH_AUTH_SOCK=pathname, SSH_AGENT_PID=str(agent.pid))
+            # ssh-agent processes are only included on request.
+            assert agent.pid not in [a.pid for a in find_agents()]
+            # The index is reused until it expires.
+            index = AgentIndex(include_ssh_agent=True, ttl=60)
+            assert index.is_expired
+            assert index.find_ssh_agent(os.getuid()) is not None
+            assert not index.is_expired
+            assert index.find_ssh_agent(2 ** 31) is None
+        finally:
+            agent.terminate()
+            agent.wait()
+            shutil.rmtree(directory)
+
+    def test_directory_watcher(self):
+        """Test that :class:`proc.gpg.DirectoryWatcher` wakes up when a socket is created."""
+        directory = tempfile.mkdtemp()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            with DirectoryWatcher([directory]) as watcher:
+                assert watcher.is_watching
+                assert watcher.wait(0.1) is False
+                server.bind(os.path.join(directory, 'S.gpg-agent'))
+                timer = Timer()
+                assert watcher.wait(10) is True
+                assert timer.elapsed_time < 5
+
+            # The watcher falls back to sleeping when inotify isn't available.
+            def unavailable(*args, **kw):
+                raise OSError("inotify unavailable")
+            with PatchedAttribute(proc.gpg.ctypes, 'CDLL', unavailable):
+                with DirectoryWatcher([directory]) as watcher:
+                    assert watcher.fd is None
+                    assert watcher.wait(0.01) is False
+            # Directories that don't exist yet are watched once they're created.
+            nested = os.path.join(directory, 'gnupg')
+            with DirectoryWatcher([nested]) as watcher:
+                assert watcher.watched == set([directory])
+                os.mkdir(nested)
+                assert watcher.wait(10) is True
+                assert nested in watcher.watched
+                timer = Timer()
+                with open(os.path.join(nested, 'S.gpg-agent'), 'w'):
+                    pass
+                assert watcher.wait(10) is True
+                assert timer.elapsed_time < 5
+            assert find_socket_directories() == [os.path.dirname(s) for s in find_fixed_agent_sockets()]
+            # The launched gpg-agent exits right away (after forking the agent)
+            # and that causes /proc to be scanned exactly once.
+            searches = []
+
+            class FakeLauncher(object):
+                is_finished = True
+                failed = False
+
+            def fake_search():
+                searches.append(time.time())
+            with PatchedAttribute(proc.gpg, 'execute', lambda *args, **kw: FakeLauncher()):
+                with PatchedAttribute(proc.gpg, 'find_gpg_agent_info', fake_search):
+                    assert start_gpg_agent(timeout=2.5) is None
+            assert len(searches) == 1
+            # When the socket appears /proc is scanned once, without waiting
+            # for the launcher to exit.
+            FakeLauncher.is_finished = False
+            pathname = os.path.join(directory, 'S.gpg-agent')
+            with PatchedAttribute(proc.gpg, 'execute', lambda *args, **kw: FakeLauncher()):
+                with PatchedAttribute(proc.gpg, 'find_fixed_agent_sockets', lambda: [pathname]):
+                    with PatchedAttribute(proc.gpg, 'find_gpg_agent_info', lambda: pathname + ':1:1'):
+                        timer = Timer()
+                        assert start_gpg_agent(timeout=10) == pathname + ':1:1'
+                        assert timer.elapsed_time < 5
+        finally:
+            server.close()
+            shutil.rmtree(directory)
+
     def test_with_gpg_agent(self):
         """Test that ``with-gpg-agent`` works."""
         if not which('gpg-agent'):
@@ -156,6 +488,278 @@ class ProcTestCase(TestCase):
         assert isinstance(context, AbstractContext)
         assert context.execute('true', check=False)
 
+    def test_find_session_candidates(self):
+        """Test the scoped search of :func:`proc.notify.find_graphical_session()`."""
+        directory = tempfile.mkdtemp()
+        env = dict((name, 'value-%s' % name) for name in REQUIRED_VARIABLES)
+        env['PATH'] = os.environ['PATH']
+        os.mkdir(os.path.join(directory, str(os.getuid())))
+        leader = subprocess.Popen(['sleep', '60'], env=env, preexec_fn=os.setsid)
+        try:
+            with PatchedAttribute(proc.notify, 'RUNTIME_DIRECTORY', directory):
+                assert find_session_users() == set([os.getuid()])
+                assert (leader.pid, os.getuid()) in find_session_candidates()
+                del env['PATH']
+                assert read_session_variables(leader.pid) == env
+                expected = GraphicalSession(uid=os.getuid(), environment=env, pid=leader.pid)
+                assert rank_environments([(leader.pid, os.getuid())], confidence=1) == expected
+                assert find_graphical_session(confidence=1) is not None
+            # Without any logged in users no candidates are found.
+            with PatchedAttribute(proc.notify, 'RUNTIME_DIRECTORY', os.path.join(directory, 'missing')):
+                assert find_session_candidates() == []
+        finally:
+            leader.terminate()
+            leader.wait()
+            shutil.rmtree(directory)
+
+    def test_graphical_session_cache(self):
+        """Test :func:`proc.notify.find_cached_session()`."""
+        directory = tempfile.mkdtemp()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            bus_socket = os.path.join(directory, 'bus')
+            server.bind(bus_socket)
+            env = dict(DBUS_SESSION_BUS_ADDRESS='unix:path=%s' % bus_socket, DISPLAY='remote:0', XAUTHORITY='x')
+            assert find_session_sockets(env) == [bus_socket]
+            assert find_session_sockets(dict(DISPLAY=':1.0')) == ['/tmp/.X11-unix/X1']
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', directory):
+                assert find_cached_session() is None
+                with PatchedAttribute(proc.notify, 'find_session_candidates', lambda: [(os.getpid(), os.getuid())]):
+                    with PatchedAttribute(proc.notify, 'read_session_variables', lambda pid: env):
+                        session = find_graphical_session(confidence=1)
+                assert session == GraphicalSession(uid=os.getuid(), environment=env, pid=os.getpid())
+                assert find_cached_session() == session
+                context = find_graphical_context()
+                assert context.options['environment'] == env
+                # The cache is invalidated when the session bus goes away.
+                server.close()
+                os.unlink(bus_socket)
+                assert find_cached_session() is None
+        finally:
+            server.close()
+            shutil.rmtree(directory)
+
+    def test_notification_daemon(self):
+        """Test :class:`proc.notify.NotificationDaemon` and :func:`proc.notify.send_to_daemon()`."""
+        directory = tempfile.mkdtemp()
+        delivered = []
+        try:
+            with PatchedItem(os.environ, 'XDG_RUNTIME_DIR', directory):
+                assert not send_to_daemon(['Hello world'])
+                with NotificationDaemon(interval=0.1, max_pending=2) as daemon:
+                    daemon.deliver = delivered.append
+                    # Sending a notification doesn't wait for the daemon.
+                    timer = Timer()
+                    assert send_to_daemon(notify_send_arguments("Backup started", "Backup"))
+                    assert timer.elapsed_time < 0.5
+                    assert send_to_daemon(notify_send_arguments("Backup started", "Backup"))
+                    daemon.receive(1)
+                    assert list(daemon.pending.items()) == [(('Backup', 'Backup started'), 2)]
+                    daemon.deliver_next()
+                    assert delivered == [['Backup', 'Backup started (2 times)']]
+                    # The oldest notifications are dropped when the queue is full.
+                    for i in range(3):
+                        daemon.enqueue(['Message %i' % i])
+                    assert daemon.dropped == 1
+                    thread = threading.Thread(target=daemon.run)
+                    thread.start()
+                    try:
+                        timer = Timer()
+                        while len(delivered) < 4 and timer.elapsed_time < 10:
+                            time.sleep(0.05)
+                    finally:
+                        daemon.stop()
+                        thread.join()
+                    assert delivered[1:] == [
+                        ['Notifications suppressed', 'Dropped 1 notification.'],
+                        ['Message 1'],
+                        ['Message 2'],
+                    ]
+                # The socket is removed when the daemon stops.
+                assert not os.path.exists(find_daemon_socket())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_dbus_marshalling(self):
+        """Test the D-Bus wire format implementation in :mod:`proc.dbus`."""
+        signature = 'susssasa{sv}i'
+        assert split_signature(signature) == ['s', 'u', 's', 's', 's', 'as', 'a{sv}', 'i']
+        assert split_signature('a(yv)ya{s(ii)}') == ['a(yv)', 'y', 'a{s(ii)}']
+        values = ('proc', 0, '', "Summary", "Body", ['default', 'OK'], dict(urgency=('y', 2), x=('s', 'y')), -1)
+        writer = MessageWriter()
+        for type_code, value in zip(split_signature(signature), values):
+            writer.write(type_code, value)
+        reader = MessageReader(bytes(writer.buffer))
+        decoded = [reader.read(type_code) for type_code in split_signature(signature)]
+        assert decoded == ['proc', 0, '', "Summary", "Body", ['default', 'OK'], dict(urgency=2, x='y'), -1]
+        assert parse_address('unix:abstract=/tmp/dbus-x,guid=1;tcp:host=x;unix:path=/run/user/1000/b%75s') == [
+            ('abstract', '\0/tmp/dbus-x'),
+            ('path', '/run/user/1000/bus'),
+        ]
+        assert parse_notify_send_arguments(['--urgency=low', '--expire-time=5', 'Summary', 'Body']) == (
+            'Summary', 'Body', dict(urgency='low', expire_timeout=5),
+        )
+        assert parse_notify_send_arguments(['Summary']) == ('Summary', '', {})
+        # Expiration times that don't fit in an int32 are left to notify-send.
+        assert parse_notify_send_arguments(['--expire-time=99999999999', 'Summary']) is None
+        assert parse_notify_send_arguments(['--expire-time=-1', 'Summary']) is None
+        # Marshalling errors make delivery fall back to notify-send.
+        session = GraphicalSession(uid=os.getuid(), environment=dict(DBUS_SESSION_BUS_ADDRESS='unix:path=/x'), pid=1)
+        for exception in struct.error("x"), UnicodeEncodeError('utf-8', u'x', 0, 1, "x"), ValueError("x"):
+            def broken_notify(*args, **kw):
+                raise exception
+            with PatchedAttribute(proc.notify, 'notify', broken_notify):
+                assert not deliver_using_dbus(["Summary"], session)
+        assert parse_notify_send_arguments(['--hint=int:x:1', 'Summary']) is None
+        assert parse_notify_send_arguments(['-u', 'low', 'Summary']) is None
+
+    def test_connect_as_user(self):
+        """Test that :func:`proc.dbus.connect_socket()` connects as another user without switching credentials."""
+        if os.getuid() != 0 or not hasattr(socket.socket, 'sendmsg'):
+            return self.skipTest("Connecting as another user requires root privileges and socket.sendmsg()!")
+        uid = 65534
+        location = '\0proc-test-%i' % random.randint(0, 2 ** 32)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(location)
+            server.listen(1)
+            client = connect_socket(location, uid=uid, timeout=5)
+            try:
+                connection, address = server.accept()
+                credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+                connection.close()
+                assert struct.unpack('3i', credentials)[1] == uid
+                assert os.geteuid() == 0
+            finally:
+                client.close()
+        finally:
+            server.close()
+        # Connection errors are reported using socket.error.
+        with self.assertRaises(socket.error) as context:
+            connect_socket(location, uid=uid, timeout=5)
+        assert context.exception.errno == errno.ECONNREFUSED
+
+    def test_dbus_notify(self):
+        """Test :func:`proc.dbus.notify()` against a private message bus."""
+        if not (which('dbus-daemon') and which('dbus-test-tool')):
+            return self.skipTest("dbus-daemon and dbus-test-tool are required!")
+        bus = subprocess.Popen(['dbus-daemon', '--session', '--print-address=1', '--nofork', '--nopidfile'],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        server = None
+        try:
+            address = bus.stdout.readline().decode('UTF-8').strip()
+            environment = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+            server = subprocess.Popen(['dbus-test-tool', 'echo', '--name=org.freedesktop.Notifications'],
+                                      env=environment)
+            session = GraphicalSession(uid=os.getuid(), environment=dict(DBUS_SESSION_BUS_ADDRESS=address),
+                                       pid=os.getpid())
+            # Wait for the fake notification server to claim its name.
+            timer = Timer()
+            while not deliver_using_dbus(["Summary", "Body"], session):
+                assert timer.elapsed_time < 10
+                time.sleep(0.1)
+            # The connection is reused between notifications.
+            connection = get_connection(address, os.getuid())
+            serial = connection.serial
+            notify(address, "Summary", "Body", uid=os.getuid(), urgency='critical', category='test')
+            assert get_connection(address, os.getuid()) is connection
+            assert connection.serial == serial + 1
+            # Unsupported notify-send options aren't delivered using D-Bus.
+            assert not deliver_using_dbus(['--hint=int:x:1', "Summary"], session)
+            # Errors are reported when the notification server disappears.
+            server.terminate()
+            server.wait()
+            server = None
+            self.assertRaises(DBusError, notify, address, "Summary", uid=os.getuid())
+            assert not deliver_using_dbus(["Summary"], session)
+        finally:
+            for connection in CONNECTIONS.values():
+                connection.close()
+            CONNECTIONS.clear()
+            if server:
+                server.terminate()
+                server.wait()
+            bus.terminate()
+            bus.wait()
+
+    def test_all_sessions(self):
+        """Test :func:`proc.notify.find_graphical_sessions()` and :func:`proc.notify.deliver_to_sessions()`."""
+        first = dict(DBUS_SESSION_BUS_ADDRESS='unix:path=/run/user/1000/bus', DISPLAY=':0')
+        second = dict(DBUS_SESSION_BUS_ADDRESS='unix:path=/run/user/1001/bus', DISPLAY=':1')
+        environments = {1: first, 2: first, 3: dict(first, DISPLAY=':2'), 4: second, 5: dict(XAUTHORITY='x')}
+        candidates = [(1, 1000), (2, 1000), (3, 1000), (4, 1001), (5, 1002)]
+        with PatchedAttribute(proc.notify, 'read_session_variables', lambda pid: environments[pid]):
+            # Sessions that share a session bus are merged, the most popular environment wins.
+            assert group_sessions(candidates) == [
+                GraphicalSession(uid=1000, environment=first, pid=1),
+                GraphicalSession(uid=1001, environment=second, pid=4),
+            ]
+            with PatchedAttribute(proc.notify, 'find_session_candidates', lambda: candidates):
+                assert len(find_graphical_sessions()) == 2
+        # A hung session doesn't delay delivery to other sessions.
+        sessions = [GraphicalSession(uid=1000, environment=first, pid=1),
+                    GraphicalSession(uid=1001, environment=second, pid=4)]
+
+        deliveries = []
+
+        def fake_delivery(arguments, session, timeout):
+            deliveries.append((session.uid, timeout))
+            if session.uid == 1000:
+                time.sleep(5)
+            return True
+        with PatchedAttribute(proc.notify, 'deliver_notification', fake_delivery):
+            timer = Timer()
+            results = deliver_to_sessions(["Summary"], sessions=sessions, timeout=0.5)
+            assert timer.elapsed_time < 3
+            assert results == {(1000, 1): False, (1001, 4): True}
+            # Each session gets (at most) the time remaining until the deadline.
+            assert all(0 <= timeout <= 0.5 for uid, timeout in deliveries)
+            # Sessions whose previous delivery is still running are skipped.
+            assert deliver_to_sessions(["Summary"], sessions=sessions, timeout=0.5) == results
+            assert sorted(uid for uid, timeout in deliveries) == [1000, 1001, 1001]
+        # Hung notify-send programs are killed when the timeout expires.
+        cases = (dict(script='sleep 60'), 0.5, False), ({}, 5, True), (dict(returncode=1), 5, False)
+        for options, timeout, expected in cases:
+            with MockedProgram('notify-send', **options):
+                session = GraphicalSession(uid=os.getuid(), environment=dict(os.environ), pid=os.getpid())
+                timer = Timer()
+                assert deliver_notification(["Summary"], use_dbus=False, session=session, timeout=timeout) == expected
+                assert timer.elapsed_time < 10
+
+    def test_daemon_sessions(self):
+        """Test that :func:`proc.notify.NotificationDaemon.find_sessions()` reuses graphical sessions."""
+        searches = []
+        session = GraphicalSession(uid=os.getuid(), environment=dict(DISPLAY=':0'), pid=os.getpid())
+
+        def fake_search():
+            searches.append(1)
+            return [session]
+        directory = tempfile.mkdtemp()
+        try:
+            with PatchedAttribute(proc.notify, 'find_graphical_sessions', fake_search):
+                with PatchedAttribute(proc.notify, 'X11_SOCKET_DIRECTORY', directory):
+                    daemon = NotificationDaemon(pathname=os.path.join(directory, 'daemon.sock'))
+                    # Sessions whose sockets don't exist are searched again.
+                    assert daemon.find_sessions() == [session]
+                    assert daemon.find_sessions() == [session]
+                    assert len(searches) == 2
+                    # Valid sessions are reused.
+                    with open(os.path.join(directory, 'X0'), 'w'):
+                        pass
+                    for i in range(5):
+                        assert daemon.find_sessions() == [session]
+                    assert len(searches) == 2
+                    # Sessions are searched again when the session process is replaced.
+                    daemon.sessions = [(session, 1)]
+                    assert daemon.find_sessions() == [session]
+                    assert len(searches) == 3
+                    # Sessions are searched again after the lifetime expires.
+                    daemon.session_lifetime = 0
+                    daemon.find_sessions()
+                    assert len(searches) == 4
+        finally:
+            shutil.rmtree(directory)
+
     def test_notify_desktop(self):
         """Test that :func:`proc.notify.notify_desktop()` works."""
         env = dict((name, 'value') for name in REQUIRED_VARIABLES)
@@ -236,6 +840,260 @@ class ProcTestCase(TestCase):
             # Make sure we always kill our child.
             child.terminate()
 
+    def test_subtree_construction(self, timeout=60):
+        """Test the :func:`proc.tree.get_subtree()` function."""
+        # Test argument validation.
+        self.assertRaises(TypeError, get_subtree, os.getpid(), obj_type=object)
+        # Spawn a child and grandchild (because of shell=True) that will live for a minute.
+        child = subprocess.Popen(['sleep 60'], shell=True)
+        try:
+            timer = Timer()
+            while True:
+                try:
+                    # Construct the subtree below our own process.
+                    root = get_subtree(os.getpid())
+                    assert root.pid == os.getpid()
+                    assert root.parent is None, "Root of subtree shouldn't have a parent!"
+                    assert child.pid in [c.pid for c in root.children], \
+                        "Child process not visible in subtree reported by get_subtree()!"
+                    assert any(gc.exe_name == 'sleep' for gc in root.grandchildren), \
+                        "Grandchild process not visible in subtree reported by get_subtree()!"
+                    # Construct the subtree below our child.
+                    subtree = get_subtree(child.pid)
+                    assert [p.pid for p in subtree.descendants] == [gc.pid for gc in root.grandchildren]
+                    break
+                except AssertionError:
+                    if timer.elapsed_time >= timeout:
+                        raise
+                    else:
+                        time.sleep(0.1)
+        finally:
+            child.terminate()
+            child.wait()
+        # Processes that don't exist result in None.
+        assert get_subtree(child.pid) is None
+
+    def test_process_forest(self):
+        """Test the :func:`proc.tree.get_process_forest()` function."""
+        self.assertRaises(TypeError, get_process_forest, obj_type=object)
+        roots = get_process_forest()
+        assert roots, "Expected at least one root process!"
+        assert all(root.parent is None for root in roots)
+        # Make sure our own process is reachable from one of the roots.
+        assert any(root.pid == os.getpid() or root.find(pid=os.getpid(), recursive=True) for root in roots)
+        # Test scoping of the forest to a PID namespace.
+        our_namespace = parse_pid_namespace('/proc/self')
+        assert isinstance(our_namespace, int)
+        assert Process.from_pid(os.getpid()).pid_namespace == our_namespace
+        assert Process.from_pid(os.getpid()).namespace_pids[-1] == os.getpid()
+        roots = get_process_forest(pid_namespace=our_namespace)
+        assert any(root.pid == os.getpid() or root.find(pid=os.getpid(), recursive=True) for root in roots)
+        assert get_process_forest(pid_namespace=0) == []
+
+    def test_subtree_aggregates(self):
+        """Test the subtree aggregates of :class:`proc.tree.ProcessNode`."""
+        children = [subprocess.Popen(['sleep 60'], shell=True) for i in range(3)]
+        try:
+            root = get_subtree(os.getpid())
+            descendants = list(root.descendants)
+            assert len(descendants) >= len(children)
+            # Check the predefined aggregates against naive computations.
+            assert root.subtree_count == 1 + len(descendants)
+            assert root.subtree_rss == root.rss + sum(p.rss for p in descendants)
+            assert abs(root.subtree_cpu - (root.cpu_time + sum(p.cpu_time for p in descendants))) < 0.001
+            # Check that a single pass memoized the aggregates of all nodes.
+            assert all(len(node.aggregate_cache) == 3 for node in descendants)
+            for node in descendants:
+                assert node.subtree_count == 1 + len(list(node.descendants))
+            # Check custom reducers.
+            assert root.aggregate('pid', max) == max(p.pid for p in [root] + descendants)
+            # Check that changes to the tree invalidate the aggregates.
+            leaf = next(node for node in descendants if not node.children)
+            leaf.parent.remove_child(leaf)
+            assert not root.aggregate_cache
+            assert root.subtree_count == len(descendants)
+        finally:
+            for child in children:
+                child.terminate()
+                child.wait()
+
+    def test_live_process_tree(self):
+        """Test the :class:`proc.tree.LiveProcessTree` class."""
+        events = []
+        tree = LiveProcessTree(
+            on_added=lambda node: events.append(('added', node.pid)),
+            on_removed=lambda node: events.append(('removed', node.pid)),
+            on_reparented=lambda node, old_parent: events.append(('reparented', node.pid, old_parent.pid)),
+        )
+        changes = tree.refresh()
+        assert os.getpid() in tree.nodes
+        assert len(changes.added) == len(tree.nodes)
+        ourselves = tree.nodes[os.getpid()]
+        # Spawn a child and grandchild, where the child exits when we ask it to.
+        child = subprocess.Popen(['sh', '-c', 'sleep 60 > /dev/null & echo $!; read line'],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        grandchild_pid = int(child.stdout.readline())
+        try:
+            del events[:]
+            changes = tree.refresh()
+            assert ('added', child.pid) in events
+            assert ('added', grandchild_pid) in events
+            child_node = tree.nodes[child.pid]
+            grandchild_node = tree.nodes[grandchild_pid]
+            assert child_node.parent is ourselves
+            assert grandchild_node.parent is child_node
+            # Make sure unchanged nodes are reused.
+            assert tree.nodes[os.getpid()] is ourselves
+            # Make the child exit so that the grandchild is orphaned.
+            child.communicate(b'\n')
+            del events[:]
+            changes = tree.refresh()
+            assert ('removed', child.pid) in events
+            assert ('reparented', grandchild_pid, child.pid) in events
+            assert child_node not in ourselves.children
+            assert tree.nodes[grandchild_pid] is grandchild_node
+            assert grandchild_node.ppid == Process.from_pid(grandchild_pid).ppid
+            assert grandchild_node.ppid != child.pid
+            if grandchild_node.parent:
+                assert grandchild_node in grandchild_node.parent.children
+        finally:
+            os.kill(grandchild_pid, signal.SIGKILL)
+        # Wait for the orphan to be reclaimed by its new parent.
+        timer = Timer()
+        while Process.from_pid(grandchild_pid) and timer.elapsed_time < 10:
+            time.sleep(0.1)
+        changes = tree.refresh()
+        assert grandchild_node in changes.removed
+
+    def test_snapshots(self):
+        """Test the :mod:`proc.snapshot` module."""
+        live = dict((p.pid, p) for p in find_processes())
+        handle = io.BytesIO()
+        assert write_snapshot(handle, live.values()) == len(live)
+        # Load the snapshot as process objects.
+        handle.seek(0)
+        loaded = dict((p.pid, p) for p in load_snapshot(handle))
+        assert set(loaded) == set(live)
+        ourselves = loaded[os.getpid()]
+        assert ourselves.proc_tree == '/proc/%i' % os.getpid()
+        for name in ('ppid', 'comm', 'state', 'pgrp', 'session', 'starttime', 'vsize', 'rss', 'cmdline', 'exe_name'):
+            assert getattr(ourselves, name) == getattr(live[os.getpid()], name)
+        # Properties that weren't included in the snapshot should be empty
+        # (instead of being read from /proc).
+        assert ourselves.environ == {}
+        assert ourselves.user_ids is None
+        # Properties that weren't included in the snapshot don't read /proc,
+        # regardless of whether the process ID exists on this host.
+        handle = io.BytesIO()
+        handle.write(json.dumps(dict(format='proc-snapshot', version=1, fields=['pid'])).encode('UTF-8') + b'\n')
+        handle.write(b'[%i]\n[%i]\n' % (os.getpid(), 2 ** 22 + 1))
+        handle.seek(0)
+        for process in load_snapshot(handle):
+            assert process.cwd == ''
+            assert process.io_counters == {}
+            assert process.namespace_pids == []
+            assert process.pid_namespace is None
+            assert process.socket_inodes == []
+            assert process.starttime == 0
+        # Load the snapshot as a process tree.
+        handle.seek(0)
+        mapping = load_snapshot_tree(handle)
+        if os.getppid() in mapping:
+            assert mapping[os.getpid()].parent is mapping[os.getppid()]
+        # Test field projection and loading the snapshot as a table.
+        handle = io.BytesIO()
+        write_snapshot(handle, [live[os.getpid()]], fields=['user_ids', 'rss'])
+        handle.seek(0)
+        rows = list(load_snapshot_table(handle))
+        assert len(rows) == 1
+        assert rows[0]._fields == ('pid', 'rss', 'user_ids')
+        assert rows[0].user_ids[0] == os.getuid()
+        handle.seek(0)
+        assert next(load_snapshot(handle)).user_ids.real == os.getuid()
+        # Test argument validation.
+        self.assertRaises(ValueError, write_snapshot, io.BytesIO(), fields=['nonexisting'])
+        self.assertRaises(ValueError, next, load_snapshot(io.BytesIO(b'[]\n')))
+        # Test compressed snapshots.
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'snapshot.jsonl.gz')
+            with open_snapshot(filename, 'w') as handle:
+                write_snapshot(handle, [live[os.getpid()]])
+            with open_snapshot(filename) as handle:
+                assert [p.pid for p in load_snapshot(handle)] == [os.getpid()]
+        finally:
+            shutil.rmtree(directory)
+
+    def test_terminate_tree(self):
+        """Test the :func:`proc.tree.ProcessNode.terminate_tree()` method."""
+        # Spawn a session where the shell and the second sleep
+        # command ignore SIGTERM (the first sleep command doesn't).
+        child = subprocess.Popen(['sh', '-c', 'sleep 60 & trap "" TERM; sleep 60 & echo ready; wait'],
+                                 stdout=subprocess.PIPE, preexec_fn=os.setsid)
+        groups = []
+        original_killpg = os.killpg
+
+        def record_killpg(pgrp, signal_number):
+            groups.append(pgrp)
+            original_killpg(pgrp, signal_number)
+
+        def refuse_scan(*args, **kw):
+            raise AssertionError("Process groups should be checked without scanning all processes!")
+        try:
+            assert child.stdout.readline().strip() == b'ready'
+            subtree = get_subtree(child.pid)
+            assert len(list(subtree.descendants)) == 2
+            timer = Timer()
+            with PatchedAttribute(proc.tree.os, 'killpg', record_killpg):
+                with PatchedAttribute(proc.tree, 'find_processes', refuse_scan):
+                    outcomes = subtree.terminate_tree(grace=1, deadline=10)
+            # The process group lines up with the subtree so it's signaled at once.
+            assert child.pid in groups
+            assert timer.elapsed_time < 10
+            assert set(outcomes) == set([subtree.pid] + [p.pid for p in subtree.descendants])
+            statuses = sorted(o.status for o in outcomes.values())
+            assert statuses == ['killed', 'killed', 'terminated'], "Unexpected outcomes: %s" % outcomes
+            assert child.wait() == -signal.SIGKILL
+        finally:
+            if child.poll() is None:
+                child.kill()
+                child.wait()
+        # Terminating a tree whose processes already ended is a no-op.
+        outcomes = subtree.terminate_tree(grace=1)
+        assert all(o.status == 'exited' for o in outcomes.values())
+        # Process groups with members outside of the subtree (here an orphan
+        # that was reparented) are never signaled using killpg().
+        child = subprocess.Popen(['sh', '-c', '(sleep 60 &); sleep 60 & echo ready; wait'],
+                                 stdout=subprocess.PIPE, preexec_fn=os.setsid)
+        del groups[:]
+        try:
+            assert child.stdout.readline().strip() == b'ready'
+            subtree = get_subtree(child.pid)
+            with PatchedAttribute(proc.tree.os, 'killpg', record_killpg):
+                outcomes = subtree.terminate_tree(grace=1, deadline=10)
+            assert not groups
+            assert all(o.status in ('terminated', 'killed') for o in outcomes.values())
+            # The orphan is still alive.
+            os.killpg(child.pid, 0)
+        finally:
+            try:
+                os.killpg(child.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            child.wait()
+        # Processes that can't be signaled are reported as survivors.
+        child = subprocess.Popen(['sleep', '60'])
+        try:
+            def permission_denied(pid, signal_number, pidfd=None):
+                raise OSError(errno.EPERM, "Operation not permitted")
+            with PatchedAttribute(proc.tree, 'send_signal', permission_denied):
+                outcomes = get_subtree(child.pid).terminate_tree(grace=1)
+            assert outcomes[child.pid].status == 'survived'
+            assert child.poll() is None
+        finally:
+            child.kill()
+            child.wait()
+
     def test_wait_for_processes(self):
         """Test the :func:`proc.cron.wait_for_processes()` function."""
         children = [subprocess.Popen(['sleep', str(int(5 + random.random() * 5))]) for i in range(5)]
@@ -243,6 +1101,110 @@ class ProcTestCase(TestCase):
         assert sum(c.poll() is None for c in children) == 0, \
             "wait_for_processes() returned before all processes ended!"
 
+    def test_drain_deadline(self):
+        """Test escalation by :func:`proc.cron.wait_for_processes()` and the JSON report."""
+        children = [
+            subprocess.Popen(['sleep', '0.5']),
+            subprocess.Popen(['sleep', '60']),
+            subprocess.Popen(['sh', '-c', 'trap "" TERM; while :; do sleep 0.1; done']),
+        ]
+        try:
+            timer = Timer()
+            reports = wait_for_processes([get_subtree(c.pid) for c in children], timeout=2, kill_after=1)
+            assert timer.elapsed_time < 10
+            assert [r.status for r in reports] == ['exited', 'terminated', 'killed']
+            assert [r.escalation for r in reports] == [None, 'timeout', 'timeout']
+            assert all(r.runtime > 0 for r in reports)
+            # Check that individual jobs can be terminated before the deadline.
+            child = subprocess.Popen(['sleep', '60'])
+            children.append(child)
+            reports = wait_for_processes([get_subtree(child.pid)], timeout=30, term_after=1)
+            assert reports[0].status == 'terminated'
+            assert reports[0].escalation == 'term-after'
+            assert reports[0].runtime < 10
+            # Check that the report can be written and parsed.
+            fd, filename = tempfile.mkstemp(suffix='.json')
+            os.close(fd)
+            try:
+                write_report(filename, reports)
+                with open(filename) as handle:
+                    data = json.load(handle)
+                assert data['jobs'][0]['pid'] == child.pid
+                assert data['jobs'][0]['status'] == 'terminated'
+            finally:
+                os.unlink(filename)
+        finally:
+            for child in children:
+                if child.poll() is None:
+                    child.kill()
+                child.wait()
+
+    def test_resource_ledger(self):
+        """Test resource sampling by :func:`proc.cron.wait_for_processes()` and :class:`proc.cron.ResourceLedger`."""
+        script = 'import time; data = bytearray(32 * 1024 * 1024); t = time.time()\nwhile time.time() < t + 1: pass'
+        command = [sys.executable, '-c', script]
+        child = self.start_job(command)
+        reports = wait_for_processes([get_subtree(child.pid)], sample_interval=0.1)
+        child.wait()
+        assert reports[0].peak_rss > 32 * 1024 * 1024
+        assert reports[0].cpu_time > 0.5
+        assert reports[0].to_dict()['peak_rss'] == reports[0].peak_rss
+        directory = tempfile.mkdtemp()
+        try:
+            ledger = ResourceLedger(os.path.join(directory, 'ledger', 'cron-jobs.jsonl'))
+            assert ledger.predict_drain_time([Process.from_pid(os.getpid())]) is None
+            for i in range(3):
+                ledger.record(reports)
+            assert len(ledger.history()[ledger.get_key(command)]) == 3
+            # Check the drain time prediction.
+            child = self.start_job(command)
+            try:
+                prediction = ledger.predict_drain_time([Process.from_pid(child.pid)])
+                assert 0 < prediction <= reports[0].runtime
+            finally:
+                child.wait()
+            # Check that regressions are reported.
+            assert not ledger.find_regressions(reports)
+            reports[0].peak_rss *= 2
+            assert [r[1] for r in ledger.find_regressions(reports)] == ['peak_rss']
+        finally:
+            shutil.rmtree(directory)
+
+    def start_job(self, command):
+        """Start a child process and wait for it to execute the given command."""
+        child = subprocess.Popen(command)
+        while Process.from_pid(child.pid).cmdline != command:
+            time.sleep(0.01)
+        return child
+
+    def test_wait_for_many(self):
+        """Test the :func:`proc.unix.wait_for_many()` function."""
+        self.check_wait_for_many()
+        # Test the fall back for when process file descriptors aren't available.
+        with PatchedAttribute(proc.unix, 'open_pidfd', lambda pid: None):
+            self.check_wait_for_many()
+
+    def check_wait_for_many(self):
+        """Helper for :func:`test_wait_for_many()`."""
+        children = [subprocess.Popen(['sleep', str(t)]) for t in (0.5, 0.1, 60)]
+        try:
+            processes = [Process.from_pid(c.pid) for c in children]
+            exited = []
+            progress = []
+            timer = Timer()
+            remaining = wait_for_many(processes, timeout=3, on_exit=exited.append,
+                                      on_progress=progress.append, interval=0.5)
+            assert timer.elapsed_time < 10
+            assert remaining == [processes[2]], "Expected the third child to still be running!"
+            assert exited == [processes[1], processes[0]], "Processes not reported in order of exit!"
+            assert progress, "Progress callback wasn't called!"
+            # Processes that already ended are reported immediately.
+            assert wait_for_many(processes[:2], timeout=0) == []
+        finally:
+            for child in children:
+                child.kill()
+                child.wait()
+
     def test_cron_graceful_dry_run(self):
         """Test a dry run of the ``cron-graceful`` program."""
         # Test that `cron-graceful -h' / `cron-graceful --help' works.
@@ -260,6 +1222,87 @@ class ProcTestCase(TestCase):
         # Test that command line options for verbosity control are accepted and
         # that a dry run of cron-graceful runs successfully.
         cron_graceful(['-q', '--quiet', '-v', '--verbose', '-n', '--dry-run'])
+        # Test that the escalation options are accepted.
+        cron_graceful(['--dry-run', '--timeout=5m', '--term-after=1h', '--kill-after=5', '--freeze'])
+
+    def test_cgroup_freezer(self):
+        """Test :class:`proc.cgroup.CgroupFreezer`."""
+        # Our own control group should never be frozen.
+        with CgroupFreezer([os.getpid()]) as freezer:
+            assert freezer.unfrozen == [os.getpid()]
+            assert not freezer.frozen
+        mount_point = find_cgroup_mount()
+        if not (mount_point and os.access(mount_point, os.W_OK)):
+            return self.skipTest("Need write access to a cgroup v2 hierarchy to test freezing!")
+        directory = tempfile.mkdtemp(prefix='proc-test-', dir=mount_point)
+        child = subprocess.Popen(['sleep', '60'])
+        try:
+            with open(os.path.join(directory, 'cgroup.procs'), 'w') as handle:
+                handle.write('%i\n' % child.pid)
+            assert find_cgroup_directory(child.pid) == directory
+            with CgroupFreezer([child.pid]) as freezer:
+                assert freezer.frozen == [directory]
+                assert read_cgroup_events(directory)['frozen'] == 1
+            assert read_cgroup_events(directory)['frozen'] == 0
+        finally:
+            child.kill()
+            child.wait()
+            os.rmdir(directory)
+
+    def test_find_schedulers(self):
+        """Test :func:`proc.cron.find_running_schedulers()` and :func:`proc.cron.find_cron_daemon()`."""
+        directory = tempfile.mkdtemp()
+        daemons = []
+        try:
+            # Create shells that pretend to be scheduler daemons.
+            for name in 'testcron', 'testrunner':
+                shutil.copy(which('sh')[0], os.path.join(directory, name))
+            testcron = os.path.join(directory, 'testcron')
+            testrunner = os.path.join(directory, 'testrunner')
+            script = '%s -c "sleep 60; :" > /dev/null & wait' % testcron
+            daemons.append(subprocess.Popen([testcron, '-c', script]))
+            daemons.append(subprocess.Popen([testrunner, '-c', 'sleep 60; :']))
+            schedulers = [
+                CRON_DAEMON._replace(name='testcron', exe_names=('testcron',), pidfiles=(), systemd_units=()),
+                SchedulerDaemon(name='testrunner', exe_names=('testrunner',), pidfiles=(), systemd_units=(),
+                                find_jobs=operator.attrgetter('children'), stop_command=('true',)),
+            ]
+            # Wait for the "jobs" to start.
+            timer = Timer()
+            while timer.elapsed_time < 10:
+                running = find_running_schedulers(schedulers)
+                jobs = [list(r.scheduler.find_jobs(r.process)) for r in running]
+                if len(jobs) == 2 and all(jobs):
+                    break
+                time.sleep(0.1)
+            assert [r.process.pid for r in running] == [d.pid for d in daemons]
+            assert [[j.exe_name for j in job_list] for job_list in jobs] == [['sleep'], ['sleep']]
+            # Systemd is only queried when scanning processes finds nothing.
+            units = []
+
+            def fake_systemd(unit):
+                units.append(unit)
+            with PatchedAttribute(proc.cron, 'find_systemd_main_pid', fake_systemd):
+                running = find_running_schedulers([s._replace(systemd_units=('test.service',)) for s in schedulers])
+                assert len(running) == 2 and not units
+                missing = schedulers[0]._replace(exe_names=('missingcron',), systemd_units=('test.service',))
+                assert find_running_schedulers([missing]) == []
+                assert units == ['test.service']
+            # Check that pidfiles are used when available.
+            pidfile = os.path.join(directory, 'crond.pid')
+            with open(pidfile, 'w') as handle:
+                handle.write('%i\n' % daemons[0].pid)
+            with PatchedAttribute(proc.cron, 'CRON_DAEMON', schedulers[0]._replace(pidfiles=(pidfile,))):
+                with PatchedAttribute(proc.cron, 'find_processes', lambda **kw: []):
+                    assert find_cron_daemon_pid() == daemons[0].pid
+                    assert find_cron_daemon().pid == daemons[0].pid
+        finally:
+            for daemon in daemons:
+                for process in get_subtree(daemon.pid).find_all(recursive=True):
+                    process.kill()
+                daemon.kill()
+                daemon.wait()
+            shutil.rmtree(directory)
 
     def test_cron_graceful_additions(self):
         """Test :func:`proc.cron.run_additions()`."""
@@ -294,8 +1337,8 @@ class ProcTestCase(TestCase):
            ``/proc/[pid]`` no longer exists.
 
         This test intentionally creates race conditions in the reading of
-        ``/proc/[pid]/stat``, ``/proc/[pid]/cmdline`` and
-        ``/proc/[pid]/environ`` files, to verify that the :mod:`proc.core`
+        ``/proc/[pid]/stat``, ``/proc/[pid]/cmdline``, ``/proc/[pid]/environ``
+        and ``/proc/[pid]/io`` files and the ``/proc/[pid]/fd`` directory, to verify that the :mod:`proc.core`
         module never breaks on a race condition.
 
         It works by using the :mod:`multiprocessing` module to quickly spawn
@@ -328,6 +1371,8 @@ class ProcTestCase(TestCase):
                         assert isinstance(process.environ, dict)
                         assert isinstance(process.exe, basestring)
                         assert isinstance(process.status_fields, dict)
+                        assert isinstance(process.io_counters, dict)
+                        assert isinstance(process.socket_inodes, list)
                 # Check whether race conditions have been handled.
                 if all(num_race_conditions[k] > at_start[k] for k in at_start):
                     # The test has passed: We were able to simulate at least
@@ -355,6 +1400,43 @@ class ProcTestCase(TestCase):
         # Also test the if block in the median property (the above tests the else block).
         assert StatsList([0, 1, 1, 2, 3, 5, 8, 13, 21]).median == 3
 
+    def test_streaming_stats(self):
+        """Test the :class:`proc.apache.StreamingStats` class."""
+        self.assertRaises(ValueError, operator.attrgetter('average'), StreamingStats())
+        self.assertRaises(ValueError, operator.attrgetter('p99'), StreamingStats())
+        values = [random.randint(1024, 1024 ** 3) for i in range(5000)] + [0, -5]
+        exact = StatsList(values)
+        for vectorized in (False, True):
+            if vectorized and proc.apache.numpy is None:
+                continue
+            with PatchedAttribute(proc.apache, 'numpy', proc.apache.numpy if vectorized else None):
+                stats = StreamingStats(values)
+                assert len(stats) == len(values)
+                assert stats.min == exact.min
+                assert stats.max == exact.max
+                # The type of the minimum and maximum doesn't depend on NumPy.
+                assert type(stats.min) is type(exact.min)
+                assert type(stats.max) is type(exact.max)
+                assert type(StreamingStats([2.5, 1]).min) is int
+                assert abs(stats.average - exact.average) < 1e-6 * exact.average
+                mean = exact.average
+                variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+                assert abs(stats.variance - variance) < 1e-6 * variance
+                # Percentiles are accurate within the configured relative accuracy.
+                ordered = sorted(values)
+                for q in (0, 0.5, 0.9, 0.99, 1):
+                    expected = ordered[int(q * (len(values) - 1))]
+                    assert abs(stats.quantile(q) - expected) <= 0.01 * abs(expected)
+                # Merging the statistics of two halves gives the same result.
+                merged = StreamingStats(values[:1000]).merge(StreamingStats(values[1000:]))
+                assert merged.count == stats.count
+                assert abs(merged.variance - stats.variance) < 1e-6 * variance
+                assert (merged.p50, merged.p90, merged.p99) == (stats.p50, stats.p90, stats.p99)
+        # The statistics survive a round trip through JSON.
+        restored = StreamingStats.from_dict(json.loads(json.dumps(stats.to_dict())))
+        assert (restored.count, restored.average, restored.p99) == (stats.count, stats.average, stats.p99)
+        self.assertRaises(ValueError, stats.merge, StreamingStats(relative_accuracy=0.05))
+
     def test_apache_worker_monitoring(self):
         """Test the :mod:`proc.apache` module."""
         if not os.path.exists('/etc/apache2/sites-enabled/proc-test-vhost.conf'):
@@ -363,6 +1445,10 @@ class ProcTestCase(TestCase):
         # Make sure some regular Apache workers were identified.
         assert len(worker_rss) > 0, "No regular Apache workers found?!"
         assert worker_rss.average > 0
+        # The same information is available as streaming statistics.
+        streaming_rss, streaming_wsgi_rss = find_apache_memory_usage(streaming=True)
+        assert isinstance(streaming_rss, StreamingStats)
+        assert streaming_rss.average > 0
         # Make sure at least one group of WSGI workers was identified. The
         # identification of WSGI workers requires root privileges, so
         # without that there's no point in running the test (we know it
@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -25,21 +25,53 @@ of :class:`ProcessNode` objects, one for each cron job that ``cron`` is
 executing. The :mod:`proc.cron` module contains a more full fledged example
 of using the :mod:`proc.tree` module.
 
+When you already know the process ID of the process you're interested in you
+can use :func:`get_subtree()` instead of :func:`get_process_tree()`. It only
+constructs the part of the process tree below the given process, so its cost
+depends on the size of the subtree instead of the number of processes running
+on the host:
+
+>>> from proc.tree import get_subtree
+>>> cron_daemon = get_subtree(1234)
+>>> cron_jobs = cron_daemon.grandchildren
+
 .. _cron daemon: http://en.wikipedia.org/wiki/Cron
 .. _flatten a list of lists: http://stackoverflow.com/questions/406121/flattening-a-shallow-list-in-python
 """
 
 # Standard library modules.
+import collections
+import errno
 import logging
+import operator
+import os
+import signal
 
 # External dependencies.
-from property_manager import lazy_property, writable_property
+from humanfriendly import Timer
+from humanfriendly.compat import basestring
+from property_manager import PropertyManager, lazy_property, mutable_property, writable_property
 
 # Modules provided by our package.
-from proc.core import find_processes, Process
+from proc.core import Process, find_processes, parse_process_status
+from proc.unix import open_pidfd, send_signal, wait_for_many
 
 # Public identifiers that require documentation.
-__all__ = ('ProcessNode', 'get_process_tree', 'logger')
+__all__ = (
+    'LiveProcessTree',
+    'ProcessNode',
+    'TerminationOutcome',
+    'TreeChanges',
+    'check_node_type',
+    'connect_nodes',
+    'find_child_pids',
+    'find_roots',
+    'get_process_forest',
+    'get_process_tree',
+    'get_subtree',
+    'logger',
+    'unit_value',
+)
 
 # Initialize a logger.
 logger = logging.getLogger(__name__)
@@ -57,7 +89,8 @@ class ProcessNode(Process):
 
     - To construct a tree you use :func:`get_process_tree()`. This function
       connects all of the nodes in the tree before returning the root node
-      (this node represents init_).
+      (this node represents init_). To construct only the part of the tree
+      below a specific process you can use :func:`get_subtree()`.
 
     - To navigate the tree you can use the :attr:`parent`,
       :attr:`children`, :attr:`grandchildren` and :attr:`descendants`
@@ -65,6 +98,15 @@ class ProcessNode(Process):
 
     - If you're looking for specific descendant processes consider using
       :func:`find()` or :func:`find_all()`.
+
+    - To keep a tree up to date over time you can use :class:`LiveProcessTree`.
+
+    - To summarize the resource usage of subtrees you can use
+      :attr:`subtree_count`, :attr:`subtree_cpu`, :attr:`subtree_rss` and
+      :func:`aggregate()`.
+
+    - To terminate a process and all of its descendants you can use
+      :func:`terminate_tree()`.
     """
 
     @writable_property
@@ -76,6 +118,11 @@ class ProcessNode(Process):
         the process doesn't have a parent.
         """
 
+    @lazy_property
+    def aggregate_cache(self):
+        """A dictionary with the memoized results of :func:`aggregate()`."""
+        return {}
+
     @lazy_property
     def children(self):
         """A list of :class:`ProcessNode` objects with the children of this process."""
@@ -105,6 +152,168 @@ class ProcessNode(Process):
             stack.extend(process.children)
             yield process
 
+    @property
+    def subtree_count(self):
+        """The number of processes in the subtree rooted at this process, including this process (an integer)."""
+        return self.aggregate(unit_value)
+
+    @property
+    def subtree_cpu(self):
+        """The sum of :attr:`~proc.core.Process.cpu_time` of the processes in the subtree (a float)."""
+        return self.aggregate('cpu_time')
+
+    @property
+    def subtree_rss(self):
+        """The sum of :attr:`~proc.core.Process.rss` of the processes in the subtree (an integer)."""
+        return self.aggregate('rss')
+
+    def add_child(self, node):
+        """
+        Connect a child process to this process.
+
+        :param node: The :class:`ProcessNode` object of the child process.
+
+        This invalidates the memoized aggregates of this process and its
+        ancestors (see :func:`invalidate_aggregates()`).
+        """
+        node.parent = self
+        self.children.append(node)
+        self.invalidate_aggregates()
+
+    def remove_child(self, node):
+        """
+        Disconnect a child process from this process.
+
+        :param node: The :class:`ProcessNode` object of the child process.
+
+        This invalidates the memoized aggregates of this process and its
+        ancestors (see :func:`invalidate_aggregates()`).
+        """
+        if node in self.children:
+            self.children.remove(node)
+        if node.parent is self:
+            node.parent = None
+        self.invalidate_aggregates()
+
+    def terminate_tree(self, grace=10, deadline=None):
+        """
+        Terminate this process and all of its descendants.
+
+        :param grace: The number of seconds that processes are given to exit
+                      after receiving SIGTERM_ before they're sent SIGKILL_ (a
+                      number, defaults to 10).
+        :param deadline: The maximum number of seconds to wait for processes
+                         to exit in total (a number, defaults to `grace` plus
+                         five seconds).
+        :returns: A dictionary that maps process IDs to
+                  :class:`TerminationOutcome` objects.
+
+        This method works as follows:
+
+        1. The subtree is frozen top-down: Each process is sent SIGSTOP_ before
+           its children are enumerated (using :func:`find_child_pids()`) so
+           that no new children can escape by forking while the subtree is
+           being terminated. Children that were started after the tree was
+           constructed are added to the tree. Each process is opened using
+           :func:`~proc.unix.open_pidfd()` and its start time is verified
+           so that reused process IDs are never signaled.
+
+        2. All processes are sent SIGTERM_ followed by SIGCONT_ (so that the
+           stopped processes can act on the SIGTERM_). Process groups whose
+           members are all part of the subtree are signaled at once using
+           :func:`os.killpg()` (refer to :func:`check_process_groups()`),
+           other processes are signaled individually.
+
+        3. The processes are waited for concurrently using
+           :func:`~proc.unix.wait_for_many()`. Once `grace` seconds have passed
+           the remaining processes are sent SIGKILL_ and waited for until
+           the `deadline` has passed.
+
+        Processes that can't be signaled (e.g. because of missing
+        permissions) are reported with the status ``survived``. The current
+        process (the one calling this method) is never signaled, even if it's
+        part of the subtree.
+
+        .. _SIGCONT: http://en.wikipedia.org/wiki/Unix_signal#SIGCONT
+        .. _SIGKILL: http://en.wikipedia.org/wiki/Unix_signal#SIGKILL
+        .. _SIGSTOP: http://en.wikipedia.org/wiki/Unix_signal#SIGSTOP
+        .. _SIGTERM: http://en.wikipedia.org/wiki/Unix_signal#SIGTERM
+        """
+        timer = Timer()
+        if deadline is None:
+            deadline = grace + 5
+        outcomes = {}
+        targets = freeze_subtree(self, outcomes, timer)
+        logger.info("Terminating %i processes in subtree of process %i ..", len(targets), self.pid)
+        signal_targets(targets, signal.SIGTERM, signal.SIGCONT)
+        for pid in wait_for_targets(targets, grace - timer.elapsed_time):
+            outcomes[pid] = TerminationOutcome(targets.pop(pid).node, 'terminated', timer.elapsed_time)
+        if targets:
+            logger.info("Killing %i processes that didn't respond to SIGTERM ..", len(targets))
+            signal_targets(targets, signal.SIGKILL)
+            for pid in wait_for_targets(targets, deadline - timer.elapsed_time):
+                outcomes[pid] = TerminationOutcome(targets.pop(pid).node, 'killed', timer.elapsed_time)
+        for pid, target in targets.items():
+            logger.warning("Process %i survived termination of subtree!", pid)
+            outcomes[pid] = TerminationOutcome(target.node, 'survived', timer.elapsed_time)
+            target.close()
+        return outcomes
+
+    def aggregate(self, value, reducer=operator.add):
+        """
+        Aggregate a value over the subtree rooted at this process.
+
+        :param value: The name of a process property (a string) or a callable
+                      that takes a :class:`ProcessNode` and returns a value.
+        :param reducer: A callable that takes two values and combines them
+                        into one value (defaults to :func:`operator.add()`).
+        :returns: The aggregated value.
+
+        The first time an aggregate is requested it's computed for every node
+        in the subtree in a single post-order pass and the results are
+        memoized in :attr:`aggregate_cache` (using `value` and `reducer` as
+        the key, so pass the same callables to benefit from the memoization).
+        After that the aggregate of every node in the subtree is available
+        without any further computation, until the tree changes (refer to
+        :func:`invalidate_aggregates()`). For example the following code
+        computes the memory usage of every subtree in a single pass:
+
+        >>> from proc.tree import get_process_tree
+        >>> init = get_process_tree()
+        >>> hungry = max(init.descendants, key=lambda node: node.subtree_rss)
+        """
+        key = (value, reducer)
+        if key not in self.aggregate_cache:
+            get_value = operator.attrgetter(value) if isinstance(value, basestring) else value
+            # We use an explicit stack instead of recursion because process
+            # trees can be deeper than Python's recursion limit.
+            stack = [(self, False)]
+            while stack:
+                node, children_done = stack.pop()
+                if children_done:
+                    result = get_value(node)
+                    for child in node.children:
+                        result = reducer(result, child.aggregate_cache[key])
+                    node.aggregate_cache[key] = result
+                else:
+                    stack.append((node, True))
+                    stack.extend((c, False) for c in node.children if key not in c.aggregate_cache)
+        return self.aggregate_cache[key]
+
+    def invalidate_aggregates(self):
+        """
+        Forget the memoized aggregates of this process and its ancestors.
+
+        This method is called automatically by :func:`add_child()` and
+        :func:`remove_child()`. Because the aggregates of other subtrees are
+        unaffected, recomputing an aggregate after a change only needs to
+        visit the ancestors of the changed node (and their direct children).
+        """
+        node = self
+        while node is not None:
+            node.aggregate_cache.clear()
+            node = node.parent
+
     def find(self, *args, **kw):
         """
         Find the first child process of this process that matches one or more criteria.
@@ -152,13 +361,555 @@ def get_process_tree(obj_type=ProcessNode):
     :returns: A :class:`ProcessNode` object that forms the root node of the
               constructed tree (this node represents init_).
 
+    When the init_ process isn't visible (for example because it's not
+    readable) the root with the lowest process ID is returned instead and a
+    warning is logged. Processes in other trees are not reachable from the
+    returned node, use :func:`get_process_forest()` to get all of them.
+
     .. _init: http://en.wikipedia.org/wiki/init
     """
+    check_node_type(obj_type)
+    mapping = connect_nodes(find_processes(obj_type=obj_type))
+    if 1 in mapping:
+        return mapping[1]
+    roots = find_roots(mapping)
+    if roots:
+        logger.warning("The init process isn't available, using process %i as root of the process tree!",
+                       roots[0].pid)
+        return roots[0]
+
+
+def get_process_forest(obj_type=ProcessNode, pid_namespace=None):
+    """
+    Construct all process trees from the result of :func:`~proc.core.find_processes()`.
+
+    :param obj_type: The type of process objects to construct (expected to be
+                     :class:`ProcessNode` or a subclass of
+                     :class:`ProcessNode`).
+    :param pid_namespace: If this parameter is given, only processes in the
+                          given PID namespace are included (refer to
+                          :func:`~proc.core.find_processes()`).
+    :returns: A list of :class:`ProcessNode` objects (the roots of the trees,
+              sorted by process ID).
+
+    Where :func:`get_process_tree()` returns a single root node, this
+    function returns every process whose parent process isn't available.
+    Such processes exist in the following situations:
+
+    - Processes without a parent process, like init_ and kthreadd_.
+    - Processes whose parent process is in another PID namespace, like the
+      init process of a container (in this case the
+      :attr:`~proc.core.Process.namespace_pids` of the root ends with 1).
+    - Processes whose parent process isn't readable.
+
+    To monitor the processes in a container you can pass the PID namespace
+    of the container, which avoids parsing the ``/proc/[pid]/stat`` files of
+    processes outside of the container:
+
+    >>> from proc.core import parse_pid_namespace
+    >>> from proc.tree import get_process_forest
+    >>> roots = get_process_forest(pid_namespace=parse_pid_namespace('/proc/1234'))
+    >>> container_init = roots[0]
+
+    .. _kthreadd: https://en.wikipedia.org/wiki/Kernel_thread
+    """
+    check_node_type(obj_type)
+    return find_roots(connect_nodes(find_processes(obj_type=obj_type, pid_namespace=pid_namespace)))
+
+
+def get_subtree(root_pid, obj_type=ProcessNode):
+    """
+    Construct the part of the process tree below the given process.
+
+    :param root_pid: The process ID of the root of the subtree (an integer).
+    :param obj_type: The type of process objects to construct (expected to be
+                     :class:`ProcessNode` or a subclass of
+                     :class:`ProcessNode`).
+    :returns: A :class:`ProcessNode` object that forms the root node of the
+              constructed subtree or :data:`None` when the given process
+              doesn't exist (anymore).
+
+    The subtree is constructed outward from `root_pid` using the child
+    process IDs reported by :func:`find_child_pids()`, this means only the
+    processes in the subtree are inspected. When the Linux kernel doesn't
+    expose ``/proc/[pid]/task/[tid]/children`` files (they require the
+    ``CONFIG_PROC_CHILDREN`` kernel option) this function falls back to
+    scanning all processes using :func:`~proc.core.find_processes()`.
+    """
+    check_node_type(obj_type)
+    root = obj_type.from_pid(root_pid)
+    if root:
+        child_pids = find_child_pids(root.pid)
+        if child_pids is None:
+            logger.debug("Child process IDs not available, falling back to full process scan ..")
+            return connect_nodes(find_processes(obj_type=obj_type)).get(root.pid)
+        pending = [(root, child_pids)]
+        while pending:
+            parent, child_pids = pending.pop(0)
+            for pid in child_pids:
+                child = obj_type.from_pid(pid)
+                # Ignore processes that ended in the mean time, as well as
+                # processes whose process ID was reused in the mean time.
+                if child and child.ppid == parent.pid:
+                    parent.add_child(child)
+                    pending.append((child, find_child_pids(child.pid) or []))
+    return root
+
+
+def find_child_pids(pid):
+    """
+    Find the process IDs of the children of a process.
+
+    :param pid: The process ID (an integer).
+    :returns: A list of integers (an empty list when the process has ended) or
+              :data:`None` when the Linux kernel doesn't expose
+              ``/proc/[pid]/task/[tid]/children`` files.
+
+    The ``children`` files are maintained per thread, so the children files
+    of all threads in the process are combined.
+    """
+    task_directory = os.path.join('/proc', str(pid), 'task')
+    child_pids = []
+    try:
+        thread_ids = os.listdir(task_directory)
+    except EnvironmentError:
+        # The process has ended.
+        return child_pids
+    for tid in thread_ids:
+        try:
+            with open(os.path.join(task_directory, tid, 'children')) as handle:
+                child_pids.extend(int(token) for token in handle.read().split())
+        except EnvironmentError as e:
+            if e.errno == errno.ENOENT and os.path.isdir(os.path.join(task_directory, tid)):
+                # The thread exists but its children file doesn't.
+                return None
+    return child_pids
+
+
+def check_node_type(obj_type):
+    """
+    Make sure the given process type is suitable for tree construction.
+
+    :param obj_type: The type of process objects to construct.
+    :raises: :exc:`~exceptions.TypeError` when `obj_type` isn't a subclass of
+             :class:`ProcessNode`.
+    """
     if not issubclass(obj_type, ProcessNode):
         raise TypeError("Custom process types should inherit from proc.tree.ProcessNode!")
-    mapping = dict((p.pid, p) for p in find_processes(obj_type=obj_type))
+
+
+def connect_nodes(processes):
+    """
+    Connect process nodes based on their parent process IDs.
+
+    :param processes: An iterable of :class:`ProcessNode` objects.
+    :returns: A dictionary that maps process IDs to :class:`ProcessNode` objects.
+    """
+    mapping = dict((p.pid, p) for p in processes)
     for obj in mapping.values():
         if obj.ppid != 0 and obj.ppid in mapping:
-            obj.parent = mapping[obj.ppid]
-            obj.parent.children.append(obj)
-    return mapping[1]
+            mapping[obj.ppid].add_child(obj)
+    return mapping
+
+
+def freeze_subtree(root, outcomes, timer):
+    """
+    Freeze a subtree top-down (helper for :func:`ProcessNode.terminate_tree()`).
+
+    :param root: The :class:`ProcessNode` at the root of the subtree.
+    :param outcomes: A dictionary in which processes that have already ended
+                     are recorded (as :class:`TerminationOutcome` objects).
+    :param timer: A :class:`~humanfriendly.Timer` object.
+    :returns: A dictionary that maps process IDs to :class:`TerminationTarget` objects.
+    """
+    targets = {}
+    visited = set()
+    pending = [root]
+    while pending:
+        node = pending.pop(0)
+        visited.add(node.pid)
+        if node.pid == os.getpid():
+            logger.warning("Refusing to terminate our own process (%i)!", node.pid)
+        else:
+            target = TerminationTarget(node)
+            if target.verify() and target.send(signal.SIGSTOP):
+                targets[node.pid] = target
+            else:
+                target.close()
+                # Processes that can't be signaled (e.g. because of missing
+                # permissions) are reported as survivors, only processes that
+                # no longer exist are reported as exited.
+                status = 'survived' if target.error else 'exited'
+                outcomes[node.pid] = TerminationOutcome(node, status, timer.elapsed_time)
+        # Now that the process is stopped we can enumerate its children.
+        child_pids = find_child_pids(node.pid)
+        if child_pids is not None:
+            known_pids = set(c.pid for c in node.children)
+            for pid in child_pids:
+                if pid not in known_pids:
+                    child = type(node).from_pid(pid)
+                    if child and child.ppid == node.pid:
+                        node.add_child(child)
+        pending.extend(c for c in node.children if c.pid not in visited)
+        if not pending and child_pids is None:
+            # Without /proc/[pid]/task/[tid]/children files we scan all
+            # processes to find children that were started after the tree
+            # was constructed (until no more new children are found).
+            for process in find_processes(obj_type=type(root)):
+                parent = targets.get(process.ppid)
+                if parent and process.pid not in visited:
+                    parent.node.add_child(process)
+                    pending.append(process)
+    return targets
+
+
+def signal_targets(targets, *signal_numbers):
+    """
+    Send signals to processes (helper for :func:`ProcessNode.terminate_tree()`).
+
+    :param targets: A dictionary that maps process IDs to :class:`TerminationTarget` objects.
+    :param signal_numbers: The signals to send, in the given order (one or more integers).
+
+    Process groups whose members are all part of `targets` are signaled
+    using :func:`os.killpg()` (refer to :func:`check_process_groups()`),
+    other processes are signaled individually.
+    """
+    # Find the process groups whose leader and at least one other member are
+    # part of the subtree.
+    groups = {}
+    for pid, target in targets.items():
+        if target.pgrp in targets:
+            groups.setdefault(target.pgrp, set()).add(pid)
+    groups = dict((pgrp, members) for pgrp, members in groups.items() if len(members) > 1)
+    if groups:
+        groups = check_process_groups(targets, groups)
+    for signal_number in signal_numbers:
+        grouped = set()
+        for pgrp, members in groups.items():
+            try:
+                logger.debug("Sending signal %i to process group %i ..", signal_number, pgrp)
+                os.killpg(pgrp, signal_number)
+                grouped.update(members)
+            except OSError as e:
+                logger.debug("Failed to signal process group %i! (%s)", pgrp, e)
+        for pid, target in targets.items():
+            if pid not in grouped:
+                target.send(signal_number)
+
+
+def check_process_groups(targets, groups):
+    """
+    Find the process groups without members outside of a subtree (helper for :func:`signal_targets()`).
+
+    :param targets: A dictionary that maps process IDs to :class:`TerminationTarget` objects.
+    :param groups: A dictionary that maps process group IDs to sets of process IDs.
+    :returns: A dictionary with the entries of `groups` that can be signaled
+              using :func:`os.killpg()`.
+
+    Only process groups whose session leader is part of the subtree are
+    considered, because then the only processes outside of the subtree that
+    can be members of the group are orphans that were reparented to an
+    ancestor of the subtree (the init process or a subreaper). The children
+    of these ancestors are checked using :func:`find_child_pids()`, so that
+    all processes don't have to be scanned. When the children can't be
+    enumerated this way the processes are signaled individually.
+    """
+    groups = dict((pgrp, members) for pgrp, members in groups.items() if targets[pgrp].node.session in targets)
+    groups.pop(os.getpgrp(), None)
+    ancestors = set()
+    for target in targets.values():
+        pid = target.node.ppid
+        while pid and pid not in targets and pid not in ancestors:
+            ancestors.add(pid)
+            stat_fields = parse_process_status(os.path.join('/proc', str(pid)), silent=True)
+            pid = int(stat_fields[3]) if stat_fields else 0
+    for pid in ancestors:
+        if not groups:
+            break
+        child_pids = find_child_pids(pid)
+        if child_pids is None:
+            return {}
+        for child_pid in child_pids:
+            if child_pid not in targets:
+                stat_fields = parse_process_status(os.path.join('/proc', str(child_pid)), silent=True)
+                if stat_fields:
+                    groups.pop(int(stat_fields[4]), None)
+    return groups
+
+
+def wait_for_targets(targets, timeout):
+    """
+    Wait for processes to end (helper for :func:`ProcessNode.terminate_tree()`).
+
+    :param targets: A dictionary that maps process IDs to :class:`TerminationTarget` objects.
+    :param timeout: The number of seconds to wait (a number).
+    :returns: A list with the process IDs of the processes that ended.
+    """
+    exited = []
+    wait_for_many(list(targets.values()), timeout=max(0, timeout), on_exit=lambda t: exited.append(t.pid))
+    return exited
+
+
+class TerminationTarget(object):
+
+    """A process that's being terminated by :func:`ProcessNode.terminate_tree()`."""
+
+    def __init__(self, node):
+        """
+        Initialize a :class:`TerminationTarget` object.
+
+        :param node: The :class:`ProcessNode` of the process.
+        """
+        self.node = node
+        self.pgrp = node.pgrp
+        self.pidfd = open_pidfd(node.pid)
+        self.error = None
+
+    @property
+    def is_running(self):
+        """:data:`True` if the process hasn't ended yet, :data:`False` otherwise."""
+        return self.node.is_alive
+
+    @property
+    def pid(self):
+        """The process ID of the process (an integer)."""
+        return self.node.pid
+
+    def verify(self):
+        """
+        Make sure the process ID still refers to the process in the tree.
+
+        :returns: :data:`True` if the process is alive and has the expected
+                  start time, :data:`False` otherwise.
+
+        The process group ID is refreshed as a side effect.
+        """
+        stat_fields = parse_process_status(self.node.proc_tree, silent=True)
+        if stat_fields and stat_fields[2] != 'Z' and stat_fields[21] == self.node.stat_fields[21]:
+            self.pgrp = int(stat_fields[4])
+            return True
+        return False
+
+    def send(self, signal_number):
+        """
+        Send a signal to the process.
+
+        :param signal_number: The signal to send (an integer).
+        :returns: :data:`True` if the signal was sent, :data:`False` otherwise.
+
+        When the signal can't be sent for any other reason than the process
+        having ended (e.g. because of missing permissions) the exception is
+        logged and stored in :attr:`error`.
+        """
+        try:
+            return send_signal(self.node.pid, signal_number, pidfd=self.pidfd)
+        except OSError as e:
+            logger.warning("Failed to signal process %i! (%s)", self.node.pid, e)
+            self.error = e
+            return False
+
+    def close(self):
+        """Close the process file descriptor (if any)."""
+        if self.pidfd is not None:
+            os.close(self.pidfd)
+            self.pidfd = None
+
+
+class TerminationOutcome(collections.namedtuple('TerminationOutcome', 'process, status, elapsed')):
+
+    """
+    The outcome of terminating a process using :func:`ProcessNode.terminate_tree()`.
+
+    :class:`TerminationOutcome` objects are named tuples with three fields:
+
+    - `process` is a :class:`ProcessNode` object.
+    - `status` is one of the following strings:
+
+      ``exited``
+        The process ended before it could be signaled.
+      ``terminated``
+        The process ended after it was sent SIGTERM_.
+      ``killed``
+        The process ended after it was sent SIGKILL_.
+      ``survived``
+        The process was still alive when the deadline passed.
+
+    - `elapsed` is the number of seconds between the start of the termination
+      and the moment the process was found to have ended (a float).
+    """
+
+
+def unit_value(node):
+    """
+    Count every process as one (used by :attr:`ProcessNode.subtree_count`).
+
+    :param node: A :class:`ProcessNode` object (ignored).
+    :returns: The integer one.
+    """
+    return 1
+
+
+def find_roots(mapping):
+    """
+    Find the root nodes in a mapping of connected process nodes.
+
+    :param mapping: A dictionary like the one returned by :func:`connect_nodes()`.
+    :returns: A list of :class:`ProcessNode` objects without a parent, sorted by process ID.
+    """
+    return sorted((n for n in mapping.values() if n.parent is None), key=lambda n: n.pid)
+
+
+class LiveProcessTree(PropertyManager):
+
+    """
+    A process tree that is updated incrementally.
+
+    Where :func:`get_process_tree()` constructs a new tree each time it's
+    called, a :class:`LiveProcessTree` keeps its :class:`ProcessNode` objects
+    around and uses :func:`refresh()` to bring the tree up to date:
+
+    - Processes that have ended are removed from the tree.
+    - Processes that have started are added to the tree.
+    - Processes whose parent process ended are connected to their new parent
+      (usually init_ or a subreaper process).
+
+    Only ``/proc/[pid]/stat`` files of new processes and orphaned processes
+    are read, all other nodes (including the values of their cached
+    properties) are reused. This means the cost of a refresh depends on the
+    number of processes that started or ended since the previous refresh
+    (apart from the listing of ``/proc`` that's needed to notice changes).
+
+    Here's an example:
+
+    >>> from proc.tree import LiveProcessTree
+    >>> tree = LiveProcessTree(on_added=lambda node: print("Started: %s" % node.pid))
+    >>> tree.refresh()
+    >>> cron_daemon = tree.root.find(exe_name='cron')
+
+    .. warning:: A process ID that is reused by a new process in between two
+                 refreshes isn't noticed, because process IDs are used to
+                 detect changes.
+    """
+
+    @mutable_property
+    def obj_type(self):
+        """
+        The type of process objects to construct (a subclass of :class:`ProcessNode`).
+
+        Defaults to :class:`ProcessNode`.
+        """
+        return ProcessNode
+
+    @mutable_property
+    def on_added(self):
+        """
+        A callback that's called with the :class:`ProcessNode` of each new process (a callable or :data:`None`).
+        """
+
+    @mutable_property
+    def on_removed(self):
+        """
+        A callback that's called with the :class:`ProcessNode` of each ended process (a callable or :data:`None`).
+        """
+
+    @mutable_property
+    def on_reparented(self):
+        """
+        A callback that's called when an orphaned process is connected to its new parent (a callable or :data:`None`).
+
+        The callback is given two arguments: The :class:`ProcessNode` of the
+        orphaned process and the :class:`ProcessNode` of its previous parent.
+        """
+
+    @lazy_property
+    def nodes(self):
+        """A dictionary that maps process IDs to :class:`ProcessNode` objects."""
+        return {}
+
+    @property
+    def root(self):
+        """
+        The root node of the tree (a :class:`ProcessNode` object or :data:`None`).
+
+        This is the node that represents init_. It's :data:`None` until
+        :func:`refresh()` has been called.
+        """
+        return self.nodes.get(1)
+
+    @property
+    def roots(self):
+        """A list of :class:`ProcessNode` objects without a parent, sorted by process ID."""
+        return find_roots(self.nodes)
+
+    def refresh(self):
+        """
+        Update the tree to match the current processes.
+
+        :returns: A :class:`TreeChanges` object.
+
+        The tree is updated before any of the callbacks are called, so
+        callbacks can navigate the tree freely.
+        """
+        check_node_type(self.obj_type)
+        current_pids = set(int(entry) for entry in os.listdir('/proc') if entry.isdigit())
+        known_pids = set(self.nodes)
+        # Remove the nodes of processes that have ended.
+        removed = []
+        orphans = []
+        for pid in sorted(known_pids - current_pids):
+            node = self.nodes.pop(pid)
+            if node.parent:
+                node.parent.remove_child(node)
+            for child in list(node.children):
+                node.remove_child(child)
+                orphans.append((child, node))
+            removed.append(node)
+        # Construct nodes for processes that have started.
+        added = []
+        for pid in sorted(current_pids - known_pids):
+            node = self.obj_type.from_pid(pid)
+            if node:
+                self.nodes[pid] = node
+                added.append(node)
+        # Refresh the parent process IDs of orphaned processes.
+        reparented = []
+        for node, old_parent in orphans:
+            if node.pid not in self.nodes:
+                # The orphan also ended.
+                continue
+            if node.update_status():
+                node.invalidate_aggregates()
+                reparented.append((node, old_parent))
+            else:
+                # The orphan ended in between listing /proc and reading its
+                # /proc/[pid]/stat file.
+                del self.nodes[node.pid]
+                removed.append(node)
+        # Connect new and orphaned processes to their parents.
+        for node in added + [node for node, old_parent in reparented]:
+            parent = self.nodes.get(node.ppid) if node.ppid != 0 else None
+            if parent:
+                parent.add_child(node)
+        logger.debug("Refreshed process tree (%i added, %i removed, %i reparented).",
+                     len(added), len(removed), len(reparented))
+        # Notify callbacks about the changes.
+        if self.on_removed:
+            for node in removed:
+                self.on_removed(node)
+        if self.on_added:
+            for node in added:
+                self.on_added(node)
+        if self.on_reparented:
+            for node, old_parent in reparented:
+                self.on_reparented(node, old_parent)
+        return TreeChanges(added=added, removed=removed, reparented=[node for node, old_parent in reparented])
+
+
+class TreeChanges(collections.namedtuple('TreeChanges', 'added, removed, reparented')):
+
+    """
+    The changes applied by :func:`LiveProcessTree.refresh()`.
+
+    :class:`TreeChanges` objects are named tuples containing three lists of
+    :class:`ProcessNode` objects called `added`, `removed` and `reparented`.
+    """
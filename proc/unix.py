@@ -1,7 +1,7 @@
 # proc: Simple interface to Linux process information.
 #
 # Author: Peter Odding <peter@peterodding.com>
-# Last Change: April 26, 2020
+# Last Change: October 18, 2026
 # URL: https://proc.readthedocs.io
 
 """
@@ -14,6 +14,12 @@ process IDs and common UNIX signal semantics to:
 2. gracefully (SIGTERM_) and forcefully (SIGKILL) terminate processes;
 3. suspend (SIGSTOP_) and resume (SIGCONT_) processes.
 
+On Linux 5.3 and newer (given Python 3.9 or newer) the functions
+:func:`open_pidfd()` and :func:`send_signal()` use process file descriptors
+to signal processes without the risk of signaling an unrelated process that
+reused a process ID, and :func:`wait_for_many()` uses process file
+descriptors to efficiently wait for processes to end.
+
 .. _SIGTERM: http://en.wikipedia.org/wiki/Unix_signal#SIGTERM
 .. _SIGKILL: http://en.wikipedia.org/wiki/Unix_signal#SIGKILL
 .. _SIGSTOP: http://en.wikipedia.org/wiki/Unix_signal#SIGSTOP
@@ -21,17 +27,20 @@ process IDs and common UNIX signal semantics to:
 """
 
 # Standard library modules.
+import collections
 import errno
 import logging
 import os
+import select
 import signal
+import time
 
 # External dependencies.
 from executor.process import ControllableProcess
 from property_manager import required_property
 
 # Public identifiers that require documentation.
-__all__ = ('UnixProcess', 'logger')
+__all__ = ('UnixProcess', 'logger', 'open_pidfd', 'send_signal', 'wait_for_many')
 
 # Initialize a logger.
 logger = logging.getLogger(__name__)
@@ -168,3 +177,185 @@ class UnixProcess(ControllableProcess):
         if self.is_running:
             logger.info("Resuming process %s using SIGCONT ..", self)
             os.kill(self.pid, signal.SIGCONT)
+
+
+def open_pidfd(pid):
+    """
+    Open a file descriptor that refers to a process.
+
+    :param pid: The process ID (an integer).
+    :returns: A file descriptor (an integer) or :data:`None` when process file
+              descriptors aren't supported or the process doesn't exist.
+
+    Once a process file descriptor has been opened it keeps referring to the
+    same process, even after the process has ended and its process ID has
+    been reused. The file descriptor becomes readable when the process ends.
+    It's the responsibility of the caller to close the file descriptor.
+    """
+    pidfd_open = getattr(os, 'pidfd_open', None)
+    if pidfd_open is not None:
+        try:
+            return pidfd_open(pid)
+        except OSError as e:
+            logger.debug("Failed to open process file descriptor for process %i! (%s)", pid, e)
+
+
+def send_signal(pid, signal_number, pidfd=None):
+    """
+    Send a signal to a process.
+
+    :param pid: The process ID (an integer).
+    :param signal_number: The signal to send (an integer).
+    :param pidfd: A process file descriptor created by :func:`open_pidfd()`
+                  (an integer or :data:`None`). When this is given the signal
+                  is sent using the process file descriptor instead of the
+                  process ID.
+    :returns: :data:`True` when the signal was sent, :data:`False` when the
+              process no longer exists.
+    :raises: :exc:`~exceptions.OSError` when the signal can't be delivered for
+             other reasons (e.g. because of missing permissions).
+    """
+    try:
+        if pidfd is not None:
+            signal.pidfd_send_signal(pidfd, signal_number)
+        else:
+            os.kill(pid, signal_number)
+        return True
+    except OSError as e:
+        if e.errno == errno.ESRCH:
+            return False
+        raise
+
+
+def wait_for_many(processes, timeout=None, on_exit=None, on_progress=None, interval=1):
+    """
+    Wait for multiple processes to end.
+
+    :param processes: An iterable of :class:`UnixProcess` objects (or other
+                      objects with `pid` and `is_running` attributes).
+    :param timeout: The maximum number of seconds to wait (a number or
+                    :data:`None` to wait until all processes have ended).
+    :param on_exit: A callable that's called with each process the moment
+                    the process is found to have ended (optional).
+    :param on_progress: A callable that's called with a list of the processes
+                        that are still running, once every `interval` seconds
+                        (optional).
+    :param interval: The number of seconds between calls to `on_progress` (a
+                     number, defaults to 1).
+    :returns: A list with the processes that were still running when the
+              timeout expired (an empty list when all processes ended).
+
+    When process file descriptors are available (see :func:`open_pidfd()`)
+    they are multiplexed using :func:`select.epoll()` (or :func:`select.poll()`)
+    so that process exits are noticed immediately, without the cost of
+    polling each process. Otherwise the processes are polled (using
+    `is_running`) with an adaptive interval that starts at 10 milliseconds
+    and backs off to one second.
+
+    When an object has a `pidfd` attribute that isn't :data:`None` this
+    process file descriptor is used (and not closed) instead of opening a new
+    one, this avoids waiting for an unrelated process that reused the process
+    ID of a process that already ended.
+    """
+    started = time.time()
+    # We track processes by their identity because process objects aren't
+    # necessarily hashable.
+    remaining = collections.OrderedDict((id(p), p) for p in processes)
+    watched = {}
+    owned = set()
+    for key, process in remaining.items():
+        fd = getattr(process, 'pidfd', None)
+        if fd is None:
+            fd = open_pidfd(process.pid)
+            if fd is not None:
+                owned.add(fd)
+        if fd is not None:
+            watched[fd] = key
+    unwatched = set(remaining) - set(watched.values())
+    poller = create_poller(watched)
+
+    def process_ended(key):
+        process = remaining.pop(key)
+        unwatched.discard(key)
+        for fd, other in list(watched.items()):
+            if other == key:
+                poller.unregister(fd)
+                del watched[fd]
+                if fd in owned:
+                    owned.discard(fd)
+                    os.close(fd)
+        if on_exit:
+            on_exit(process)
+
+    # Processes can end before their process file descriptor is opened, so
+    # initially we check all processes.
+    to_check = list(remaining)
+    backoff = 0.01
+    next_progress = started
+    try:
+        while True:
+            for key in to_check:
+                if key in remaining and not remaining[key].is_running:
+                    process_ended(key)
+            now = time.time()
+            if not remaining or (timeout is not None and now - started >= timeout):
+                break
+            if on_progress and now >= next_progress:
+                on_progress(list(remaining.values()))
+                next_progress = now + interval
+            # Calculate how long we can wait.
+            wait_time = (next_progress - now) if on_progress else None
+            if timeout is not None:
+                time_left = started + timeout - now
+                wait_time = time_left if wait_time is None else min(wait_time, time_left)
+            if unwatched:
+                wait_time = backoff if wait_time is None else min(wait_time, backoff)
+                backoff = min(backoff * 2, 1)
+            if poller is not None:
+                for fd in poll_events(poller, wait_time):
+                    if fd in watched:
+                        process_ended(watched[fd])
+            else:
+                time.sleep(wait_time)
+            to_check = list(unwatched)
+    finally:
+        for fd in owned:
+            os.close(fd)
+        if poller is not None and hasattr(poller, 'close'):
+            poller.close()
+    return list(remaining.values())
+
+
+def create_poller(watched):
+    """
+    Create a poller for process file descriptors (helper for :func:`wait_for_many()`).
+
+    :param watched: A dictionary with file descriptors as keys.
+    :returns: A :func:`select.epoll()` or :func:`select.poll()` object, or
+              :data:`None` when `watched` is empty.
+    """
+    if watched:
+        if hasattr(select, 'epoll'):
+            poller = select.epoll()
+            for fd in watched:
+                poller.register(fd, select.EPOLLIN)
+        else:
+            poller = select.poll()
+            for fd in watched:
+                poller.register(fd, select.POLLIN)
+        return poller
+
+
+def poll_events(poller, timeout):
+    """
+    Wait for events on a poller (helper for :func:`wait_for_many()`).
+
+    :param poller: A :func:`select.epoll()` or :func:`select.poll()` object.
+    :param timeout: The number of seconds to wait (a number or :data:`None`).
+    :returns: A list of file descriptors that are readable.
+    """
+    if hasattr(select, 'epoll') and isinstance(poller, select.epoll):
+        events = poller.poll(-1 if timeout is None else max(0, timeout))
+    else:
+        events = poller.poll(None if timeout is None else max(0, timeout * 1000))
+    return [fd for fd, event in events]